@@ -0,0 +1,196 @@
+"""
+Camada assíncrona de acesso ao Gemini para os endpoints da API.
+
+As funções síncronas de `ai_services` bloqueiam uma thread do threadpool do
+FastAPI durante toda a chamada ao modelo; poucas correções de redação lentas
+bastam para esgotá-lo e travar endpoints sem relação, como `/auth/login`.
+Aqui as chamadas usam `generate_content_async`, reaproveitam os handles de
+modelo de `ai_services.get_model` e passam por dois limites de concorrência:
+um global por processo e outro por tenant, para que uma escola não consuma
+todas as vagas. Cada chamada tem um timeout que inclui a espera por vaga.
+"""
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+from . import ai_services
+from .ai_scheduler import Priority, estimate_tokens, scheduler
+from .config import settings
+
+
+class ConcurrencyLimiter:
+    """
+    Semáforo global + semáforos por tenant, recriados se o event loop mudar. O
+    semáforo de um tenant só existe enquanto há chamadas dele em andamento ou na
+    fila; o último a sair o descarta, então o dicionário não cresce com o número
+    de tenants atendidos pelo processo.
+    """
+
+    def __init__(self, global_limit: int, per_tenant_limit: int):
+        self.global_limit = global_limit
+        self.per_tenant_limit = per_tenant_limit
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._global: asyncio.Semaphore | None = None
+        # tenant -> (semáforo, chamadas em andamento ou esperando)
+        self._tenants: dict[str, tuple[asyncio.Semaphore, int]] = {}
+
+    def _ensure_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._global = asyncio.Semaphore(self.global_limit)
+            self._tenants = {}
+
+    @asynccontextmanager
+    async def slot(self, tenant_id: str | None):
+        self._ensure_loop()
+        if tenant_id is None:
+            async with self._global:
+                yield
+            return
+
+        semaphore, users = self._tenants.get(tenant_id, (None, 0))
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_tenant_limit)
+        self._tenants[tenant_id] = (semaphore, users + 1)
+        try:
+            async with semaphore:
+                async with self._global:
+                    yield
+        finally:
+            current, users = self._tenants.get(tenant_id, (None, 0))
+            if current is semaphore:  # senão o event loop mudou e o dicionário foi refeito
+                if users == 1:
+                    del self._tenants[tenant_id]
+                else:
+                    self._tenants[tenant_id] = (semaphore, users - 1)
+
+
+limiter = ConcurrencyLimiter(
+    global_limit=settings.AI_MAX_CONCURRENT_CALLS,
+    per_tenant_limit=settings.AI_MAX_CONCURRENT_CALLS_PER_TENANT,
+)
+
+
+async def _generate(model_name: str, model, prompt: str, tenant_id: str | None, timeout: float):
+    async def call():
+        async with limiter.slot(tenant_id):
+            return await scheduler.acall(
+                model_name, lambda: model.generate_content_async(prompt),
+                tokens=estimate_tokens(prompt), priority=Priority.interactive,
+            )
+
+    return await asyncio.wait_for(call(), timeout=timeout)
+
+
+async def grade_essay(essay_text: str, theme: str, tenant_id: str | None = None) -> dict | None:
+    """Versão assíncrona de `ai_services.grade_essay_with_gemini`."""
+    try:
+        model = ai_services.get_model(ai_services.ESSAY_MODEL, generation_config=ai_services.ESSAY_GENERATION_CONFIG)
+        response = await _generate(
+            ai_services.ESSAY_MODEL, model, ai_services.build_essay_prompt(essay_text, theme), tenant_id,
+            timeout=settings.AI_ESSAY_TIMEOUT_SECONDS,
+        )
+        return json.loads(response.text)
+    except asyncio.TimeoutError:
+        print("Tempo esgotado em grade_essay")
+        return None
+    except Exception as e:
+        print(f"Erro em grade_essay: {e}")
+        return None
+
+
+async def ask_tutor(question: str, context: str | None, tenant_id: str | None = None) -> str | None:
+    """Versão assíncrona de `ai_services.ask_tutor_with_gemini`."""
+    try:
+        model = ai_services.get_model(ai_services.TUTOR_MODEL)
+        response = await _generate(
+            ai_services.TUTOR_MODEL, model, ai_services.build_tutor_prompt(question, context), tenant_id,
+            timeout=settings.AI_CALL_TIMEOUT_SECONDS,
+        )
+        return response.text
+    except asyncio.TimeoutError:
+        print("Tempo esgotado em ask_tutor")
+        return None
+    except Exception as e:
+        print(f"Erro em ask_tutor: {e}")
+        return None
+
+
+async def summarize_content(text_to_summarize: str, tenant_id: str | None = None) -> str | None:
+    """Versão assíncrona de `ai_services.summarize_content_with_gemini`."""
+    try:
+        model = ai_services.get_model(ai_services.SUMMARY_MODEL)
+        response = await _generate(
+            ai_services.SUMMARY_MODEL, model, ai_services.build_summary_prompt(text_to_summarize), tenant_id,
+            timeout=settings.AI_CALL_TIMEOUT_SECONDS,
+        )
+        return response.text
+    except asyncio.TimeoutError:
+        print("Tempo esgotado em summarize_content")
+        return None
+    except Exception as e:
+        print(f"Erro em summarize_content: {e}")
+        return None
+
+
+async def _close_upstream(response):
+    """
+    Encerra o stream gRPC subjacente à resposta do Gemini. O SDK não expõe um
+    método público para isso, então fecha o iterador interno quando existir.
+    """
+    iterator = getattr(response, "_iterator", None)
+    cancel = getattr(iterator, "cancel", None)
+    if callable(cancel):
+        cancel()
+    aclose = getattr(iterator, "aclose", None)
+    if callable(aclose):
+        try:
+            await aclose()
+        except Exception:
+            pass
+
+
+async def _stream(model_name: str, model, prompt: str, tenant_id: str | None):
+    """
+    Repassa os pedaços de texto à medida que o modelo os gera. Se o consumidor
+    parar de iterar (cliente desconectou), o stream upstream é fechado no `finally`
+    e a vaga de concorrência é liberada, evitando pagar por uma geração que ninguém lê.
+    O mesmo vale para um stream que trava: cada pedaço tem uma espera máxima
+    (`AI_STREAM_IDLE_TIMEOUT_SECONDS`) e a geração inteira um prazo
+    (`AI_STREAM_MAX_SECONDS`); estourado qualquer um, sobe `asyncio.TimeoutError`.
+    Streams não são repetidos (o cliente já pode ter recebido parte do texto).
+    """
+    async with limiter.slot(tenant_id):
+        await scheduler.aacquire(model_name, estimate_tokens(prompt), Priority.interactive)
+        response = await asyncio.wait_for(
+            model.generate_content_async(prompt, stream=True),
+            timeout=settings.AI_CALL_TIMEOUT_SECONDS,
+        )
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.AI_STREAM_MAX_SECONDS
+        chunks = response.__aiter__()
+        try:
+            while True:
+                timeout = min(settings.AI_STREAM_IDLE_TIMEOUT_SECONDS, max(0.0, deadline - loop.time()))
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+                except StopAsyncIteration:
+                    return
+                text = chunk.text
+                if text:
+                    yield text
+        finally:
+            await _close_upstream(response)
+
+
+def stream_tutor_answer(question: str, context: str | None, tenant_id: str | None = None):
+    """Versão em streaming de `ask_tutor`; retorna um gerador assíncrono de texto."""
+    model = ai_services.get_model(ai_services.TUTOR_MODEL)
+    return _stream(ai_services.TUTOR_MODEL, model, ai_services.build_tutor_prompt(question, context), tenant_id)
+
+
+def stream_summary(text_to_summarize: str, tenant_id: str | None = None):
+    """Versão em streaming de `summarize_content`; retorna um gerador assíncrono de texto."""
+    model = ai_services.get_model(ai_services.SUMMARY_MODEL)
+    return _stream(ai_services.SUMMARY_MODEL, model, ai_services.build_summary_prompt(text_to_summarize), tenant_id)
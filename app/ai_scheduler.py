@@ -0,0 +1,240 @@
+"""
+Agendador das chamadas ao Gemini: orçamento por modelo, prioridades e retentativas.
+
+Cada modelo tem dois baldes de fichas (token bucket) por minuto: um de
+requisições (RPM) e outro de tokens estimados (TPM). Os baldes vivem no Redis,
+atualizados por um script Lua atômico, e por isso a API e todos os workers do
+Celery dividem a mesma cota; sem Redis (ou nos testes) usa-se um balde em memória
+por processo.
+
+Há duas prioridades:
+
+- `interactive` (tutor, redação, resumo): pode usar o balde inteiro, espera pouco
+  por vaga e tenta de novo no máximo uma vez, para o aluno não ficar preso nem
+  gastar cota em retentativas durante picos;
+- `background` (análise de erros, ingestão de provas, embeddings): não consome a
+  reserva final de cada balde (`AI_BACKGROUND_RESERVE_FRACTION`), espera o quanto
+  for preciso dentro de um limite maior e tenta de novo mais vezes.
+
+Só erros transitórios (429 e 5xx) são repetidos, com backoff exponencial com
+jitter completo; os demais sobem imediatamente para o chamador.
+"""
+import asyncio
+import random
+import threading
+import time
+from enum import IntEnum
+from typing import Awaitable, Callable, TypeVar
+
+import redis
+from google.api_core import exceptions as google_exceptions
+
+from .config import settings
+from .redis_client import get_async_redis, get_redis
+
+T = TypeVar("T")
+
+KEY_PREFIX = "ai_budget"
+
+RETRYABLE_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+class Priority(IntEnum):
+    interactive = 0
+    background = 1
+
+
+class AIRateLimited(Exception):
+    """O orçamento do modelo não liberou vaga dentro da espera máxima da prioridade."""
+
+
+def estimate_tokens(text: str) -> int:
+    # Aproximação usual de ~4 caracteres por token; basta para o orçamento.
+    return max(1, len(text) // 4)
+
+
+# Os dois baldes (requisições e tokens) são verificados e debitados juntos:
+# ou a chamada cabe nos dois, ou nenhum é debitado e volta a espera em ms.
+_ACQUIRE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local wait = 0
+local levels = {}
+for i = 1, 2 do
+    local capacity = tonumber(ARGV[(i - 1) * 2 + 1])
+    local cost = tonumber(ARGV[(i - 1) * 2 + 2])
+    local floor = capacity * tonumber(ARGV[5])
+    local state = redis.call('HMGET', KEYS[i], 'level', 'ts')
+    local level = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    level = math.min(capacity, level + (now - ts) * capacity / 60000)
+    levels[i] = level
+    if level - cost < floor then
+        wait = math.max(wait, math.ceil((cost + floor - level) * 60000 / capacity))
+    end
+end
+for i = 1, 2 do
+    local level = levels[i]
+    if wait == 0 then
+        level = level - tonumber(ARGV[(i - 1) * 2 + 2])
+    end
+    redis.call('HSET', KEYS[i], 'level', level, 'ts', now)
+    redis.call('PEXPIRE', KEYS[i], 120000)
+end
+return wait
+"""
+
+
+class MemoryTokenBucket:
+    """Baldes por processo; mesmo algoritmo do script Lua, com relógio monotônico."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def acquire(self, model: str, limits: tuple[int, int], costs: tuple[int, int], reserve: float) -> float:
+        """Debita `costs` se couberem e devolve 0; senão, os segundos até caberem."""
+        now = time.monotonic()
+        with self._lock:
+            keys = (f"{model}:requests", f"{model}:tokens")
+            levels, wait = [], 0.0
+            for key, capacity, cost in zip(keys, limits, costs):
+                level, ts = self._buckets.get(key, (capacity, now))
+                level = min(capacity, level + (now - ts) * capacity / 60)
+                levels.append(level)
+                floor = capacity * reserve
+                if level - cost < floor:
+                    wait = max(wait, (cost + floor - level) * 60 / capacity)
+            for key, level, cost in zip(keys, levels, costs):
+                self._buckets[key] = (level - cost if wait == 0 else level, now)
+            return wait
+
+    async def aacquire(self, model: str, limits: tuple[int, int], costs: tuple[int, int], reserve: float) -> float:
+        return self.acquire(model, limits, costs, reserve)
+
+
+class RedisTokenBucket:
+    """Baldes compartilhados no Redis; cai para o balde em memória se o Redis falhar."""
+
+    def __init__(self, fallback: MemoryTokenBucket):
+        self.fallback = fallback
+
+    @staticmethod
+    def _keys(model: str) -> list[str]:
+        return [f"{KEY_PREFIX}:{model}:requests", f"{KEY_PREFIX}:{model}:tokens"]
+
+    @staticmethod
+    def _args(limits: tuple[int, int], costs: tuple[int, int], reserve: float) -> list:
+        return [limits[0], costs[0], limits[1], costs[1], reserve]
+
+    def acquire(self, model: str, limits: tuple[int, int], costs: tuple[int, int], reserve: float) -> float:
+        client = get_redis()
+        if client is not None:
+            try:
+                return int(client.eval(_ACQUIRE_SCRIPT, 2, *self._keys(model), *self._args(limits, costs, reserve))) / 1000
+            except redis.exceptions.RedisError as e:
+                print(f"Orçamento de IA no Redis indisponível, usando o limite local: {e}")
+        return self.fallback.acquire(model, limits, costs, reserve)
+
+    async def aacquire(self, model: str, limits: tuple[int, int], costs: tuple[int, int], reserve: float) -> float:
+        client = get_async_redis()
+        if client is not None:
+            try:
+                return int(await client.eval(_ACQUIRE_SCRIPT, 2, *self._keys(model), *self._args(limits, costs, reserve))) / 1000
+            except redis.exceptions.RedisError as e:
+                print(f"Orçamento de IA no Redis indisponível, usando o limite local: {e}")
+        return self.fallback.acquire(model, limits, costs, reserve)
+
+
+class AIScheduler:
+    def __init__(self, bucket: MemoryTokenBucket | RedisTokenBucket):
+        self.bucket = bucket
+
+    @staticmethod
+    def limits(model: str) -> tuple[int, int]:
+        rpm, tpm = settings.AI_RATE_LIMITS.get(model, (settings.AI_DEFAULT_RPM, settings.AI_DEFAULT_TPM))
+        return rpm, tpm
+
+    @staticmethod
+    def _policy(priority: Priority) -> tuple[float, float, int]:
+        """(reserva do balde que não pode ser usada, espera máxima por vaga, retentativas)."""
+        if priority == Priority.interactive:
+            return 0.0, settings.AI_INTERACTIVE_MAX_WAIT_SECONDS, settings.AI_INTERACTIVE_MAX_RETRIES
+        return settings.AI_BACKGROUND_RESERVE_FRACTION, settings.AI_BACKGROUND_MAX_WAIT_SECONDS, settings.AI_BACKGROUND_MAX_RETRIES
+
+    def _costs(self, model: str, tokens: int, reserve: float) -> tuple[int, int]:
+        # Um pedido maior que o balde utilizável nunca caberia; é limitado à capacidade.
+        _, tpm = self.limits(model)
+        return 1, min(tokens, int(tpm * (1 - reserve)))
+
+    @staticmethod
+    def backoff(attempt: int) -> float:
+        """Backoff exponencial com jitter completo: uniforme em [0, min(teto, base * 2^tentativa)]."""
+        return random.uniform(0, min(settings.AI_RETRY_MAX_SECONDS, settings.AI_RETRY_BASE_SECONDS * 2 ** attempt))
+
+    def acquire(self, model: str, tokens: int, priority: Priority = Priority.background):
+        """Bloqueia até o orçamento do modelo liberar a chamada (ou levanta AIRateLimited)."""
+        reserve, max_wait, _ = self._policy(priority)
+        limits, costs = self.limits(model), self._costs(model, tokens, reserve)
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.bucket.acquire(model, limits, costs, reserve)
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise AIRateLimited(f"Orçamento de {model} esgotado ({priority.name})")
+            # O jitter evita que todos os processos em espera acordem juntos.
+            time.sleep(wait + random.uniform(0, wait / 4))
+
+    async def aacquire(self, model: str, tokens: int, priority: Priority = Priority.interactive):
+        """Versão assíncrona de `acquire`."""
+        reserve, max_wait, _ = self._policy(priority)
+        limits, costs = self.limits(model), self._costs(model, tokens, reserve)
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = await self.bucket.aacquire(model, limits, costs, reserve)
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise AIRateLimited(f"Orçamento de {model} esgotado ({priority.name})")
+            await asyncio.sleep(wait + random.uniform(0, wait / 4))
+
+    def call(self, model: str, fn: Callable[[], T], *, tokens: int, priority: Priority = Priority.background) -> T:
+        """Executa `fn` dentro do orçamento de `model`, repetindo erros transitórios."""
+        _, _, max_retries = self._policy(priority)
+        for attempt in range(max_retries + 1):
+            self.acquire(model, tokens, priority)
+            try:
+                return fn()
+            except RETRYABLE_ERRORS:
+                if attempt >= max_retries:
+                    raise
+            time.sleep(self.backoff(attempt))
+
+    async def acall(self, model: str, fn: Callable[[], Awaitable[T]], *, tokens: int, priority: Priority = Priority.interactive) -> T:
+        """Versão assíncrona de `call`; `fn` cria uma nova corrotina a cada tentativa."""
+        _, _, max_retries = self._policy(priority)
+        for attempt in range(max_retries + 1):
+            await self.aacquire(model, tokens, priority)
+            try:
+                return await fn()
+            except RETRYABLE_ERRORS:
+                if attempt >= max_retries:
+                    raise
+            await asyncio.sleep(self.backoff(attempt))
+
+
+local_bucket = MemoryTokenBucket()
+scheduler = AIScheduler(RedisTokenBucket(local_bucket) if settings.AI_RATE_LIMIT_USE_REDIS else local_bucket)
@@ -1,7 +1,12 @@
 import google.generativeai as genai
 from .config import settings
-from . import schemas
+from . import models, schemas
+from .analysis_cache import analysis_cache
+from .embedding_store import EmbeddingStore, content_hash
+from .ai_scheduler import RETRYABLE_ERRORS, AIRateLimited, Priority, estimate_tokens, scheduler
 import json
+import threading
+import time
 
 # Configura a API do Gemini com a chave das configurações
 try:
@@ -10,155 +15,293 @@ except Exception as e:
     print(f"Erro ao configurar a API do Gemini: {e}")
     # A aplicação pode continuar, mas as funcionalidades de IA falharão.
 
+ERROR_ANALYSIS_MODEL = 'gemini-2.0-flash'
+ESSAY_MODEL = 'gemini-1.5-flash'
+TUTOR_MODEL = 'gemini-1.5-flash'
+SUMMARY_MODEL = 'gemini-1.5-flash'
+EXAM_MODEL = 'gemini-1.5-flash'
+EMBEDDING_MODEL = "models/embedding-001"
+
+embedding_store = EmbeddingStore(settings.EMBEDDING_STORE_PATH, model=EMBEDDING_MODEL)
+
+_models: dict[str, genai.GenerativeModel] = {}
+_models_lock = threading.Lock()
+
+def get_model(name: str, generation_config: dict | None = None) -> genai.GenerativeModel:
+    """
+    Retorna o handle do modelo, criado uma única vez por processo e reutilizado
+    (junto com o seu canal gRPC) por todas as chamadas síncronas e assíncronas.
+    """
+    key = name if generation_config is None else f"{name}:{json.dumps(generation_config, sort_keys=True)}"
+    model = _models.get(key)
+    if model is None:
+        with _models_lock:
+            model = _models.get(key)
+            if model is None:
+                if generation_config is None:
+                    model = genai.GenerativeModel(name)
+                else:
+                    model = genai.GenerativeModel(name, generation_config=generation_config)
+                _models[key] = model
+    return model
+
 def generate_embedding(text: str) -> list[float] | None:
     """
     Gera o embedding (vetor) para um dado texto usando os modelos do Gemini.
     """
+    return generate_embeddings([text])[0]
+
+def _embedding_batches(texts: list[str]) -> list[list[int]]:
+    """Agrupa os índices dos textos em lotes limitados por quantidade e por tokens estimados."""
+    batches, current, current_tokens = [], [], 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= settings.EMBEDDING_BATCH_SIZE or current_tokens + tokens > settings.EMBEDDING_BATCH_MAX_TOKENS):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def _embed_batch(texts: list[str], indices: list[int], embeddings: list, attempt: int = 0):
+    content = [texts[i] for i in indices]
     try:
-        # Utiliza o modelo de embedding recomendado
-        result = genai.embed_content(
-            model="models/embedding-001",
-            content=text,
-            task_type="RETRIEVAL_DOCUMENT" # Otimizado para busca de documentos
+        result = scheduler.call(
+            EMBEDDING_MODEL,
+            lambda: genai.embed_content(
+                model=EMBEDDING_MODEL,
+                content=content,
+                task_type="RETRIEVAL_DOCUMENT" # Otimizado para busca de documentos
+            ),
+            tokens=sum(estimate_tokens(text) for text in content),
         )
-        return result['embedding']
+        for i, vector in zip(indices, result['embedding']):
+            embeddings[i] = vector
+    except (*RETRYABLE_ERRORS, AIRateLimited):
+        # Cota ou serviço indisponível: o scheduler já fez as retentativas; dividir
+        # o lote só gastaria mais cota. Quem chama interrompe os lotes restantes.
+        raise
     except Exception as e:
-        print(f"Erro ao gerar embedding com Gemini: {e}")
-        return None
+        if attempt >= settings.EMBEDDING_MAX_RETRIES:
+            print(f"Erro ao gerar embeddings com Gemini ({len(indices)} textos descartados): {e}")
+            return
+        time.sleep(settings.EMBEDDING_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+        if len(indices) == 1:
+            _embed_batch(texts, indices, embeddings, attempt + 1)
+            return
+        # Divide o lote ao meio para isolar textos problemáticos sem perder o restante.
+        middle = len(indices) // 2
+        _embed_batch(texts, indices[:middle], embeddings, attempt + 1)
+        _embed_batch(texts, indices[middle:], embeddings, attempt + 1)
+
+def generate_embeddings(texts: list[str]) -> list[list[float] | None]:
+    """
+    Gera embeddings para vários textos com o mínimo de chamadas à API: o store
+    local é consultado primeiro, textos repetidos são enviados uma única vez, os
+    demais vão em lotes (limitados por quantidade e por tokens estimados) e os
+    lotes rejeitados são divididos e tentados de novo. Erros de cota ou de
+    disponibilidade (já repetidos pelo `ai_scheduler`) interrompem os lotes
+    restantes. Retorna uma lista alinhada
+    com `texts`, com None nas posições que não puderam ser processadas.
+    """
+    use_store = settings.EMBEDDING_STORE_ENABLED
+    embeddings = embedding_store.get_many(texts) if use_store else [None] * len(texts)
+
+    # Um único pedido por conteúdo distinto ainda sem vetor.
+    positions: dict[str, list[int]] = {}
+    for i, text in enumerate(texts):
+        if embeddings[i] is None:
+            positions.setdefault(content_hash(text), []).append(i)
+    if not positions:
+        return embeddings
+
+    pending = [texts[indices[0]] for indices in positions.values()]
+    computed: list[list[float] | None] = [None] * len(pending)
+    for indices in _embedding_batches(pending):
+        try:
+            _embed_batch(pending, indices, computed)
+        except (*RETRYABLE_ERRORS, AIRateLimited) as e:
+            print(f"Embeddings interrompidos com a API indisponível ou sem cota: {e}")
+            break
+    for indices, vector in zip(positions.values(), computed):
+        for i in indices:
+            embeddings[i] = vector
+
+    if use_store:
+        embedding_store.put_many(pending, computed)
+    return embeddings
+
+def build_error_analysis_prompt(question: schemas.Question, student_answer: str) -> str:
+    """Constrói o prompt detalhado para a análise de erro."""
+    return f"""
+    Você é um tutor especialista em concursos e vestibulares. Sua tarefa é analisar o erro de um aluno.
+
+    **Contexto da Questão:**
+    - **Matéria:** {question.subject}
+    - **Tópico:** {question.topic}
+    - **Enunciado:** {question.content}
+    - **Opções:** {json.dumps(question.options, indent=2, ensure_ascii=False)}
+    - **Alternativa Correta:** {question.correct_option}
+
+    **Resposta do Aluno:**
+    O aluno marcou a alternativa: **{student_answer}**
+
+    **Sua Análise:**
+    Analise o erro mais provável do aluno. Foque em identificar a natureza do erro.
+    Responda em formato JSON, com as seguintes chaves:
+    - "error_type": Uma categoria para o erro. Escolha uma das seguintes: ["conceptual_confusion", "misinterpretation", "calculation_error", "inattention", "unknown"].
+    - "brief_explanation": Uma explicação curta e direta (máximo 2 frases) sobre o erro, como se você estivesse falando com o aluno.
+    - "detailed_feedback": Um feedback mais completo, explicando o conceito correto e por que a alternativa do aluno está errada.
+
+    **Exemplo de Resposta JSON:**
+    {{
+      "error_type": "conceptual_confusion",
+      "brief_explanation": "Você parece ter confundido os conceitos de 'soberania' e 'autonomia'. A soberania é um atributo do Estado Federal, enquanto a autonomia é dos estados-membros.",
+      "detailed_feedback": "A questão aborda a organização do Estado brasileiro. A alternativa correta aponta para a soberania da República Federativa do Brasil. A alternativa que você marcou fala em soberania dos estados, mas na verdade, os estados (como São Paulo ou Bahia) possuem autonomia política e administrativa, mas não soberania, que é a característica do país como um todo no cenário internacional."
+    }}
+
+    **Sua resposta JSON:**
+    """
+
+def request_error_analysis(question: schemas.Question, student_answer: str) -> dict:
+    """
+    Pede ao Gemini a análise do erro do aluno (ou a reaproveita do cache) sem
+    fallback: os erros sobem para quem precisa distinguir uma falha transitória
+    (`RETRYABLE_ERRORS`, `AIRateLimited`) de uma definitiva.
+    """
+    cached_analysis = analysis_cache.get(question, student_answer)
+    if cached_analysis is not None:
+        return cached_analysis
+
+    # Seleciona o modelo generativo (Flash é rápido e eficiente)
+    model = get_model(ERROR_ANALYSIS_MODEL)
+    prompt = build_error_analysis_prompt(question, student_answer)
+
+    response = scheduler.call(
+        ERROR_ANALYSIS_MODEL, lambda: model.generate_content(prompt), tokens=estimate_tokens(prompt)
+    )
+
+    # Limpa e parseia a resposta para garantir que é um JSON válido
+    cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
+    analysis = json.loads(cleaned_response)
+    analysis_cache.set(question, student_answer, analysis)
+    return analysis
 
 def analyze_student_error(question: schemas.Question, student_answer: str) -> dict | None:
     """
     Utiliza um modelo generativo do Gemini para analisar o erro de um aluno.
+    Análises já feitas para a mesma questão e alternativa vêm do cache.
     """
     try:
-        # Seleciona o modelo generativo (Flash é rápido e eficiente)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-
-        # Constrói o prompt detalhado para a IA
-        prompt = f"""
-        Você é um tutor especialista em concursos e vestibulares. Sua tarefa é analisar o erro de um aluno.
-
-        **Contexto da Questão:**
-        - **Matéria:** {question.subject}
-        - **Tópico:** {question.topic}
-        - **Enunciado:** {question.content}
-        - **Opções:** {json.dumps(question.options, indent=2, ensure_ascii=False)}
-        - **Alternativa Correta:** {question.correct_option}
-
-        **Resposta do Aluno:**
-        O aluno marcou a alternativa: **{student_answer}**
-
-        **Sua Análise:**
-        Analise o erro mais provável do aluno. Foque em identificar a natureza do erro.
-        Responda em formato JSON, com as seguintes chaves:
-        - "error_type": Uma categoria para o erro. Escolha uma das seguintes: ["conceptual_confusion", "misinterpretation", "calculation_error", "inattention", "unknown"].
-        - "brief_explanation": Uma explicação curta e direta (máximo 2 frases) sobre o erro, como se você estivesse falando com o aluno.
-        - "detailed_feedback": Um feedback mais completo, explicando o conceito correto e por que a alternativa do aluno está errada.
-
-        **Exemplo de Resposta JSON:**
-        {{
-          "error_type": "conceptual_confusion",
-          "brief_explanation": "Você parece ter confundido os conceitos de 'soberania' e 'autonomia'. A soberania é um atributo do Estado Federal, enquanto a autonomia é dos estados-membros.",
-          "detailed_feedback": "A questão aborda a organização do Estado brasileiro. A alternativa correta aponta para a soberania da República Federativa do Brasil. A alternativa que você marcou fala em soberania dos estados, mas na verdade, os estados (como São Paulo ou Bahia) possuem autonomia política e administrativa, mas não soberania, que é a característica do país como um todo no cenário internacional."
-        }}
-
-        **Sua resposta JSON:**
-        """
-
-        response = model.generate_content(prompt)
-        
-        # Limpa e parseia a resposta para garantir que é um JSON válido
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-        return json.loads(cleaned_response)
+        return request_error_analysis(question, student_answer)
 
     except Exception as e:
         print(f"Erro ao analisar erro com Gemini: {e}")
         return {
-            "error_type": "analysis_failed",
+            "error_type": models.ANALYSIS_FAILED,
             "brief_explanation": "Não foi possível realizar a análise da sua resposta no momento.",
             "detailed_feedback": "Ocorreu um erro ao tentar se comunicar com o serviço de IA. Tente novamente mais tarde."
         }
 
+# Schema JSON que a API do Gemini deve retornar na correção de redação.
+# Isto corresponde ao schema Pydantic EssayGradeResponse.
+ESSAY_JSON_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "feedback_geral": {"type": "STRING"},
+        "nota_total": {"type": "NUMBER"},
+        "criterios": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "nome": {"type": "STRING"},
+                    "nota": {"type": "NUMBER"},
+                    "feedback": {"type": "STRING"}
+                },
+                "required": ["nome", "nota", "feedback"]
+            }
+        }
+    },
+    "required": ["feedback_geral", "nota_total", "criterios"]
+}
+ESSAY_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": ESSAY_JSON_SCHEMA}
+
+def build_essay_prompt(essay_text: str, theme: str) -> str:
+    """Constrói o prompt de correção de redação."""
+    return f"""
+    Aja como um corretor de redações do ENEM. Avalie a seguinte redação com o tema "{theme}".
+    Forneça um feedback detalhado para cada um dos 5 critérios do ENEM (Competência 1: Domínio da norma culta; Competência 2: Compreensão do tema e estrutura; Competência 3: Argumentação; Competência 4: Conhecimento dos mecanismos linguísticos; Competência 5: Proposta de intervenção).
+    Dê uma nota de 0 a 200 para cada critério. A nota total deve ser a soma das notas dos critérios.
+    Retorne a resposta estritamente no formato JSON solicitado.
+
+    Texto da redação:
+    \"\"\"
+    {essay_text}
+    \"\"\"
+    """
+
 def grade_essay_with_gemini(essay_text: str, theme: str) -> dict | None:
     """
     Utiliza o Gemini para corrigir uma redação com base nos critérios do ENEM,
     forçando uma resposta em JSON estruturado.
     """
     try:
-        # Define o schema JSON que a API do Gemini deve retornar.
-        # Isto corresponde ao schema Pydantic EssayGradeResponse.
-        json_schema = {
-            "type": "OBJECT",
-            "properties": {
-                "feedback_geral": {"type": "STRING"},
-                "nota_total": {"type": "NUMBER"},
-                "criterios": {
-                    "type": "ARRAY",
-                    "items": {
-                        "type": "OBJECT",
-                        "properties": {
-                            "nome": {"type": "STRING"},
-                            "nota": {"type": "NUMBER"},
-                            "feedback": {"type": "STRING"}
-                        },
-                        "required": ["nome", "nota", "feedback"]
-                    }
-                }
-            },
-            "required": ["feedback_geral", "nota_total", "criterios"]
-        }
-
         # Configura o modelo para usar o modo de geração JSON
-        model = genai.GenerativeModel(
-            'gemini-1.5-flash',
-            generation_config={"response_mime_type": "application/json", "response_schema": json_schema}
-        )
-        
-        # Constrói o prompt
-        prompt = f"""
-        Aja como um corretor de redações do ENEM. Avalie a seguinte redação com o tema "{theme}".
-        Forneça um feedback detalhado para cada um dos 5 critérios do ENEM (Competência 1: Domínio da norma culta; Competência 2: Compreensão do tema e estrutura; Competência 3: Argumentação; Competência 4: Conhecimento dos mecanismos linguísticos; Competência 5: Proposta de intervenção).
-        Dê uma nota de 0 a 200 para cada critério. A nota total deve ser a soma das notas dos critérios.
-        Retorne a resposta estritamente no formato JSON solicitado.
+        model = get_model(ESSAY_MODEL, generation_config=ESSAY_GENERATION_CONFIG)
+        prompt = build_essay_prompt(essay_text, theme)
 
-        Texto da redação:
-        \"\"\"
-        {essay_text}
-        \"\"\"
-        """
-
-        response = model.generate_content(prompt)
+        response = scheduler.call(
+            ESSAY_MODEL, lambda: model.generate_content(prompt),
+            tokens=estimate_tokens(prompt), priority=Priority.interactive
+        )
         return json.loads(response.text)
 
     except Exception as e:
         print(f"Erro em grade_essay_with_gemini: {e}")
         return None
 
+def build_tutor_prompt(question: str, context: str | None) -> str:
+    """Constrói o prompt do assistente tutor."""
+    return f"""
+    Você é um tutor amigável e experiente. Um aluno tem a seguinte dúvida: "{question}".
+    Se houver um contexto de estudo, use-o para basear a sua resposta.
+    Contexto: \"\"\"{context or 'Nenhum'}\"\"\".
+    Explique o conceito de forma clara e simples, como se estivesse a dar uma aula particular.
+    """
+
 def ask_tutor_with_gemini(question: str, context: str | None) -> str | None:
     """Usa o Gemini para responder a uma dúvida de um aluno."""
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        prompt = f"""
-        Você é um tutor amigável e experiente. Um aluno tem a seguinte dúvida: "{question}".
-        Se houver um contexto de estudo, use-o para basear a sua resposta.
-        Contexto: \"\"\"{context or 'Nenhum'}\"\"\".
-        Explique o conceito de forma clara e simples, como se estivesse a dar uma aula particular.
-        """
-        response = model.generate_content(prompt)
+        model = get_model(TUTOR_MODEL)
+        prompt = build_tutor_prompt(question, context)
+        response = scheduler.call(
+            TUTOR_MODEL, lambda: model.generate_content(prompt),
+            tokens=estimate_tokens(prompt), priority=Priority.interactive
+        )
         return response.text
     except Exception as e:
         print(f"Erro em askTutor:", e)
         return None
 
+def build_summary_prompt(text_to_summarize: str) -> str:
+    """Constrói o prompt do resumidor."""
+    return f"""
+    Resuma o seguinte texto em 3 a 5 pontos principais (bullet points), focando nas ideias mais importantes para quem está a estudar para uma prova.
+    Texto: \"\"\"{text_to_summarize}\"\"\"
+    """
+
 def summarize_content_with_gemini(text_to_summarize: str) -> str | None:
     """Usa o Gemini para resumir um texto."""
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        prompt = f"""
-        Resuma o seguinte texto em 3 a 5 pontos principais (bullet points), focando nas ideias mais importantes para quem está a estudar para uma prova.
-        Texto: \"\"\"{text_to_summarize}\"\"\"
-        """
-        response = model.generate_content(prompt)
+        model = get_model(SUMMARY_MODEL)
+        prompt = build_summary_prompt(text_to_summarize)
+        response = scheduler.call(
+            SUMMARY_MODEL, lambda: model.generate_content(prompt),
+            tokens=estimate_tokens(prompt), priority=Priority.interactive
+        )
         return response.text
     except Exception as e:
         print(f"Erro em summarizeContent:", e)
@@ -198,8 +341,8 @@ def structure_exam_from_text(text: str) -> dict | None:
             "required": ["questions"]
         }
         
-        model = genai.GenerativeModel(
-            'gemini-1.5-flash',
+        model = get_model(
+            EXAM_MODEL,
             generation_config={"response_mime_type": "application/json", "response_schema": json_schema}
         )
         
@@ -215,7 +358,7 @@ def structure_exam_from_text(text: str) -> dict | None:
         {text}
         \"\"\"
         """
-        response = model.generate_content(prompt)
+        response = scheduler.call(EXAM_MODEL, lambda: model.generate_content(prompt), tokens=estimate_tokens(prompt))
         return json.loads(response.text)
     except Exception as e:
         print(f"Erro ao estruturar prova com Gemini: {e}")
@@ -0,0 +1,209 @@
+"""
+Backfill periódico das análises de erro que falharam.
+
+Quando o Gemini está fora, `ai_services.analyze_student_error` devolve o
+fallback `analysis_failed`, que fica gravado em `StudentAnswer.ai_analysis`
+(e respostas cuja tarefa se perdeu ficam sem análise). Esta rotina percorre
+essas respostas e refaz as análises:
+
+- a varredura é paginada por keyset em `(answered_at, id)`, servida pelo índice
+  parcial `ix_student_answers_analysis_pending`, nunca por OFFSET;
+- cada página é agrupada por (questão, alternativa marcada): um grupo gera uma
+  única análise (que ainda passa pelo `analysis_cache`) aplicada a todas as
+  respostas dele com um único UPDATE em lote por página;
+- as chamadas usam a prioridade `background` do `ai_scheduler`, então respeitam
+  o orçamento compartilhado e deixam a reserva para o tutor e a redação;
+- se nenhuma análise da página der certo e alguma falhou por erro transitório
+  (Gemini fora, orçamento esgotado), a rodada para sem avançar o cursor; grupos
+  que falham por erro definitivo (resposta inválida, questão apagada) não
+  seguram o cursor e são reencontrados só na próxima passagem.
+
+O cursor e os contadores ficam num hash do Redis: uma rodada interrompida
+(limite de páginas, worker reiniciado) continua de onde parou, e o progresso
+pode ser lido em `/admin/analyses/backfill`. Um lock impede rodadas simultâneas.
+"""
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+import redis
+from sqlalchemy import tuple_, update
+from sqlalchemy.orm import Session
+
+from . import ai_services, models, schemas
+from .ai_scheduler import RETRYABLE_ERRORS, AIRateLimited
+from .config import settings
+from .redis_client import get_redis
+
+PROGRESS_KEY = "analysis_backfill:progress"
+LOCK_KEY = "analysis_backfill:lock"
+
+Cursor = tuple[datetime, UUID]
+Group = tuple[UUID, str]
+
+
+def _pending_page(db: Session, cursor: Cursor | None, cutoff: datetime, page_size: int) -> list:
+    query = db.query(
+        models.StudentAnswer.id,
+        models.StudentAnswer.question_id,
+        models.StudentAnswer.selected_option,
+        models.StudentAnswer.answered_at,
+    ).filter(
+        models.analysis_pending_clause(models.StudentAnswer.is_correct, models.StudentAnswer.ai_analysis),
+        # Respostas recentes ainda podem estar na fila da tarefa de análise.
+        models.StudentAnswer.answered_at < cutoff,
+    )
+    if cursor is not None:
+        query = query.filter(tuple_(models.StudentAnswer.answered_at, models.StudentAnswer.id) > cursor)
+    return query.order_by(models.StudentAnswer.answered_at, models.StudentAnswer.id).limit(page_size).all()
+
+
+def _analyze(question: schemas.Question, student_answer: str) -> tuple[dict | None, bool]:
+    """(análise, transitória): a análise é None quando falhou e `transitória` diz se vale insistir."""
+    try:
+        analysis = ai_services.request_error_analysis(question, student_answer)
+    except (*RETRYABLE_ERRORS, AIRateLimited) as e:
+        print(f"Análise adiada pelo backfill (erro transitório): {e}")
+        return None, True
+    except Exception as e:
+        print(f"Análise descartada pelo backfill: {e}")
+        return None, False
+    if not isinstance(analysis, dict) or analysis.get("error_type") == models.ANALYSIS_FAILED:
+        return None, False
+    return analysis, False
+
+
+def analyze_groups(db: Session, groups: list[Group]) -> tuple[dict[Group, dict], set[Group]]:
+    """
+    Uma análise por (questão, alternativa), em paralelo. Retorna as análises que
+    deram certo e os grupos que falharam por erro transitório.
+    """
+    questions = {
+        question.id: schemas.Question.model_validate(question)
+        for question in db.query(models.Question).filter(models.Question.id.in_({qid for qid, _ in groups}))
+    }
+    jobs = [group for group in groups if group[0] in questions]
+    with ThreadPoolExecutor(max_workers=settings.AI_ANALYSIS_BATCH_CONCURRENCY) as executor:
+        results = list(executor.map(lambda group: _analyze(questions[group[0]], group[1]), jobs))
+    analyses = {group: analysis for group, (analysis, _) in zip(jobs, results) if analysis is not None}
+    transient = {group for group, (_, is_transient) in zip(jobs, results) if is_transient}
+    return analyses, transient
+
+
+def _load_state(client: redis.Redis | None) -> dict:
+    if client is None:
+        return {}
+    try:
+        return client.hgetall(PROGRESS_KEY)
+    except redis.exceptions.RedisError as e:
+        print(f"Erro ao ler o progresso do backfill: {e}")
+        return {}
+
+
+def _save_state(client: redis.Redis | None, fields: dict, counters: dict | None = None, reset: bool = False):
+    if client is None:
+        return
+    try:
+        pipe = client.pipeline()
+        if reset:
+            pipe.delete(PROGRESS_KEY)
+        pipe.hset(PROGRESS_KEY, mapping={**fields, "updated_at": datetime.now(timezone.utc).isoformat()})
+        for name, amount in (counters or {}).items():
+            pipe.hincrby(PROGRESS_KEY, name, amount)
+        pipe.execute()
+    except redis.exceptions.RedisError as e:
+        print(f"Erro ao gravar o progresso do backfill: {e}")
+
+
+def _cursor_from_state(state: dict) -> Cursor | None:
+    if not state.get("cursor_id"):
+        return None
+    return datetime.fromisoformat(state["cursor_answered_at"]), UUID(state["cursor_id"])
+
+
+def get_progress() -> dict:
+    """Progresso da passagem atual (ou da última concluída) do backfill."""
+    state = _load_state(get_redis())
+    return {
+        key: int(value) if key in ("scanned", "analyzed", "failed", "pages") else value
+        for key, value in state.items()
+    }
+
+
+def backfill_failed_analyses(db: Session, page_size: int | None = None, max_pages: int | None = None) -> dict:
+    """
+    Processa até `max_pages` páginas de respostas com análise pendente a partir do
+    cursor salvo. Retorna os contadores desta rodada e o status em que ela terminou:
+    `completed` (varredura chegou ao fim; a próxima recomeça do início), `partial`
+    (limite de páginas; continua na próxima), `paused` (Gemini indisponível) ou `locked`.
+    """
+    page_size = page_size or settings.ANALYSIS_BACKFILL_PAGE_SIZE
+    max_pages = max_pages or settings.ANALYSIS_BACKFILL_MAX_PAGES
+    client = get_redis()
+    token = str(uuid.uuid4())
+    try:
+        if client is not None and not client.set(LOCK_KEY, token, nx=True, ex=settings.ANALYSIS_BACKFILL_LOCK_SECONDS):
+            return {"status": "locked", "scanned": 0, "analyzed": 0, "failed": 0}
+    except redis.exceptions.RedisError as e:
+        print(f"Lock do backfill indisponível, seguindo sem ele: {e}")
+        client = None
+
+    try:
+        cursor = _cursor_from_state(_load_state(client))
+        if cursor is None:
+            _save_state(client, {"status": "running", "started_at": datetime.now(timezone.utc).isoformat()}, reset=True)
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.ANALYSIS_BACKFILL_MIN_AGE_SECONDS)
+        totals = {"scanned": 0, "analyzed": 0, "failed": 0}
+        status = "partial"
+
+        for _ in range(max_pages):
+            rows = _pending_page(db, cursor, cutoff, page_size)
+            if not rows:
+                status = "completed"
+                break
+
+            answers_by_group: dict[Group, list[UUID]] = defaultdict(list)
+            for answer_id, question_id, selected_option, _ in rows:
+                answers_by_group[(question_id, selected_option)].append(answer_id)
+            analyses, transient = analyze_groups(db, list(answers_by_group))
+            if transient and not analyses:
+                status = "paused"
+                break
+
+            if analyses:
+                db.execute(update(models.StudentAnswer), [
+                    {"id": answer_id, "ai_analysis": analysis}
+                    for group, analysis in analyses.items()
+                    for answer_id in answers_by_group[group]
+                ])
+                db.commit()
+
+            analyzed = sum(len(answers_by_group[group]) for group in analyses)
+            page = {"scanned": len(rows), "analyzed": analyzed, "failed": len(rows) - analyzed}
+            for name, amount in page.items():
+                totals[name] += amount
+            cursor = (rows[-1].answered_at, rows[-1].id)
+            _save_state(
+                client,
+                {"status": "running", "cursor_answered_at": cursor[0].isoformat(), "cursor_id": str(cursor[1])},
+                counters={**page, "pages": 1},
+            )
+            if len(rows) < page_size:
+                status = "completed"
+                break
+
+        if status == "completed":
+            # Próxima rodada recomeça do início e reencontra o que ainda falhou.
+            _save_state(client, {"status": "completed", "cursor_answered_at": "", "cursor_id": ""})
+        else:
+            _save_state(client, {"status": status})
+        return {"status": status, **totals}
+    finally:
+        if client is not None:
+            try:
+                if client.get(LOCK_KEY) == token:
+                    client.delete(LOCK_KEY)
+            except redis.exceptions.RedisError:
+                pass
@@ -0,0 +1,147 @@
+"""
+Cache das análises de erro do Gemini.
+
+Todos os alunos que marcam a mesma alternativa errada na mesma questão recebem
+a mesma análise, então ela é guardada por um hash do conteúdo da questão, das
+alternativas, do gabarito e da alternativa marcada. Há dois níveis:
+
+- L1: LRU em memória do processo, com TTL;
+- L2 (opcional): Redis, compartilhado entre a API e os workers do Celery.
+
+Como o gabarito faz parte do hash, uma troca de gabarito já gera chaves novas;
+`invalidate_question` ainda remove as entradas antigas da questão para liberar espaço.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from uuid import UUID
+
+import redis
+
+from . import schemas
+from .config import settings
+from .redis_client import get_redis
+
+KEY_PREFIX = "analysis_cache"
+
+
+def make_key(question: schemas.Question, selected_option: str) -> str:
+    payload = json.dumps(
+        {
+            "content": question.content,
+            "options": question.options,
+            "correct_option": question.correct_option,
+            "selected_option": selected_option,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return f"{KEY_PREFIX}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+class AnalysisCache:
+    def __init__(self, max_entries: int, ttl_seconds: int, use_redis: bool):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.use_redis = use_redis
+        self._lock = threading.Lock()
+        # chave -> (expira em, ID da questão, análise)
+        self._entries: OrderedDict[str, tuple[float, str, dict]] = OrderedDict()
+        self._keys_by_question: dict[str, set[str]] = {}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_question.clear()
+
+    def get(self, question: schemas.Question, selected_option: str) -> dict | None:
+        key = make_key(question, selected_option)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, _, analysis = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return analysis
+                self._forget(key)
+
+        client = self._redis()
+        if client is None:
+            return None
+        try:
+            cached = client.get(key)
+        except redis.exceptions.RedisError:
+            return None
+        if cached is None:
+            return None
+        try:
+            analysis = json.loads(cached)
+        except ValueError:
+            # Valor corrompido no Redis: trata como miss (a análise é refeita e regravada).
+            return None
+        self._store_local(str(question.id), key, analysis)
+        return analysis
+
+    def set(self, question: schemas.Question, selected_option: str, analysis: dict):
+        key = make_key(question, selected_option)
+        question_id = str(question.id)
+        self._store_local(question_id, key, analysis)
+
+        client = self._redis()
+        if client is None:
+            return
+        index_key = f"{KEY_PREFIX}:question:{question_id}"
+        try:
+            pipe = client.pipeline()
+            pipe.set(key, json.dumps(analysis, ensure_ascii=False), ex=self.ttl_seconds)
+            pipe.sadd(index_key, key)
+            pipe.expire(index_key, self.ttl_seconds)
+            pipe.execute()
+        except redis.exceptions.RedisError as e:
+            print(f"Erro ao gravar análise no cache: {e}")
+
+    def invalidate_question(self, question_id: UUID | str):
+        """Remove todas as análises em cache de uma questão (ex: após troca de gabarito)."""
+        question_id = str(question_id)
+        with self._lock:
+            for key in self._keys_by_question.pop(question_id, set()):
+                self._entries.pop(key, None)
+
+        client = self._redis()
+        if client is None:
+            return
+        index_key = f"{KEY_PREFIX}:question:{question_id}"
+        try:
+            keys = client.smembers(index_key)
+            client.delete(index_key, *keys)
+        except redis.exceptions.RedisError as e:
+            print(f"Erro ao invalidar o cache de análises: {e}")
+
+    def _store_local(self, question_id: str, key: str, analysis: dict):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, question_id, analysis)
+            self._entries.move_to_end(key)
+            self._keys_by_question.setdefault(question_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._forget(next(iter(self._entries)))
+
+    def _forget(self, key: str):
+        """Tira a chave do L1 e do índice por questão (chamado com o lock)."""
+        _, question_id, _ = self._entries.pop(key)
+        keys = self._keys_by_question.get(question_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_question[question_id]
+
+    def _redis(self) -> redis.Redis | None:
+        return get_redis() if self.use_redis else None
+
+
+analysis_cache = AnalysisCache(
+    max_entries=settings.ANALYSIS_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ANALYSIS_CACHE_TTL_SECONDS,
+    use_redis=settings.ANALYSIS_CACHE_USE_REDIS,
+)
@@ -0,0 +1,291 @@
+"""
+Camada de cache para endpoints de leitura, sobre o Redis.
+
+- Chaves por escopo (ex: o tenant no painel do professor, o perfil no progresso
+  do aluno), de modo que todos os professores de um tenant compartilham o mesmo valor.
+- Single-flight: num miss, só quem obtém o lock (SET NX) recalcula; os demais
+  esperam o valor aparecer por alguns instantes antes de calcular por conta própria.
+- Stale-while-revalidate: depois do TTL o valor ainda é servido por uma janela
+  extra enquanto uma thread em segundo plano o recalcula.
+- Invalidação por eventos: quem grava respostas/proficiências chama `invalidate`,
+  que também avança a geração do escopo. Cada valor guarda a geração lida antes
+  do cálculo, e um valor de geração antiga é tratado como miss: um recálculo que
+  leu o banco antes da escrita e gravou depois da invalidação não é servido.
+- Métricas de hit/miss por processo, expostas em `/admin/cache/metrics`.
+
+Sem Redis disponível, o valor é simplesmente calculado a cada leitura.
+`aget_or_compute` é a mesma lógica para os endpoints assíncronos (redis.asyncio
+e um loader sobre AsyncSession).
+"""
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Awaitable, Callable, Iterable
+
+import redis
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import SessionLocal, get_async_sessionmaker
+from .redis_client import get_async_redis, get_redis
+
+Loader = Callable[[Session], dict]
+AsyncLoader = Callable[[AsyncSession], Awaitable[dict]]
+
+
+class ReadCache:
+    def __init__(self, namespace: str, ttl_seconds: int, stale_ttl_seconds: int):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.stale_ttl_seconds = stale_ttl_seconds
+        self.metrics: Counter = Counter()
+        self._metrics_lock = threading.Lock()
+        self._background_tasks: set[asyncio.Task] = set()
+
+    def _key(self, scope: str) -> str:
+        return f"cache:{self.namespace}:{scope}"
+
+    def _count(self, event: str):
+        with self._metrics_lock:
+            self.metrics[event] += 1
+
+    def get_or_compute(self, scope: str, db: Session, loader: Loader) -> dict:
+        """Retorna o valor em cache do escopo ou o calcula com `loader(db)`."""
+        client = get_redis()
+        key = self._key(scope)
+        try:
+            entry, generation = self._read(client, key) if client else (None, 0)
+        except redis.exceptions.RedisError:
+            client, entry = None, None
+        if client is None:
+            self._count("bypass")
+            return loader(db)
+
+        if entry is not None:
+            if entry["fresh_until"] > time.time():
+                self._count("hit")
+            else:
+                self._count("stale")
+                self._refresh_in_background(client, key, loader, generation)
+            return entry["value"]
+
+        self._count("miss")
+        token = self._acquire_lock(client, key)
+        if token is None:
+            value = self._wait_for_value(client, key)
+            if value is not None:
+                self._count("wait_hit")
+                return value
+            return loader(db)
+        try:
+            value = loader(db)
+            self._store(client, key, value, generation)
+            return value
+        finally:
+            self._release_lock(client, key, token)
+
+    async def aget_or_compute(self, scope: str, db: AsyncSession, loader: AsyncLoader) -> dict:
+        """Versão assíncrona de `get_or_compute`: `await loader(db)` num miss."""
+        client = get_async_redis()
+        key = self._key(scope)
+        try:
+            entry, generation = await self._aread(client, key) if client else (None, 0)
+        except redis.exceptions.RedisError:
+            client, entry = None, None
+        if client is None:
+            self._count("bypass")
+            return await loader(db)
+
+        if entry is not None:
+            if entry["fresh_until"] > time.time():
+                self._count("hit")
+            else:
+                self._count("stale")
+                await self._arefresh_in_background(client, key, loader, generation)
+            return entry["value"]
+
+        self._count("miss")
+        token = await self._aacquire_lock(client, key)
+        if token is None:
+            value = await self._await_for_value(client, key)
+            if value is not None:
+                self._count("wait_hit")
+                return value
+            return await loader(db)
+        try:
+            value = await loader(db)
+            await self._astore(client, key, value, generation)
+            return value
+        finally:
+            await self._arelease_lock(client, key, token)
+
+    def invalidate(self, scopes: Iterable[str]):
+        """Descarta os valores dos escopos; a próxima leitura recalcula (com single-flight)."""
+        keys = [self._key(scope) for scope in scopes]
+        client = get_redis()
+        if not keys or client is None:
+            return
+        try:
+            pipe = client.pipeline()
+            # A geração avança antes do DELETE: um cálculo em andamento grava com a
+            # geração antiga e o valor é descartado na leitura.
+            for key in keys:
+                pipe.incr(f"{key}:gen")
+                pipe.expire(f"{key}:gen", self._generation_ttl)
+            pipe.delete(*keys)
+            pipe.execute()
+            self._count("invalidated")
+        except redis.exceptions.RedisError as e:
+            print(f"Erro ao invalidar o cache '{self.namespace}': {e}")
+
+    @property
+    def _generation_ttl(self) -> int:
+        # Sobrevive a qualquer valor gravado com a geração anterior.
+        return 2 * (self.ttl_seconds + self.stale_ttl_seconds) + settings.CACHE_LOCK_TIMEOUT_SECONDS
+
+    def _entry(self, cached: str | None, generation: str | None) -> tuple[dict | None, int]:
+        """Valor em cache (None se ausente, corrompido ou de geração antiga) e a geração atual."""
+        generation = int(generation or 0)
+        if cached is None:
+            return None, generation
+        try:
+            entry = json.loads(cached)
+        except ValueError:
+            return None, generation
+        return (entry if entry.get("generation", 0) == generation else None), generation
+
+    def _read(self, client: redis.Redis, key: str) -> tuple[dict | None, int]:
+        return self._entry(*client.mget(key, f"{key}:gen"))
+
+    def _serialize(self, value: dict, generation: int) -> str:
+        return json.dumps({"fresh_until": time.time() + self.ttl_seconds, "generation": generation, "value": value})
+
+    def _store(self, client: redis.Redis, key: str, value: dict, generation: int):
+        try:
+            client.set(key, self._serialize(value, generation), ex=self.ttl_seconds + self.stale_ttl_seconds)
+        except redis.exceptions.RedisError as e:
+            print(f"Erro ao gravar no cache '{self.namespace}': {e}")
+
+    def _acquire_lock(self, client: redis.Redis, key: str) -> str | None:
+        token = str(uuid.uuid4())
+        try:
+            acquired = client.set(f"{key}:lock", token, nx=True, ex=settings.CACHE_LOCK_TIMEOUT_SECONDS)
+        except redis.exceptions.RedisError:
+            return None
+        return token if acquired else None
+
+    def _release_lock(self, client: redis.Redis, key: str, token: str):
+        try:
+            if client.get(f"{key}:lock") == token:
+                client.delete(f"{key}:lock")
+        except redis.exceptions.RedisError:
+            pass
+
+    def _wait_for_value(self, client: redis.Redis, key: str) -> dict | None:
+        deadline = time.monotonic() + settings.CACHE_LOCK_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            try:
+                entry, _ = self._read(client, key)
+            except redis.exceptions.RedisError:
+                return None
+            if entry is not None:
+                return entry["value"]
+        return None
+
+    def _refresh_in_background(self, client: redis.Redis, key: str, loader: Loader, generation: int):
+        token = self._acquire_lock(client, key)
+        if token is None:
+            return  # outro processo já está recalculando
+
+        def refresh():
+            db = SessionLocal()
+            try:
+                self._store(client, key, loader(db), generation)
+            except Exception as e:
+                self._count("refresh_error")
+                print(f"Erro ao recalcular o cache '{self.namespace}': {e}")
+            finally:
+                db.close()
+                self._release_lock(client, key, token)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    # --- Variantes assíncronas (redis.asyncio) ---
+
+    async def _aread(self, client, key: str) -> tuple[dict | None, int]:
+        return self._entry(*await client.mget(key, f"{key}:gen"))
+
+    async def _astore(self, client, key: str, value: dict, generation: int):
+        try:
+            await client.set(key, self._serialize(value, generation), ex=self.ttl_seconds + self.stale_ttl_seconds)
+        except redis.exceptions.RedisError as e:
+            print(f"Erro ao gravar no cache '{self.namespace}': {e}")
+
+    async def _aacquire_lock(self, client, key: str) -> str | None:
+        token = str(uuid.uuid4())
+        try:
+            acquired = await client.set(f"{key}:lock", token, nx=True, ex=settings.CACHE_LOCK_TIMEOUT_SECONDS)
+        except redis.exceptions.RedisError:
+            return None
+        return token if acquired else None
+
+    async def _arelease_lock(self, client, key: str, token: str):
+        try:
+            if await client.get(f"{key}:lock") == token:
+                await client.delete(f"{key}:lock")
+        except redis.exceptions.RedisError:
+            pass
+
+    async def _await_for_value(self, client, key: str) -> dict | None:
+        deadline = time.monotonic() + settings.CACHE_LOCK_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            try:
+                entry, _ = await self._aread(client, key)
+            except redis.exceptions.RedisError:
+                return None
+            if entry is not None:
+                return entry["value"]
+        return None
+
+    async def _arefresh_in_background(self, client, key: str, loader: AsyncLoader, generation: int):
+        token = await self._aacquire_lock(client, key)
+        if token is None:
+            return
+
+        async def refresh():
+            try:
+                async with get_async_sessionmaker()() as db:
+                    await self._astore(client, key, await loader(db), generation)
+            except Exception as e:
+                self._count("refresh_error")
+                print(f"Erro ao recalcular o cache '{self.namespace}': {e}")
+            finally:
+                await self._arelease_lock(client, key, token)
+
+        task = asyncio.create_task(refresh())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+
+dashboard_cache = ReadCache(
+    "teacher_dashboard",
+    ttl_seconds=settings.DASHBOARD_CACHE_TTL_SECONDS,
+    stale_ttl_seconds=settings.CACHE_STALE_TTL_SECONDS,
+)
+progress_cache = ReadCache(
+    "student_progress",
+    ttl_seconds=settings.PROGRESS_CACHE_TTL_SECONDS,
+    stale_ttl_seconds=settings.CACHE_STALE_TTL_SECONDS,
+)
+
+ALL_CACHES = [dashboard_cache, progress_cache]
+
+
+def get_metrics() -> dict[str, dict[str, int]]:
+    return {cache.namespace: dict(cache.metrics) for cache in ALL_CACHES}
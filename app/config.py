@@ -6,11 +6,144 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.environ.get("SECRET_KEY", "b2a7e8f3a4e6c8a1b5d7c9e0f1d3e5f6a8b7c9d0e2f4a6c8")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24
+
+    # Hash de senhas (bcrypt) num pool de processos dedicado (app/hashing.py)
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32
     GEMINI_API_KEY: str = os.environ.get("GEMINI_API_KEY", "SUA_API_KEY_AQUI")
     REDIS_URL: str = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
     
     # Caminho para o armazenamento persistente do ChromaDB
     CHROMA_PATH: str = os.environ.get("CHROMA_PATH", "chroma_db_storage")
 
+    # Celery: prefetch padrão (o worker de ingestão sobe com --prefetch-multiplier=1),
+    # validade dos resultados e visibility timeout do broker (> tarefa mais longa,
+    # por causa do acks_late)
+    CELERY_WORKER_PREFETCH_MULTIPLIER: int = 4
+    CELERY_RESULT_EXPIRES_SECONDS: int = 60 * 60 * 24
+    CELERY_VISIBILITY_TIMEOUT_SECONDS: int = 60 * 60 * 4
+
+    # Pool de conexões do banco: perfil da API (muitas requisições curtas)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 5.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 15_000
+    DB_EXPIRE_ON_COMMIT: bool = True
+
+    # Perfil dos workers Celery (poucas conexões, consultas longas em lote)
+    DB_WORKER_POOL_SIZE: int = 2
+    DB_WORKER_MAX_OVERFLOW: int = 2
+    DB_WORKER_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_WORKER_STATEMENT_TIMEOUT_MS: int = 300_000
+    DB_WORKER_EXPIRE_ON_COMMIT: bool = False
+
+    # Importação de utilizadores em lote (linhas por transação)
+    USER_IMPORT_CHUNK_SIZE: int = 500
+    # Processos de hash de senha por bloco da importação (0 = um por núcleo)
+    USER_IMPORT_HASH_WORKERS: int = 0
+
+    # Índice em memória do banco de questões
+    QUESTION_BANK_VERSION_CHECK_SECONDS: float = 5.0
+    # Idade máxima do índice: recarrega mesmo sem mudança de versão no Redis
+    QUESTION_BANK_MAX_AGE_SECONDS: float = 300.0
+    QUESTION_SAMPLE_SIZE: int = 20
+
+    # Recomendação por similaridade: vizinhos guardados por questão e
+    # quantos erros recentes do aluno servem de ponto de partida
+    QUESTION_NEIGHBORS_K: int = 10
+    REMEDIATION_RECENT_ERRORS: int = 5
+
+    # Motor de proficiência em lote
+    PROFICIENCY_BATCH_SIZE: int = 500
+    PROFICIENCY_BATCH_INTERVAL_SECONDS: float = 10.0
+
+    # Cache das análises de erro do Gemini (L1 em memória + Redis opcional)
+    ANALYSIS_CACHE_TTL_SECONDS: int = 60 * 60 * 24 * 30
+    ANALYSIS_CACHE_MAX_ENTRIES: int = 10_000
+    ANALYSIS_CACHE_USE_REDIS: bool = True
+
+    # Backfill das análises de erro que falharam (app/analysis_backfill.py):
+    # intervalo do beat, tamanho da página do keyset, páginas por rodada, idade
+    # mínima da resposta (a tarefa normal pode estar na fila) e validade do lock
+    ANALYSIS_BACKFILL_INTERVAL_SECONDS: float = 15 * 60
+    ANALYSIS_BACKFILL_PAGE_SIZE: int = 500
+    ANALYSIS_BACKFILL_MAX_PAGES: int = 20
+    ANALYSIS_BACKFILL_MIN_AGE_SECONDS: int = 10 * 60
+    ANALYSIS_BACKFILL_LOCK_SECONDS: int = 60 * 60
+
+    # Cliente assíncrono do Gemini (limites de concorrência e timeouts por processo)
+    AI_MAX_CONCURRENT_CALLS: int = 32
+    AI_MAX_CONCURRENT_CALLS_PER_TENANT: int = 8
+    AI_CALL_TIMEOUT_SECONDS: float = 60.0
+    AI_ESSAY_TIMEOUT_SECONDS: float = 120.0
+    # Streams: espera máxima por um pedaço e duração máxima da geração inteira
+    AI_STREAM_IDLE_TIMEOUT_SECONDS: float = 20.0
+    AI_STREAM_MAX_SECONDS: float = 180.0
+
+    # Orçamento compartilhado das chamadas ao Gemini (app/ai_scheduler.py):
+    # (requisições, tokens) por minuto de cada modelo e política por prioridade
+    AI_RATE_LIMITS: dict[str, tuple[int, int]] = {
+        "gemini-2.0-flash": (2_000, 4_000_000),
+        "gemini-1.5-flash": (2_000, 4_000_000),
+        "models/embedding-001": (1_500, 1_000_000),
+    }
+    AI_DEFAULT_RPM: int = 1_000
+    AI_DEFAULT_TPM: int = 1_000_000
+    AI_RATE_LIMIT_USE_REDIS: bool = True
+    AI_BACKGROUND_RESERVE_FRACTION: float = 0.2
+    AI_INTERACTIVE_MAX_WAIT_SECONDS: float = 5.0
+    AI_BACKGROUND_MAX_WAIT_SECONDS: float = 120.0
+    AI_INTERACTIVE_MAX_RETRIES: int = 1
+    AI_BACKGROUND_MAX_RETRIES: int = 5
+    AI_RETRY_BASE_SECONDS: float = 1.0
+    AI_RETRY_MAX_SECONDS: float = 30.0
+
+    # Correção de redação em segundo plano (app/essay_jobs.py): validade do
+    # resultado em cache e do marcador de correção já enfileirada
+    ESSAY_GRADE_CACHE_TTL_SECONDS: int = 60 * 60 * 24 * 30
+    ESSAY_GRADE_PENDING_TTL_SECONDS: int = 10 * 60
+
+    # Submissão de simulado inteiro: máximo de respostas por envio e
+    # análises de erro simultâneas na tarefa agrupada
+    ANSWER_BATCH_MAX_SIZE: int = 200
+    AI_ANALYSIS_BATCH_CONCURRENCY: int = 4
+
+    # Embeddings em lote
+    EMBEDDING_BATCH_SIZE: int = 100
+    EMBEDDING_BATCH_MAX_TOKENS: int = 20_000
+    EMBEDDING_MAX_RETRIES: int = 3
+    EMBEDDING_RETRY_BACKOFF_SECONDS: float = 1.0
+
+    # Store local de embeddings por hash do conteúdo (app/embedding_store.py)
+    EMBEDDING_STORE_PATH: str = os.environ.get("EMBEDDING_STORE_PATH", "embedding_store")
+    EMBEDDING_STORE_ENABLED: bool = True
+    # Similaridade cosseno a partir da qual uma questão nova é tida como duplicata
+    QUESTION_DUPLICATE_SIMILARITY: float = 0.97
+    # Tamanho da página do backfill de `Question.content_hash` (bases existentes)
+    QUESTION_HASH_BACKFILL_PAGE_SIZE: int = 1000
+
+    # Pipeline de ingestão de provas em PDF
+    EXAM_PDF_EXTRACT_WORKERS: int = 4
+    EXAM_PDF_EXTRACT_TIMEOUT_SECONDS: int = 300
+    EXAM_CHUNK_MAX_CHARS: int = 30_000
+    EXAM_STRUCTURE_CONCURRENCY: int = 4
+
+    # Painel do professor: janela (em dias) para contar alunos ativos
+    DASHBOARD_ACTIVE_WINDOW_DAYS: int = 7
+
+    # Cache dos endpoints de leitura (app/cache.py)
+    DASHBOARD_CACHE_TTL_SECONDS: int = 300
+    PROGRESS_CACHE_TTL_SECONDS: int = 60
+    CACHE_STALE_TTL_SECONDS: int = 600
+    CACHE_LOCK_TIMEOUT_SECONDS: int = 10
+    CACHE_LOCK_WAIT_SECONDS: float = 2.0
+
+    # Cache do principal (utilizador autenticado) por processo
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10_000
+
 settings = Settings()
 
@@ -1,8 +1,16 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from uuid import UUID
+import uuid
 import random
-from . import models, schemas, security, ai_services
-from sqlalchemy import func, Float
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from . import models, schemas, security, ai_services, tenant_stats, hashing
+from .config import settings
+from .question_bank import question_bank
+from .analysis_cache import analysis_cache
+from .embedding_store import content_hash, question_text
+from sqlalchemy import func, exists, tuple_, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
 
 # --- CRUD de Tenant ---
 def get_tenant_by_name(db: Session, name: str) -> models.Tenant | None:
@@ -17,14 +25,15 @@ def create_tenant(db: Session, tenant: schemas.TenantCreate) -> models.Tenant:
 
 # --- CRUD de User ---
 def get_user_by_email(db: Session, email: str) -> models.User | None:
-    return db.query(models.User).filter(models.User.email == email).first()
+    # O perfil é lido em quase todo uso (login, /me): carregado no mesmo SELECT.
+    return db.query(models.User).options(joinedload(models.User.profile)).filter(models.User.email == email).first()
 
 def create_user(db: Session, user: schemas.UserCreate) -> models.User:
     tenant = get_tenant_by_name(db, name=user.tenant_name)
     if not tenant:
         tenant = create_tenant(db, tenant=schemas.TenantCreate(name=user.tenant_name))
 
-    hashed_password = security.get_password_hash(user.password)
+    hashed_password = hashing.hash_password(user.password)
     db_user = models.User(
         email=user.email,
         password_hash=hashed_password,
@@ -37,18 +46,169 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
 
     db_profile = models.Profile(full_name=user.full_name, user_id=db_user.id)
     db.add(db_profile)
+    if user.role == models.UserRole.student:
+        tenant_stats.record_new_students(db, tenant.id)
     db.commit()
     db.refresh(db_user)
     return db_user
 
+def resolve_tenants(db: Session, names: set[str]) -> dict[str, UUID]:
+    """Mapeia nomes de tenant para IDs, criando os que faltam, numa consulta e um INSERT."""
+    tenant_ids = dict(db.query(models.Tenant.name, models.Tenant.id).filter(models.Tenant.name.in_(names)).all())
+    missing = [{"id": uuid.uuid4(), "name": name} for name in names if name not in tenant_ids]
+    if missing:
+        db.execute(insert(models.Tenant), missing)
+        db.commit()
+        tenant_ids.update({row["name"]: row["id"] for row in missing})
+    return tenant_ids
+
+def get_existing_emails(db: Session, emails: list[str]) -> set[str]:
+    return {email for (email,) in db.query(models.User.email).filter(models.User.email.in_(emails))}
+
+def bulk_create_users(db: Session, users: list[schemas.UserCreate], tenant_ids: dict[str, UUID], password_hashes: list[str]):
+    """
+    Insere utilizadores e perfis com dois INSERTs em lote (IDs gerados aqui) e
+    atualiza o total de alunos de cada tenant. Não faz commit: quem chama define a transação.
+    """
+    user_rows, profile_rows = [], []
+    new_students: dict[UUID, int] = {}
+    for user, password_hash in zip(users, password_hashes):
+        user_id = uuid.uuid4()
+        tenant_id = tenant_ids[user.tenant_name]
+        user_rows.append({"id": user_id, "email": user.email, "password_hash": password_hash, "role": user.role, "tenant_id": tenant_id})
+        profile_rows.append({"id": uuid.uuid4(), "user_id": user_id, "full_name": user.full_name})
+        if user.role == models.UserRole.student:
+            new_students[tenant_id] = new_students.get(tenant_id, 0) + 1
+
+    db.execute(insert(models.User), user_rows)
+    db.execute(insert(models.Profile), profile_rows)
+    for tenant_id, count in new_students.items():
+        tenant_stats.record_new_students(db, tenant_id, count)
+
 # --- CRUD de Question ---
-def create_question(db: Session, question: schemas.QuestionCreate, vector_id: str) -> models.Question:
-    db_question = models.Question(**question.model_dump(), vector_id=vector_id)
+def create_question(db: Session, question: schemas.QuestionCreate, vector_id: str | None = None) -> models.Question:
+    db_question = models.Question(**question.model_dump(), vector_id=vector_id, content_hash=content_hash(question_text(question.content, question.options)))
     db.add(db_question)
     db.commit()
     db.refresh(db_question)
+    question_bank.add_questions([db_question])
     return db_question
 
+def bulk_create_questions(db: Session, questions: list[schemas.QuestionCreate]) -> list[UUID]:
+    """
+    Insere as questões de uma prova inteira numa única transação e retorna os IDs
+    na mesma ordem da entrada (via RETURNING). O `vector_id` fica vazio até o
+    vetor ser gravado no ChromaDB (`mark_questions_vectorized`).
+    """
+    if not questions:
+        return []
+
+    rows = []
+    for question in questions:
+        question_id = uuid.uuid4()
+        rows.append({
+            **question.model_dump(), "id": question_id,
+            "content_hash": content_hash(question_text(question.content, question.options))
+        })
+
+    inserted_ids = db.execute(
+        insert(models.Question).returning(models.Question.id, sort_by_parameter_order=True),
+        rows
+    ).scalars().all()
+    db.commit()
+
+    question_bank.add_questions([models.Question(**row) for row in rows])
+    return inserted_ids
+
+def mark_questions_vectorized(db: Session, question_ids: list[str]):
+    """Registra que o vetor das questões está no ChromaDB (o vector_id é o próprio ID)."""
+    if question_ids:
+        db.execute(update(models.Question), [{"id": UUID(qid), "vector_id": qid} for qid in question_ids])
+        db.commit()
+
+def backfill_question_hashes(db: Session, page_size: int | None = None) -> int:
+    """
+    Preenche o `content_hash` das questões criadas antes da coluna existir, para
+    que a deduplicação exata as reconheça. Percorre as questões sem hash por
+    keyset no ID, com um UPDATE em lote e um commit por página. Retorna o total.
+    """
+    page_size = page_size or settings.QUESTION_HASH_BACKFILL_PAGE_SIZE
+    total, cursor = 0, None
+    while True:
+        query = db.query(models.Question.id, models.Question.content, models.Question.options)\
+            .filter(models.Question.content_hash.is_(None))
+        if cursor is not None:
+            query = query.filter(models.Question.id > cursor)
+        rows = query.order_by(models.Question.id).limit(page_size).all()
+        if not rows:
+            return total
+        db.execute(update(models.Question), [
+            {"id": question_id, "content_hash": content_hash(question_text(content, options))}
+            for question_id, content, options in rows
+        ])
+        db.commit()
+        total += len(rows)
+        cursor = rows[-1].id
+        if len(rows) < page_size:
+            return total
+
+def get_unvectorized_question_hashes(db: Session, question_ids: list[UUID]) -> dict[UUID, str]:
+    """`content_hash` das questões da lista que ainda não têm vetor no ChromaDB."""
+    if not question_ids:
+        return {}
+    return dict(
+        db.query(models.Question.id, models.Question.content_hash)
+        .filter(models.Question.id.in_(question_ids), models.Question.vector_id.is_(None))
+        .all()
+    )
+
+def find_duplicate_questions(db: Session, texts: list[str], embeddings: list[list[float] | None]) -> list[UUID | int | None]:
+    """
+    Para cada questão (`embedding_store.question_text`: enunciado e alternativas),
+    indica se já existe no banco: o ID da questão igual (mesmo `content_hash`) ou
+    quase igual (similaridade do embedding acima de `QUESTION_DUPLICATE_SIMILARITY`,
+    via `embedding_store.nearest`). Repetições dentro da própria lista devolvem a
+    posição (int) da primeira ocorrência.
+    """
+    threshold = settings.QUESTION_DUPLICATE_SIMILARITY
+    hashes = [content_hash(text) for text in texts]
+    near = ai_services.embedding_store.nearest([e for e in embeddings if e is not None], k=5)
+    near_by_position = iter(near)
+    candidates: list[list[str]] = []
+    for own_hash, embedding in zip(hashes, embeddings):
+        matches = next(near_by_position) if embedding is not None else []
+        candidates.append([own_hash] + [h for h, score in matches if score >= threshold and h != own_hash])
+
+    lookup = {h for hs in candidates for h in hs}
+    existing = dict(db.query(models.Question.content_hash, models.Question.id).filter(models.Question.content_hash.in_(lookup)).all())
+
+    duplicates: list[UUID | int | None] = []
+    for i, hs in enumerate(candidates):
+        found = next((existing[h] for h in hs if h in existing), None)
+        if found is None:
+            found = _find_in_batch(i, hashes, embeddings, duplicates, threshold)
+        duplicates.append(found)
+    return duplicates
+
+def _find_in_batch(i: int, hashes: list[str], embeddings: list, duplicates: list, threshold: float) -> int | None:
+    for j in range(i):
+        if duplicates[j] is not None:
+            continue
+        if hashes[j] == hashes[i]:
+            return j
+        if embeddings[i] is not None and embeddings[j] is not None:
+            a, b = np.asarray(embeddings[i]), np.asarray(embeddings[j])
+            if float(a @ b / max(np.linalg.norm(a) * np.linalg.norm(b), 1e-12)) >= threshold:
+                return j
+    return None
+
+def get_student_answer(db: Session, answer_id: UUID, with_question: bool = False) -> models.StudentAnswer | None:
+    query = db.query(models.StudentAnswer)
+    if with_question:
+        # Evita o lazy load de `answer.question` na análise de IA.
+        query = query.options(joinedload(models.StudentAnswer.question))
+    return query.filter(models.StudentAnswer.id == answer_id).first()
+
 def get_question(db: Session, question_id: UUID) -> models.Question | None:
     return db.query(models.Question).filter(models.Question.id == question_id).first()
 
@@ -67,12 +227,135 @@ def create_student_answer(db: Session, profile_id: UUID, answer: schemas.Student
 def get_student_proficiency_maps(db: Session, profile_id: UUID) -> list[models.StudentProficiencyMap]:
     return db.query(models.StudentProficiencyMap).filter(models.StudentProficiencyMap.profile_id == profile_id).all()
 
+def upsert_proficiency_scores(db: Session, scores: list[dict], overwrite: bool = True):
+    """
+    Insere ou atualiza vários scores {profile_id, topic, proficiency_score} numa única instrução.
+
+    Usa `INSERT ... ON CONFLICT (profile_id, topic)` no PostgreSQL e no SQLite. Com
+    `overwrite=False` os scores já existentes são preservados (DO NOTHING). Em outros
+    dialetos o upsert é emulado com uma leitura e escritas em lote.
+    Não faz commit: o chamador controla a transação.
+    """
+    if not scores:
+        return
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert_fn = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert_fn(models.StudentProficiencyMap)
+        conflict_target = ["profile_id", "topic"]
+        if overwrite:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=conflict_target,
+                set_={"proficiency_score": stmt.excluded.proficiency_score, "last_updated": func.now()},
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=conflict_target)
+        db.execute(stmt, scores)
+        return
+
+    existing = {(profile_id, topic): map_id for profile_id, topic, map_id in db.query(
+        models.StudentProficiencyMap.profile_id,
+        models.StudentProficiencyMap.topic,
+        models.StudentProficiencyMap.id,
+    ).filter(
+        tuple_(models.StudentProficiencyMap.profile_id, models.StudentProficiencyMap.topic).in_(
+            [(row["profile_id"], row["topic"]) for row in scores]
+        )
+    ).all()}
+    updates = [
+        {"id": existing[(row["profile_id"], row["topic"])], "proficiency_score": row["proficiency_score"]}
+        for row in scores if (row["profile_id"], row["topic"]) in existing
+    ]
+    inserts = [row for row in scores if (row["profile_id"], row["topic"]) not in existing]
+    if updates and overwrite:
+        db.execute(update(models.StudentProficiencyMap), updates)
+    if inserts:
+        db.execute(insert(models.StudentProficiencyMap), inserts)
+
+def get_student_progress(db: Session, profile_id: UUID) -> dict:
+    """Perfil e mapa de proficiência do aluno, já serializados (para o cache de leitura)."""
+    profile = db.query(models.Profile).filter(models.Profile.id == profile_id).first()
+    return schemas.StudentProgress.model_validate({
+        "profile": profile,
+        "proficiency_maps": get_student_proficiency_maps(db, profile_id)
+    }).model_dump(mode="json")
+
 def get_student_answers(db: Session, profile_id: UUID, limit: int = 10) -> list[models.StudentAnswer]:
     return db.query(models.StudentAnswer).filter(models.StudentAnswer.profile_id == profile_id).order_by(models.StudentAnswer.answered_at.desc()).limit(limit).all()
 
 # --- LÓGICA DE NEGÓCIO PRINCIPAL ---
 
-def get_next_question_for_student(db: Session, profile_id: UUID) -> models.Question | None:
+def _answered_by_student(profile_id: UUID):
+    """
+    Subquery correlacionada (anti-join) que indica se o aluno já respondeu a questão
+    corrente. Resolvida pelo índice (profile_id, question_id) de student_answers.
+    """
+    return exists().where(
+        models.StudentAnswer.profile_id == profile_id,
+        models.StudentAnswer.question_id == models.Question.id,
+    )
+
+def _pick_random_unanswered_question(db: Session, profile_id: UUID, topic: str | None = None) -> models.Question | None:
+    """
+    Escolhe uma questão aleatória ainda não respondida pelo aluno numa única query.
+
+    Em vez de ORDER BY random() (que varre a tabela inteira), sorteia um UUID "pivô"
+    e pega a primeira questão com id >= pivô, dando a volta no início do intervalo
+    caso não exista nenhuma depois dele. Com o índice (topic, id) ambas as buscas
+    são range scans curtos.
+    """
+    candidates = db.query(models.Question).filter(
+        models.Question.correct_option.isnot(None), ~_answered_by_student(profile_id)
+    )
+    if topic is not None:
+        candidates = candidates.filter(models.Question.topic == topic)
+
+    pivot = uuid.uuid4()
+    question = candidates.filter(models.Question.id >= pivot).order_by(models.Question.id).first()
+    if question is None:
+        question = candidates.filter(models.Question.id < pivot).order_by(models.Question.id).first()
+    return question
+
+def _pick_unanswered_from_candidates(db: Session, profile_id: UUID, candidate_ids: list[UUID]) -> models.Question | None:
+    """Busca, entre ids sorteados do índice em memória, uma questão ainda não respondida."""
+    if not candidate_ids:
+        return None
+    questions = db.query(models.Question).filter(
+        models.Question.id.in_(candidate_ids),
+        models.Question.correct_option.isnot(None),
+        ~_answered_by_student(profile_id)
+    ).all()
+    return random.choice(questions) if questions else None
+
+def _pick_nearest_to_recent_errors(db: Session, profile_id: UUID) -> models.Question | None:
+    """
+    Reforço: entre os vizinhos pré-calculados (`question_neighbors`) das questões
+    que o aluno errou por último, a mais próxima ainda não respondida. Uma única query.
+    """
+    recent_errors = db.query(models.StudentAnswer.question_id).filter(
+        models.StudentAnswer.profile_id == profile_id,
+        models.StudentAnswer.is_correct.is_(False)
+    ).order_by(models.StudentAnswer.answered_at.desc()).limit(settings.REMEDIATION_RECENT_ERRORS).subquery()
+
+    return db.query(models.Question).join(
+        models.QuestionNeighbor, models.QuestionNeighbor.neighbor_id == models.Question.id
+    ).filter(
+        models.QuestionNeighbor.question_id.in_(db.query(recent_errors.c.question_id)),
+        models.Question.correct_option.isnot(None),
+        ~_answered_by_student(profile_id)
+    ).order_by(models.QuestionNeighbor.distance).first()
+
+def get_next_question_for_student(
+    db: Session, profile_id: UUID, mode: schemas.NextQuestionMode = schemas.NextQuestionMode.adaptive
+) -> models.Question | None:
+    if mode == schemas.NextQuestionMode.remediation:
+        # Sem erros recentes (ou sem vizinhos não respondidos), segue o modo adaptativo.
+        next_question = _pick_nearest_to_recent_errors(db, profile_id)
+        if next_question:
+            return next_question
+
+    bank = question_bank.ensure_fresh(db)
     prof_maps = get_student_proficiency_maps(db, profile_id)
     target_topic = None
     if prof_maps:
@@ -83,51 +366,57 @@ def get_next_question_for_student(db: Session, profile_id: UUID) -> models.Quest
             target_topic = random.choice(prof_maps).topic
 
     if not target_topic:
-        all_topics = db.query(models.Question.topic).distinct().all()
+        all_topics = bank.topics()
         if not all_topics: return None
-        target_topic = random.choice(all_topics)[0]
+        target_topic = random.choice(all_topics)
 
-    answered_q_ids = [ans.question_id for ans in get_student_answers(db, profile_id, limit=1000)]
-    
-    next_question = db.query(models.Question).filter(
-        models.Question.topic == target_topic,
-        models.Question.id.notin_(answered_q_ids)
-    ).first()
+    candidate_ids = bank.sample(target_topic, k=settings.QUESTION_SAMPLE_SIZE)
+    next_question = _pick_unanswered_from_candidates(db, profile_id, candidate_ids)
 
+    # A amostra pode estar toda respondida (aluno avançado no tópico): cai para o anti-join.
+    if not next_question and candidate_ids:
+        next_question = _pick_random_unanswered_question(db, profile_id, topic=target_topic)
     if not next_question:
-        next_question = db.query(models.Question).filter(
-            models.Question.id.notin_(answered_q_ids)
-        ).first()
+        next_question = _pick_random_unanswered_question(db, profile_id)
 
     return next_question
 
-def analyze_answer_and_update_proficiency(db: Session, answer: models.StudentAnswer):
+def run_ai_analysis(db: Session, answer: models.StudentAnswer):
     """
-    Função em background que chama o Gemini para análise e depois atualiza a proficiência.
+    Função em background que chama o Gemini para analisar uma resposta errada.
+    A proficiência é atualizada em lote por `proficiency.apply_pending_proficiency_updates`.
     """
-    if not answer.is_correct:
-        # Chama o serviço de IA do Gemini para analisar o erro
-        question_schema = schemas.Question.from_orm(answer.question)
-        ai_analysis_result = ai_services.analyze_student_error(
-            question=question_schema,
-            student_answer=answer.selected_option
-        )
-        answer.ai_analysis = ai_analysis_result
-        db.commit()
+    if answer.is_correct:
+        return
 
-    # Atualiza o mapa de proficiência
-    topic = answer.question.topic
-    proficiency_map = db.query(models.StudentProficiencyMap).filter_by(profile_id=answer.profile_id, topic=topic).first()
-    
-    if not proficiency_map:
-        proficiency_map = models.StudentProficiencyMap(profile_id=answer.profile_id, topic=topic, proficiency_score=0.0)
-        db.add(proficiency_map)
-
-    current_score = proficiency_map.proficiency_score
-    result_value = 1.0 if answer.is_correct else 0.2
-    new_score = (current_score * 4 + result_value) / 5
-    
-    proficiency_map.proficiency_score = new_score
+    question_schema = schemas.Question.model_validate(answer.question)
+    ai_analysis_result = ai_services.analyze_student_error(
+        question=question_schema,
+        student_answer=answer.selected_option
+    )
+    answer.ai_analysis = ai_analysis_result
+    db.commit()
+
+def get_student_answers_with_questions(db: Session, answer_ids: list[UUID]) -> list[models.StudentAnswer]:
+    return db.query(models.StudentAnswer).options(joinedload(models.StudentAnswer.question)).filter(
+        models.StudentAnswer.id.in_(answer_ids)
+    ).all()
+
+def run_ai_analyses(db: Session, answers: list[models.StudentAnswer]):
+    """
+    Analisa de uma vez as respostas erradas de uma submissão: as chamadas ao
+    Gemini rodam em paralelo (passando pelo cache de análises) e há um único commit.
+    """
+    wrong = [answer for answer in answers if not answer.is_correct]
+    if not wrong:
+        return
+    jobs = [(schemas.Question.model_validate(answer.question), answer.selected_option) for answer in wrong]
+    with ThreadPoolExecutor(max_workers=settings.AI_ANALYSIS_BATCH_CONCURRENCY) as executor:
+        results = list(executor.map(
+            lambda job: ai_services.analyze_student_error(question=job[0], student_answer=job[1]), jobs
+        ))
+    for answer, result in zip(wrong, results):
+        answer.ai_analysis = result
     db.commit()
 
 def has_proficiency_maps(db: Session, profile_id: UUID) -> bool:
@@ -135,10 +424,11 @@ def has_proficiency_maps(db: Session, profile_id: UUID) -> bool:
     Verifica de forma eficiente se existem entradas no mapa de proficiência
     para um determinado perfil. Retorna True se pelo menos uma existir.
     """
-    return db.query(models.StudentProficiencyMap).filter(models.StudentProficiencyMap.profile_id == profile_id).first() is not None
+    return db.query(
+        exists().where(models.StudentProficiencyMap.profile_id == profile_id)
+    ).scalar()
 
 def complete_onboarding(db: Session, user: models.User, onboarding_data: schemas.OnboardingRequest):
-    # (Lógica existente para completar o onboarding, sem alterações)
     LEVEL_TO_SCORE = {
         schemas.ProficiencyLevel.iniciante: 0.2,
         schemas.ProficiencyLevel.intermediario: 0.5,
@@ -149,22 +439,23 @@ def complete_onboarding(db: Session, user: models.User, onboarding_data: schemas
         profile.current_goal = onboarding_data.goal
         db.add(profile)
 
-    new_proficiency_maps = []
-    for prof in onboarding_data.proficiencies:
-        score = LEVEL_TO_SCORE.get(prof.level, 0.5)
-        existing_map = db.query(models.StudentProficiencyMap).filter_by(
-            profile_id=profile.id,
-            topic=prof.topic
-        ).first()
-        if not existing_map:
-            new_map_entry = models.StudentProficiencyMap(
-                profile_id=profile.id,
-                topic=prof.topic,
-                proficiency_score=score
-            )
-            new_proficiency_maps.append(new_map_entry)
-    if new_proficiency_maps:
-        db.add_all(new_proficiency_maps)
+    existing_topics = {topic for (topic,) in db.query(models.StudentProficiencyMap.topic).filter(
+        models.StudentProficiencyMap.profile_id == profile.id
+    )}
+    new_scores = {
+        prof.topic: LEVEL_TO_SCORE.get(prof.level, 0.5)
+        for prof in onboarding_data.proficiencies if prof.topic not in existing_topics
+    }
+    if user.role == models.UserRole.student:
+        tenant_stats.record_topic_scores(db, [
+            (user.tenant_id, topic, None, score) for topic, score in new_scores.items()
+        ])
+
+    # Tópicos já existentes mantêm o score atual (ON CONFLICT DO NOTHING).
+    upsert_proficiency_scores(db, [
+        {"profile_id": profile.id, "topic": topic, "proficiency_score": score}
+        for topic, score in new_scores.items()
+    ], overwrite=False)
     db.commit()
 
 def update_question_vector_id(db: Session, question_id: UUID, vector_id: str) -> models.Question:
@@ -176,51 +467,25 @@ def update_question_vector_id(db: Session, question_id: UUID, vector_id: str) ->
     return db_question
 
 def update_Youtube_key(db: Session, question_id: UUID, correct_option: str) -> models.Question | None:
-    """Atualiza o gabarito de uma questão."""
-    db_question = db.query(models.Question).filter(models.Question.id == question_id).first()
-    if db_question:
-        db_question.correct_option = correct_option
-        db.commit()
-        db.refresh(db_question)
-    return db_question
+    """Atualiza o gabarito de uma questão (mantido por compatibilidade)."""
+    return update_question_answer_key(db, question_id, correct_option)
 
 def get_teacher_dashboard_data(db: Session, teacher_profile_id: UUID):
-    """Executa as queries de agregação reais para o painel do professor."""
-    
-    teacher = db.query(models.Profile).filter(models.Profile.id == teacher_profile_id).first()
-    student_profiles = db.query(models.Profile).join(models.User).filter(
-        models.User.tenant_id == teacher.user.tenant_id,
-        models.User.role == 'student'
-    ).all()
-    student_profile_ids = [p.id for p in student_profiles]
-
-    if not student_profile_ids:
-        return {"class_average_score": 0, "most_difficult_topics": [], "engagement": {"active_students": 0, "total_students": 0}}
-
-    avg_score_result = db.query(func.avg(models.StudentAnswer.is_correct.cast(Float))).filter(models.StudentAnswer.profile_id.in_(student_profile_ids)).scalar() or 0
+    """Lê o painel do professor a partir dos agregados materializados do seu tenant."""
+    tenant_id = db.query(models.User.tenant_id).join(models.Profile).filter(
+        models.Profile.id == teacher_profile_id
+    ).scalar()
+    return tenant_stats.get_dashboard(db, tenant_id)
 
-    most_difficult_topics = db.query(
-        models.StudentProficiencyMap.topic,
-        func.avg(models.StudentProficiencyMap.proficiency_score).label('average_score')
-    ).filter(models.StudentProficiencyMap.profile_id.in_(student_profile_ids))\
-    .group_by(models.StudentProficiencyMap.topic)\
-    .order_by('average_score')\
-    .limit(3).all()
-
-    difficult_topics_data = [{"topic": topic, "average": round(avg, 2)} for topic, avg in most_difficult_topics]
-
-    return {
-        "class_average_score": round(avg_score_result, 2),
-        "most_difficult_topics": difficult_topics_data,
-        "engagement": {
-            "active_students": len(student_profile_ids),
-            "total_students": len(student_profile_ids)
-        }
-    }
-
-def get_student_details_for_teacher(db: Session, student_id: UUID):
-    """Busca os detalhes de um aluno para o professor."""
-    profile = db.query(models.Profile).filter(models.Profile.id == student_id).first()
+def get_student_details_for_teacher(db: Session, student_id: UUID, tenant_id: UUID):
+    """
+    Busca os detalhes de um aluno para o professor. O perfil só é devolvido se
+    o aluno pertencer ao tenant informado (checagem feita no mesmo SELECT).
+    """
+    profile = db.query(models.Profile).join(models.User).filter(
+        models.Profile.id == student_id,
+        models.User.tenant_id == tenant_id
+    ).first()
     if not profile: return None
 
     proficiency_map = db.query(models.StudentProficiencyMap).filter_by(profile_id=student_id).order_by(models.StudentProficiencyMap.proficiency_score.desc()).all()
@@ -239,4 +504,6 @@ def update_question_answer_key(db: Session, question_id: UUID, correct_option: s
         db_question.correct_option = correct_option
         db.commit()
         db.refresh(db_question)
+        question_bank.update_question(db_question)
+        analysis_cache.invalidate_question(db_question.id)
     return db_question
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+Versões assíncronas (AsyncSession) das funções de CRUD usadas pelos endpoints
+quentes: login, avaliação e progresso do aluno. A lógica que já vive em `crud`
+e não é puramente de I/O (ex: a seleção da próxima questão, que usa o índice
+em memória) roda sobre a mesma conexão via `AsyncSession.run_sync`, depois de o
+índice ser atualizado por `question_bank.aensure_fresh` (Redis e recarga sem
+bloquear o event loop).
+"""
+from uuid import UUID
+import uuid
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from . import crud, models, schemas
+from .question_bank import question_bank
+
+
+async def get_user_by_email(db: AsyncSession, email: str) -> models.User | None:
+    result = await db.execute(
+        select(models.User).options(joinedload(models.User.profile)).where(models.User.email == email)
+    )
+    return result.scalars().first()
+
+async def get_question(db: AsyncSession, question_id: UUID) -> models.Question | None:
+    return await db.get(models.Question, question_id)
+
+async def get_student_answer(db: AsyncSession, answer_id: UUID) -> models.StudentAnswer | None:
+    return await db.get(models.StudentAnswer, answer_id)
+
+async def create_student_answer(db: AsyncSession, profile_id: UUID, answer: schemas.StudentAnswerCreate, is_correct: bool) -> models.StudentAnswer:
+    db_answer = models.StudentAnswer(
+        **answer.model_dump(),
+        profile_id=profile_id,
+        is_correct=is_correct
+    )
+    db.add(db_answer)
+    await db.commit()
+    await db.refresh(db_answer)
+    return db_answer
+
+async def get_answer_keys(db: AsyncSession, question_ids: list[UUID]) -> dict[UUID, str | None]:
+    """
+    Gabarito de cada questão, lido do índice em memória. As que faltam no índice
+    (criadas em outro processo, ou sem gabarito) vêm de um único SELECT. Questões
+    inexistentes ficam fora do dicionário; as sem gabarito aparecem com None.
+    """
+    bank = await question_bank.aensure_fresh(db)
+    keys: dict[UUID, str | None] = {}
+    missing = []
+    for question_id in set(question_ids):
+        key = bank.answer_key(question_id)
+        if key is None:
+            missing.append(question_id)
+        else:
+            keys[question_id] = key
+    if missing:
+        rows = await db.execute(
+            select(models.Question.id, models.Question.correct_option).where(models.Question.id.in_(missing))
+        )
+        keys.update({question_id: key for question_id, key in rows})
+    return keys
+
+async def bulk_create_student_answers(db: AsyncSession, profile_id: UUID, answers: list[schemas.StudentAnswerCreate], results: list[bool]) -> list[UUID]:
+    """Grava as respostas de uma submissão num único INSERT e commit; devolve os IDs na ordem."""
+    rows = [
+        {**answer.model_dump(), "id": uuid.uuid4(), "profile_id": profile_id, "is_correct": is_correct}
+        for answer, is_correct in zip(answers, results)
+    ]
+    await db.execute(insert(models.StudentAnswer), rows)
+    await db.commit()
+    return [row["id"] for row in rows]
+
+async def get_student_progress(db: AsyncSession, profile_id: UUID) -> dict:
+    """Perfil e mapa de proficiência do aluno, já serializados (para o cache de leitura)."""
+    profile = await db.get(models.Profile, profile_id)
+    maps = await db.execute(
+        select(models.StudentProficiencyMap).where(models.StudentProficiencyMap.profile_id == profile_id)
+    )
+    return schemas.StudentProgress.model_validate({
+        "profile": profile,
+        "proficiency_maps": maps.scalars().all()
+    }).model_dump(mode="json")
+
+async def get_next_question_for_student(
+    db: AsyncSession, profile_id: UUID, mode: schemas.NextQuestionMode = schemas.NextQuestionMode.adaptive
+) -> models.Question | None:
+    await question_bank.aensure_fresh(db)
+    return await db.run_sync(lambda session: crud.get_next_question_for_student(session, profile_id=profile_id, mode=mode))
@@ -1,15 +1,151 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from .config import settings
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool que mede quanto tempo cada checkout levou para obter uma conexão
+    (espera na fila, pre-ping ou abertura de conexão nova) e quantos estouraram o timeout.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = {"checkouts": 0, "timeouts": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+        self._stats_lock = threading.Lock()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.wait_stats["timeouts"] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.wait_stats["checkouts"] += 1
+                self.wait_stats["wait_seconds_total"] += waited
+                self.wait_stats["wait_seconds_max"] = max(self.wait_stats["wait_seconds_max"], waited)
+
+    def recreate(self):
+        # `dispose()` recria o pool; os contadores continuam valendo para o engine.
+        pool = super().recreate()
+        pool.wait_stats, pool._stats_lock = self.wait_stats, self._stats_lock
+        return pool
+
+
+def _engine_options(url: str, profile: str) -> dict:
+    """Parâmetros de pool por perfil ("api" ou "worker"); SQLite usa os padrões do dialeto."""
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    worker = profile == "worker"
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.DB_WORKER_POOL_SIZE if worker else settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_WORKER_MAX_OVERFLOW if worker else settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_WORKER_POOL_TIMEOUT_SECONDS if worker else settings.DB_POOL_TIMEOUT_SECONDS,
+        # Recycle + pre-ping descartam conexões mortas (ex.: reinício do pgbouncer)
+        # antes de entregá-las a uma requisição.
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def _set_statement_timeout(engine, timeout_ms: int):
+    """Aplica `statement_timeout` em cada conexão nova (apenas PostgreSQL)."""
+    if engine.dialect.name != "postgresql" or not timeout_ms:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET statement_timeout = {int(timeout_ms)}")
+        cursor.close()
+        # Não deixa o SET aberto numa transação implícita do driver.
+        dbapi_connection.commit()
+
+
+def create_app_engine(url: str, profile: str = "api"):
+    engine = create_engine(url, **_engine_options(url, profile))
+    _set_statement_timeout(
+        engine,
+        settings.DB_WORKER_STATEMENT_TIMEOUT_MS if profile == "worker" else settings.DB_STATEMENT_TIMEOUT_MS
+    )
+    return engine
+
+
+def pool_metrics(engine) -> dict:
+    """Estado atual do pool (conexões em uso, overflow) e tempos de espera acumulados."""
+    pool = engine.pool
+    metrics = {}
+    if isinstance(pool, QueuePool):
+        metrics.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        metrics.update(pool.wait_stats)
+    return metrics
+
+
+# Perfil da API: usado pelos routers via `get_db`.
+engine = create_app_engine(settings.DATABASE_URL, profile="api")
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=settings.DB_EXPIRE_ON_COMMIT, bind=engine)
+
+# Perfil dos workers Celery: pool pequeno e timeout de statement maior.
+# Nenhuma conexão é aberta até o primeiro uso, então importar na API não custa nada.
+worker_engine = create_app_engine(settings.DATABASE_URL, profile="worker")
+WorkerSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=settings.DB_WORKER_EXPIRE_ON_COMMIT, bind=worker_engine)
+
+# Caminho assíncrono (asyncpg / aiosqlite) para os endpoints quentes. Criado
+# sob demanda: o driver assíncrono só é importado por quem usa `get_async_db`.
+_ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+_async_sessionmaker: async_sessionmaker | None = None
+
+def async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    return parsed.set(drivername=f"{backend}+{_ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+def create_async_app_engine(url: str):
+    options = _engine_options(url, "api")
+    # O pool assíncrono é o AsyncAdaptedQueuePool padrão, sem instrumentação.
+    options.pop("poolclass", None)
+    if make_url(url).get_backend_name() == "postgresql":
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}}
+    return create_async_engine(async_database_url(url), **options)
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        # expire_on_commit=False: atributos lidos após o commit não disparam I/O implícito.
+        _async_sessionmaker = async_sessionmaker(
+            create_async_app_engine(settings.DATABASE_URL), expire_on_commit=False, autoflush=False
+        )
+    return _async_sessionmaker
+
 Base = declarative_base()
 
+def get_pool_metrics() -> dict[str, dict]:
+    return {"api": pool_metrics(engine), "worker": pool_metrics(worker_engine)}
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
@@ -0,0 +1,171 @@
+"""
+Armazenamento local de embeddings, endereçado pelo hash do conteúdo.
+
+Reenviar uma prova, a mesma questão em concursos diferentes ou o mesmo texto
+vindo de `/content/questions/upload` e de `process_exam_pdf` geravam o mesmo
+vetor de novo. Aqui cada texto normalizado vira um SHA-256 e o vetor fica em
+disco; `ai_services.generate_embeddings` consulta o store antes da API.
+
+Layout (um diretório por modelo de embedding):
+
+- `vectors.f32`: matriz float32 (linhas x dimensão) lida via memória mapeada;
+- `index.bin`: os digests (32 bytes) na mesma ordem das linhas;
+- `meta.json`: a dimensão dos vetores.
+
+Os dois arquivos só crescem (append) sob um lock de arquivo, então a API e os
+workers do Celery compartilham o mesmo store; cada processo relê apenas a cauda
+nova do índice. O mesmo store responde buscas por vizinhos (`nearest`), usadas
+para barrar questões quase duplicadas na ingestão.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from contextlib import contextmanager
+
+import numpy as np
+
+DIGEST_SIZE = 32
+_SEARCH_BLOCK_ROWS = 50_000
+
+
+def question_text(content: str, options: dict[str, str]) -> str:
+    """
+    Enunciado seguido das alternativas em ordem de letra: é o texto que vai para
+    o embedding e para o `Question.content_hash`, para que questões com o mesmo
+    enunciado e alternativas diferentes não sejam tomadas por duplicadas.
+    """
+    lines = [content] + [f"{key.strip().upper()}) {value}" for key, value in sorted(options.items(), key=lambda item: item[0].strip().upper())]
+    return "\n".join(lines)
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 (hex) do texto normalizado (NFC, espaços colapsados); o `Question.content_hash` usa o `question_text`."""
+    normalized = re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    def __init__(self, path: str, model: str):
+        self.model = model
+        self._lock = threading.Lock()
+        self.open(path)
+
+    def open(self, path: str):
+        """(Re)aponta o store para `path`, descartando o estado em memória."""
+        with self._lock:
+            self.directory = os.path.join(path, re.sub(r"[^A-Za-z0-9_.-]+", "_", self.model))
+            self._rows: dict[bytes, int] = {}
+            self._digests: list[bytes] = []
+            self._dim: int | None = None
+            self._matrix: np.memmap | None = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Lê as linhas que outros processos acrescentaram ao índice. Chamar com `_lock`."""
+        if self._dim is None and os.path.exists(self._path("meta.json")):
+            with open(self._path("meta.json")) as f:
+                self._dim = json.load(f)["dim"]
+        index_path = self._path("index.bin")
+        count = os.path.getsize(index_path) // DIGEST_SIZE if os.path.exists(index_path) else 0
+        if count <= len(self._digests):
+            return
+        with open(index_path, "rb") as f:
+            f.seek(len(self._digests) * DIGEST_SIZE)
+            data = f.read((count - len(self._digests)) * DIGEST_SIZE)
+        for offset in range(0, len(data), DIGEST_SIZE):
+            digest = data[offset:offset + DIGEST_SIZE]
+            self._rows.setdefault(digest, len(self._digests))
+            self._digests.append(digest)
+        self._matrix = None
+
+    def _vectors(self) -> np.ndarray | None:
+        if not self._digests or self._dim is None:
+            return None
+        if self._matrix is None:
+            self._matrix = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(len(self._digests), self._dim))
+        return self._matrix
+
+    def get_many(self, texts: list[str]) -> list[list[float] | None]:
+        with self._lock:
+            self._refresh()
+            matrix = self._vectors()
+            results = []
+            for text in texts:
+                row = self._rows.get(bytes.fromhex(content_hash(text)))
+                results.append(matrix[row].tolist() if row is not None else None)
+            return results
+
+    def put_many(self, texts: list[str], vectors: list[list[float] | None]):
+        """Acrescenta os vetores dos textos ainda ausentes (None é ignorado)."""
+        with self._lock, self._file_lock():
+            self._refresh()
+            new: dict[bytes, list[float]] = {}
+            for text, vector in zip(texts, vectors):
+                digest = bytes.fromhex(content_hash(text))
+                if vector is not None and digest not in self._rows:
+                    new.setdefault(digest, vector)
+            if not new:
+                return
+            if self._dim is None:
+                self._dim = len(next(iter(new.values())))
+                with open(self._path("meta.json"), "w") as f:
+                    json.dump({"dim": self._dim, "model": self.model}, f)
+            new = {digest: vector for digest, vector in new.items() if len(vector) == self._dim}
+            if not new:
+                return
+
+            row_bytes = self._dim * np.dtype(np.float32).itemsize
+            with open(self._path("vectors.f32"), "ab") as f:
+                # Descarta linhas órfãs de uma escrita interrompida antes de o índice ser gravado.
+                f.truncate(len(self._digests) * row_bytes)
+                f.write(np.asarray(list(new.values()), dtype=np.float32).tobytes())
+            with open(self._path("index.bin"), "ab") as f:
+                f.write(b"".join(new))
+            self._refresh()
+
+    def nearest(self, vectors: list[list[float]], k: int = 5) -> list[list[tuple[str, float]]]:
+        """Para cada vetor, os `k` conteúdos mais parecidos como `(content_hash, similaridade cosseno)`."""
+        with self._lock:
+            self._refresh()
+            matrix = self._vectors()
+            if matrix is None or not vectors:
+                return [[] for _ in vectors]
+            digests = list(self._digests)
+
+        queries = np.asarray(vectors, dtype=np.float32)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        k = min(k, len(digests))
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        # Varre a matriz mapeada em blocos para não carregar tudo na memória de uma vez.
+        for start in range(0, len(digests), _SEARCH_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + _SEARCH_BLOCK_ROWS])
+            norms = np.maximum(np.linalg.norm(block, axis=1), 1e-12)
+            scores = (queries @ block.T) / norms
+            rows = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            top = np.argsort(-best_scores, axis=1)[:, :k]
+            best_scores = np.take_along_axis(best_scores, top, axis=1)
+            best_rows = np.take_along_axis(best_rows, top, axis=1)
+
+        return [
+            [(digests[row].hex(), float(score)) for row, score in zip(rows, scores)]
+            for rows, scores in zip(best_rows, best_scores)
+        ]
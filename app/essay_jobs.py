@@ -0,0 +1,106 @@
+"""
+Correção de redação em segundo plano, com resultado consultável e deduplicado.
+
+A correção é a chamada mais lenta ao Gemini (10-30 s); no modo assíncrono o
+endpoint só enfileira a tarefa `grade_essay` e devolve um `job_id`, que é o
+SHA-256 de (tema, texto). Como o ID é determinístico:
+
+- reenviar a mesma redação devolve na hora o resultado guardado no Redis;
+- envios repetidos enquanto a correção está na fila não geram outra tarefa
+  (marcador `pending` com SET NX; a tarefa usa o próprio `job_id` como task_id).
+
+O JSON do modelo é validado contra `schemas.EssayGradeResponse` e a `nota_total`
+é recalculada no servidor como a soma das notas dos critérios.
+"""
+import hashlib
+import json
+
+import redis
+from pydantic import ValidationError
+
+from . import ai_services, schemas
+from .config import settings
+from .redis_client import get_redis
+
+KEY_PREFIX = "essay_grade"
+
+
+class EssayGradingError(Exception):
+    """O Gemini não devolveu uma correção utilizável."""
+
+
+def job_id(essay_text: str, theme: str) -> str:
+    payload = json.dumps({"theme": theme.strip(), "essay_text": essay_text.strip()}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def validate_grade(raw: dict) -> dict:
+    """Valida a correção e recalcula a `nota_total` a partir dos critérios."""
+    grade = schemas.EssayGradeResponse.model_validate(raw)
+    grade.nota_total = sum(criterion.nota for criterion in grade.criterios)
+    return grade.model_dump()
+
+
+def get_result(job: str) -> dict | None:
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        cached = client.get(f"{KEY_PREFIX}:{job}")
+    except redis.exceptions.RedisError:
+        return None
+    return json.loads(cached) if cached is not None else None
+
+
+def claim(job: str) -> bool:
+    """Marca a correção como enfileirada; False se outra requisição já o fez."""
+    client = get_redis()
+    if client is None:
+        return True
+    try:
+        return bool(client.set(f"{KEY_PREFIX}:{job}:pending", 1, nx=True, ex=settings.ESSAY_GRADE_PENDING_TTL_SECONDS))
+    except redis.exceptions.RedisError:
+        return True
+
+
+def is_pending(job: str) -> bool:
+    client = get_redis()
+    if client is None:
+        return False
+    try:
+        return bool(client.exists(f"{KEY_PREFIX}:{job}:pending"))
+    except redis.exceptions.RedisError:
+        return False
+
+
+def release(job: str):
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.delete(f"{KEY_PREFIX}:{job}:pending")
+    except redis.exceptions.RedisError as e:
+        print(f"Erro ao liberar a correção de redação {job}: {e}")
+
+
+def _store_result(job: str, result: dict):
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.set(f"{KEY_PREFIX}:{job}", json.dumps(result, ensure_ascii=False), ex=settings.ESSAY_GRADE_CACHE_TTL_SECONDS)
+    except redis.exceptions.RedisError as e:
+        print(f"Erro ao gravar a correção de redação no cache: {e}")
+
+
+def grade(essay_text: str, theme: str) -> dict:
+    """Corrige a redação, valida o resultado e o guarda no cache."""
+    raw = ai_services.grade_essay_with_gemini(essay_text, theme)
+    if raw is None:
+        raise EssayGradingError("O Gemini não devolveu a correção.")
+    try:
+        result = validate_grade(raw)
+    except ValidationError as e:
+        raise EssayGradingError(f"Correção fora do formato esperado: {e.error_count()} erro(s) de validação.")
+    _store_result(job_id(essay_text, theme), result)
+    return result
@@ -0,0 +1,159 @@
+"""
+Pipeline de extração e estruturação de provas em PDF.
+
+Cadernos grandes (100+ páginas) não cabem bem num único prompt: a resposta
+estoura o limite de tokens de saída e as últimas questões se perdem. O
+pipeline:
+
+1. extrai o texto das páginas em paralelo (um processo por faixa de páginas);
+2. divide o texto em blocos que respeitam os limites das questões ("QUESTÃO 12");
+3. estrutura os blocos concorrentemente com `ai_services.structure_exam_from_text`;
+4. junta os resultados na ordem original e remove questões duplicadas
+   (mesmo enunciado e mesmas alternativas).
+"""
+import re
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable
+
+import fitz
+
+from . import ai_services, subprocesses
+from .config import settings
+
+QUESTION_BOUNDARY = re.compile(r"^[ \t]*QUEST[ÃA]O[ \t]*\d+", re.IGNORECASE | re.MULTILINE)
+
+ProgressCallback = Callable[[str, int, int], None]
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> list[str]:
+    with fitz.open(file_path) as doc:
+        return [doc[i].get_text() for i in range(start, end)]
+
+
+def extract_pages(file_path: str, workers: int | None = None) -> list[str]:
+    """Extrai o texto de cada página do PDF, dividindo as páginas entre vários processos."""
+    workers = workers or settings.EXAM_PDF_EXTRACT_WORKERS
+    with fitz.open(file_path) as doc:
+        page_count = doc.page_count
+
+    if workers <= 1 or page_count <= workers:
+        return _extract_page_range(file_path, 0, page_count)
+
+    step = -(-page_count // workers)
+    # Um processo por faixa de páginas (também dentro do worker do Celery), com
+    # prazo para que um processo travado não prenda a tarefa.
+    ranges = [(file_path, start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    results = subprocesses.map_in_processes(_extract_page_range, ranges, timeout=settings.EXAM_PDF_EXTRACT_TIMEOUT_SECONDS)
+    return [text for texts in results for text in texts]
+
+
+def _split_oversized(segment: str, max_chars: int) -> list[str]:
+    """Quebra um trecho maior que o limite em parágrafos (ou à força, em último caso)."""
+    pieces, current = [], ""
+    for paragraph in segment.split("\n\n"):
+        while len(paragraph) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_chunks(pages: list[str], max_chars: int | None = None) -> list[str]:
+    """
+    Junta as páginas e divide o texto em blocos de até `max_chars` caracteres,
+    cortando apenas no início de uma questão. Sem marcadores de questão, corta
+    nas quebras de página.
+    """
+    max_chars = max_chars or settings.EXAM_CHUNK_MAX_CHARS
+    text = "\n".join(pages)
+    starts = [match.start() for match in QUESTION_BOUNDARY.finditer(text)]
+    if starts:
+        bounds = ([0] if starts[0] > 0 else []) + starts + [len(text)]
+        segments = [text[a:b] for a, b in zip(bounds, bounds[1:])]
+    else:
+        segments = [page + "\n" for page in pages]
+
+    chunks, current = [], ""
+    for segment in segments:
+        if len(segment) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(_split_oversized(segment, max_chars))
+            continue
+        if current and len(current) + len(segment) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += segment
+    if current.strip():
+        chunks.append(current)
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def _normalize(content: str) -> str:
+    content = unicodedata.normalize("NFKD", content).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"\W+", " ", content).strip().lower()
+
+
+def _question_key(question: dict) -> tuple | None:
+    content = _normalize(question.get("content", ""))
+    if not content:
+        return None
+    options = question.get("options") or {}
+    return content, tuple(sorted((key.strip().upper(), _normalize(str(value))) for key, value in options.items()))
+
+
+def merge_questions(results: list[dict | None]) -> list[dict]:
+    """
+    Concatena as questões dos blocos na ordem original, descartando duplicatas:
+    mesmo enunciado e mesmas alternativas (questões com enunciado genérico, como
+    "Assinale a alternativa correta.", diferem só nas alternativas).
+    """
+    seen, merged = set(), []
+    for result in results:
+        if not result:
+            continue
+        for question in result.get("questions", []):
+            key = _question_key(question)
+            if key is None or key in seen:
+                continue
+            seen.add(key)
+            merged.append(question)
+    return merged
+
+
+def structure_chunks(chunks: list[str], on_progress: ProgressCallback | None = None) -> list[dict]:
+    """Estrutura os blocos concorrentemente e devolve as questões já mescladas."""
+    results: list[dict | None] = [None] * len(chunks)
+    with ThreadPoolExecutor(max_workers=settings.EXAM_STRUCTURE_CONCURRENCY) as executor:
+        futures = {executor.submit(ai_services.structure_exam_from_text, chunk): i for i, chunk in enumerate(chunks)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            results[index] = future.result()
+            if results[index] is None:
+                print(f"Bloco {index + 1}/{len(chunks)} da prova não pôde ser estruturado.")
+            if on_progress:
+                on_progress("structuring", done, len(chunks))
+    return merge_questions(results)
+
+
+def structure_exam_pdf(file_path: str, on_progress: ProgressCallback | None = None) -> list[dict]:
+    """Executa o pipeline completo e retorna a lista de questões estruturadas."""
+    pages = extract_pages(file_path)
+    if on_progress:
+        on_progress("extracted", len(pages), len(pages))
+    chunks = split_into_chunks(pages)
+    if not chunks:
+        return []
+    if on_progress:
+        on_progress("structuring", 0, len(chunks))
+    return structure_chunks(chunks, on_progress=on_progress)
@@ -0,0 +1,129 @@
+"""
+Hash e verificação de senhas (bcrypt) fora do event loop e do threadpool.
+
+O bcrypt custa centenas de milissegundos de CPU por chamada; num pico de logins
+(início de uma prova) isso travava todos os outros endpoints. Aqui o trabalho
+vai para um pool de processos dedicado (escala com os núcleos e não disputa o
+GIL da API), com um limite de chamadas em andamento por processo.
+
+O custo (rounds) é configurável; hashes gravados com outro custo são refeitos
+de forma transparente no próximo login (`verify_and_update`).
+
+A importação em lote (`hash_passwords`) não usa esse pool, dimensionado para a
+API: divide as senhas entre processos próprios (`USER_IMPORT_HASH_WORKERS`, por
+padrão um por núcleo), também dentro do worker do Celery.
+
+O pool é encerrado no shutdown da API (lifespan em `main.py`).
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+
+from passlib.context import CryptContext
+
+from . import subprocesses
+from .config import settings
+
+
+@lru_cache(maxsize=4)
+def _context(rounds: int) -> CryptContext:
+    # min == max == rounds: qualquer hash com custo diferente é marcado para refazer.
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+def context() -> CryptContext:
+    return _context(settings.PASSWORD_BCRYPT_ROUNDS)
+
+
+# --- Funções executadas nos processos do pool (precisam ser picklable) ---
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+def _hash_many(passwords: list[str], rounds: int) -> list[str]:
+    return [_hash(password, rounds) for password in passwords]
+
+def _verify_and_update(password: str, password_hash: str, rounds: int) -> tuple[bool, str | None]:
+    return _context(rounds).verify_and_update(password, password_hash)
+
+
+_executor: Executor | None = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> Executor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = settings.PASSWORD_HASH_WORKERS
+            # Processos filhos do Celery (prefork) são daemônicos e não podem criar
+            # outros processos; nesse caso (ou com workers=0) o hash usa threads.
+            if workers <= 0 or multiprocessing.current_process().daemon:
+                _executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="bcrypt")
+            else:
+                _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+class _PendingLimiter:
+    """
+    Limita os hashes em andamento deste processo: um semáforo por event loop para
+    as chamadas assíncronas e um de threads para as síncronas (threadpool, tarefas).
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self.blocking = threading.BoundedSemaphore(limit)
+
+    def semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+_pending = _PendingLimiter(settings.PASSWORD_HASH_MAX_PENDING)
+
+async def _run(fn, *args):
+    async with _pending.semaphore():
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+
+
+# --- API pública ---
+
+async def verify_and_update_async(password: str, password_hash: str) -> tuple[bool, str | None]:
+    """Verifica a senha; se o hash usa outro custo, devolve também o novo hash a gravar."""
+    return await _run(_verify_and_update, password, password_hash, settings.PASSWORD_BCRYPT_ROUNDS)
+
+def hash_password(password: str) -> str:
+    """Versão síncrona (endpoints síncronos, tarefas): a thread só espera o pool."""
+    with _pending.blocking:
+        return _get_executor().submit(_hash, password, settings.PASSWORD_BCRYPT_ROUNDS).result()
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    """Hash de várias senhas em paralelo em processos próprios (importação em lote), na mesma ordem."""
+    rounds = settings.PASSWORD_BCRYPT_ROUNDS
+    workers = min(settings.USER_IMPORT_HASH_WORKERS or os.cpu_count() or 1, len(passwords))
+    if workers <= 1:
+        return _hash_many(passwords, rounds)
+    step = -(-len(passwords) // workers)
+    results = subprocesses.map_in_processes(
+        _hash_many, [(passwords[start:start + step], rounds) for start in range(0, len(passwords), step)]
+    )
+    return [password_hash for hashes in results for password_hash in hashes]
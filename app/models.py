@@ -3,7 +3,7 @@ import enum
 import os
 from sqlalchemy import (
     Column, String, ForeignKey, Boolean, Integer,
-    Text, Enum as SQLAlchemyEnum, Float, TIMESTAMP
+    Text, Enum as SQLAlchemyEnum, Float, TIMESTAMP, Index, text, Date, and_
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -12,6 +12,18 @@ from .database import Base
 from .db_types import JSONB_FALLBACK  # ✅ Import seguro para testes/local
 
 
+ANALYSIS_FAILED = "analysis_failed"
+
+def analysis_pending_clause(is_correct, ai_analysis):
+    """
+    Respostas erradas ainda sem análise ou com o fallback `analysis_failed`.
+    Usada pelo índice parcial e pelo backfill, para que o predicado seja idêntico.
+    """
+    return and_(
+        is_correct.is_(False),
+        func.coalesce(ai_analysis["error_type"].as_string(), ANALYSIS_FAILED) == ANALYSIS_FAILED,
+    )
+
 class UserRole(str, enum.Enum):
     student = "student"
     teacher = "teacher"
@@ -41,6 +53,8 @@ class Profile(Base):
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, unique=True)
     full_name = Column(String(255), nullable=False)
     current_goal = Column(String(100))
+    # Último dia com resposta; mantido pelo motor de proficiência para as métricas de engajamento
+    last_active_on = Column(Date)
     user = relationship("User", back_populates="profile")
 
 class Enrollment(Base):
@@ -57,11 +71,22 @@ class Question(Base):
     content = Column(Text, nullable=False)
     # ALTERADO: Usando o tipo personalizado JSONB_FALLBACK
     options = Column(JSONB_FALLBACK, nullable=False)
-    correct_option = Column(String(10), nullable=False)
+    # NULL enquanto o gabarito não foi definido (questões ingeridas de PDFs): a
+    # questão fica fora do banco de questões e dos seletores até lá.
+    correct_option = Column(String(10), nullable=True)
     subject = Column(String(100), nullable=False, index=True)
     topic = Column(String(100), nullable=False, index=True)
     source = Column(String(100))
+    # Preenchido só depois que o vetor foi gravado no ChromaDB
     vector_id = Column(String(255), unique=True, index=True)
+    # SHA-256 do enunciado com as alternativas, normalizado (embedding_store.content_hash
+    # de question_text), para deduplicação
+    content_hash = Column(String(64), index=True)
+
+    __table_args__ = (
+        # Permite sortear uma questão de um tópico com um range scan em id.
+        Index("ix_questions_topic_id", "topic", "id"),
+    )
 
 class StudentAnswer(Base):
     __tablename__ = "student_answers"
@@ -74,9 +99,29 @@ class StudentAnswer(Base):
     # ALTERADO: Usando o tipo personalizado JSONB_FALLBACK
     ai_analysis = Column(JSONB_FALLBACK)
     answered_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    # Marcado pelo motor de proficiência em lote (app/proficiency.py). Em bases
+    # existentes a coluna entra com DEFAULT TRUE (ver script.sql), senão o
+    # histórico seria aplicado de novo.
+    proficiency_applied = Column(Boolean, nullable=False, default=False, server_default=text("false"))
     profile = relationship("Profile")
     question = relationship("Question")
 
+    __table_args__ = (
+        # Usado pelo anti-join do seletor de próxima questão.
+        Index("ix_student_answers_profile_question", "profile_id", "question_id"),
+        # Índice parcial com apenas a fila de respostas pendentes.
+        Index(
+            "ix_student_answers_pending_proficiency", "answered_at",
+            postgresql_where=text("NOT proficiency_applied"),
+            sqlite_where=text("NOT proficiency_applied"),
+        ),
+        # Fila das análises a refazer, percorrida por keyset (answered_at, id).
+        Index(
+            "ix_student_answers_analysis_pending", "answered_at", "id",
+            postgresql_where=analysis_pending_clause(is_correct, ai_analysis),
+        ),
+    )
+
 class StudentProficiencyMap(Base):
     __tablename__ = "student_proficiency_map"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -85,3 +130,48 @@ class StudentProficiencyMap(Base):
     proficiency_score = Column(Float, nullable=False, default=0.0)
     last_updated = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
     profile = relationship("Profile")
+
+    __table_args__ = (
+        # Garante um único score por (aluno, tópico), serve de alvo para o upsert e,
+        # com o INCLUDE no PostgreSQL, permite index-only scans nas leituras por perfil.
+        Index(
+            "uq_student_proficiency_map_profile_topic", "profile_id", "topic",
+            unique=True,
+            postgresql_include=["proficiency_score"],
+        ),
+    )
+
+# --- Agregados materializados do painel do professor (app/tenant_stats.py) ---
+
+class TenantStats(Base):
+    __tablename__ = "tenant_stats"
+    tenant_id = Column(UUID(as_uuid=True), ForeignKey("tenants.id"), primary_key=True)
+    total_students = Column(Integer, nullable=False, default=0, server_default="0")
+    answer_count = Column(Integer, nullable=False, default=0, server_default="0")
+    correct_count = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class TenantTopicStats(Base):
+    __tablename__ = "tenant_topic_stats"
+    tenant_id = Column(UUID(as_uuid=True), ForeignKey("tenants.id"), primary_key=True)
+    topic = Column(String(100), primary_key=True)
+    score_sum = Column(Float, nullable=False, default=0.0, server_default="0")
+    score_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+class TenantActivityBucket(Base):
+    """Quantos alunos do tenant tiveram o último dia de atividade em `day`."""
+    __tablename__ = "tenant_activity_buckets"
+    tenant_id = Column(UUID(as_uuid=True), ForeignKey("tenants.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    active_students = Column(Integer, nullable=False, default=0, server_default="0")
+
+# --- Vizinhos pré-calculados de cada questão (app/question_neighbors.py) ---
+
+class QuestionNeighbor(Base):
+    """As questões mais próximas de `question_id` no ChromaDB, ordenadas por `rank`."""
+    __tablename__ = "question_neighbors"
+    question_id = Column(UUID(as_uuid=True), ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True)
+    neighbor_id = Column(UUID(as_uuid=True), ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True)
+    rank = Column(Integer, nullable=False)
+    distance = Column(Float, nullable=False)
+
@@ -0,0 +1,156 @@
+"""
+Motor de atualização de proficiência em lote.
+
+Cada resposta atualiza o score do par (aluno, tópico) com a média móvel
+exponencial `novo = (score * 4 + resultado) / 5`. Aplicar n respostas em
+sequência equivale à forma fechada
+
+    s_n = a^n * s_0 + (1 - a) * sum_k a^(n-1-k) * r_k,   com a = 0.8
+
+o que permite processar milhares de respostas pendentes de uma vez com NumPy,
+lendo cada linha de `student_proficiency_map` uma única vez por lote e gravando
+todas com um único upsert, em vez de um read-modify-write (e um commit) por resposta.
+"""
+import numpy as np
+from sqlalchemy import bindparam, text, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import Text
+from sqlalchemy.orm import Session
+
+from . import crud, models, tenant_stats
+from .cache import dashboard_cache, progress_cache
+from .config import settings
+
+PREVIOUS_WEIGHT = 0.8
+CORRECT_RESULT = 1.0
+WRONG_RESULT = 0.2
+
+# Namespace dos advisory locks por aluno (primeiro argumento de pg_advisory_xact_lock).
+PROFILE_LOCK_NAMESPACE = 7301
+
+_LOCK_PROFILES = text(
+    "SELECT count(pg_advisory_xact_lock(:namespace, hashtext(profile_id))) "
+    "FROM unnest(:profile_ids) AS profile_id"
+).bindparams(bindparam("profile_ids", type_=ARRAY(Text)))
+
+
+def compute_ema_batch(group_index: np.ndarray, results: np.ndarray, initial_scores: np.ndarray) -> np.ndarray:
+    """
+    Aplica a sequência de EMAs de cada grupo em forma fechada.
+
+    `group_index` e `results` têm uma posição por resposta, já ordenadas por grupo
+    e, dentro do grupo, por `answered_at`. `initial_scores` tem um score por grupo.
+    Retorna o score final de cada grupo.
+    """
+    n_groups = len(initial_scores)
+    counts = np.bincount(group_index, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    positions = np.arange(len(results)) - starts[group_index]
+    exponents = counts[group_index] - 1 - positions
+    contributions = np.bincount(
+        group_index,
+        weights=np.power(PREVIOUS_WEIGHT, exponents) * results,
+        minlength=n_groups,
+    )
+    return np.power(PREVIOUS_WEIGHT, counts) * initial_scores + (1 - PREVIOUS_WEIGHT) * contributions
+
+
+def apply_pending_proficiency_updates(db: Session, chunk_size: int | None = None) -> int:
+    """
+    Drena as respostas com `proficiency_applied = False` em lotes e atualiza o mapa
+    de proficiência. No PostgreSQL os lotes usam `FOR UPDATE SKIP LOCKED`, então
+    vários workers podem drenar a fila ao mesmo tempo. Retorna o total processado.
+    """
+    chunk_size = chunk_size or settings.PROFICIENCY_BATCH_SIZE
+    processed = 0
+    while True:
+        rows = db.query(
+            models.StudentAnswer.id,
+            models.StudentAnswer.profile_id,
+            models.Question.topic,
+            models.StudentAnswer.is_correct,
+            models.StudentAnswer.answered_at,
+            models.User.tenant_id,
+        ).join(models.Question, models.Question.id == models.StudentAnswer.question_id)\
+        .join(models.Profile, models.Profile.id == models.StudentAnswer.profile_id)\
+        .join(models.User, models.User.id == models.Profile.user_id)\
+        .filter(models.StudentAnswer.proficiency_applied.is_(False))\
+        .order_by(models.StudentAnswer.answered_at, models.StudentAnswer.id)\
+        .limit(chunk_size)\
+        .with_for_update(of=models.StudentAnswer, skip_locked=True)\
+        .all()
+        if not rows:
+            break
+
+        _apply_chunk(db, rows)
+        db.commit()
+        # Os painéis e o progresso afetados pelo lote precisam ser recalculados.
+        dashboard_cache.invalidate({str(row.tenant_id) for row in rows})
+        progress_cache.invalidate({str(row.profile_id) for row in rows})
+        processed += len(rows)
+        if len(rows) < chunk_size:
+            break
+    return processed
+
+
+def _lock_profiles(db: Session, profile_ids: set):
+    """
+    Serializa, até o fim da transação, os lotes que tocam os mesmos alunos. O
+    `FOR UPDATE` do mapa só trava pares (aluno, tópico) que já existem: sem isto,
+    dois lotes concorrentes calculariam o mesmo par novo a partir de 0 e o upsert
+    do segundo apagaria o do primeiro. Locks em ordem fixa, para não haver deadlock.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return  # O SQLite já serializa as transações de escrita.
+    db.execute(_LOCK_PROFILES, {
+        "namespace": PROFILE_LOCK_NAMESPACE, "profile_ids": sorted(str(profile_id) for profile_id in profile_ids)
+    })
+
+
+def _apply_chunk(db: Session, rows: list):
+    keys: dict[tuple, int] = {}
+    group_index = np.empty(len(rows), dtype=np.int64)
+    results = np.empty(len(rows), dtype=np.float64)
+    tenant_of: dict = {}
+    for i, (_, profile_id, topic, is_correct, _, tenant_id) in enumerate(rows):
+        tenant_of[profile_id] = tenant_id
+        group_index[i] = keys.setdefault((profile_id, topic), len(keys))
+        results[i] = CORRECT_RESULT if is_correct else WRONG_RESULT
+
+    # Ordenação estável: agrupa mantendo a ordem de answered_at dentro de cada grupo.
+    order = np.argsort(group_index, kind="stable")
+    group_keys = list(keys)
+
+    _lock_profiles(db, set(tenant_of))
+    existing = db.query(models.StudentProficiencyMap).filter(
+        tuple_(models.StudentProficiencyMap.profile_id, models.StudentProficiencyMap.topic).in_(group_keys)
+    ).order_by(models.StudentProficiencyMap.profile_id, models.StudentProficiencyMap.topic)\
+    .with_for_update()\
+    .all()
+    existing_by_key = {(m.profile_id, m.topic): m for m in existing}
+
+    initial_scores = np.array(
+        [existing_by_key[key].proficiency_score if key in existing_by_key else 0.0 for key in group_keys],
+        dtype=np.float64,
+    )
+    final_scores = compute_ema_batch(group_index[order], results[order], initial_scores)
+
+    final_scores = final_scores.tolist()
+    crud.upsert_proficiency_scores(db, [
+        {"profile_id": profile_id, "topic": topic, "proficiency_score": score}
+        for (profile_id, topic), score in zip(group_keys, final_scores)
+    ])
+
+    # Mantém os agregados do painel do professor na mesma transação do lote.
+    tenant_stats.record_topic_scores(db, [
+        (tenant_of[profile_id], topic, old_score if (profile_id, topic) in existing_by_key else None, new_score)
+        for (profile_id, topic), old_score, new_score in zip(group_keys, initial_scores.tolist(), final_scores)
+    ])
+    tenant_stats.record_answers(db, [
+        (profile_id, tenant_id, is_correct, answered_at)
+        for _, profile_id, _, is_correct, answered_at, tenant_id in rows
+    ])
+
+    db.query(models.StudentAnswer).filter(
+        models.StudentAnswer.id.in_([row[0] for row in rows])
+    ).update({models.StudentAnswer.proficiency_applied: True}, synchronize_session=False)
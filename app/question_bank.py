@@ -0,0 +1,237 @@
+"""
+Índice em memória do banco de questões.
+
+O banco muda raramente (uploads de administradores e ingestão de provas), mas o
+seletor de próxima questão é chamado a cada resposta. Este módulo mantém, por
+processo, um índice compacto com:
+
+- um índice denso para cada questão (posição na lista `_ids`);
+- um `array('I')` por tópico com os índices densos das suas questões;
+- o mapa tópico -> matéria e o gabarito de cada questão.
+
+Questões sem gabarito (`correct_option` NULL) ficam fora do índice até que
+`crud.update_question_answer_key` o defina.
+
+Os caminhos de escrita (`crud.create_question`, `crud.update_question_answer_key`)
+atualizam o índice local de forma incremental e incrementam um contador de versão
+no Redis. Os outros processos (workers do uvicorn e do Celery) comparam esse
+contador periodicamente e recarregam o índice quando ele muda, quando ele não
+pode ser lido (Redis fora) ou quando o índice passa de `QUESTION_BANK_MAX_AGE_SECONDS`.
+"""
+import asyncio
+import random
+import threading
+import time
+from array import array
+from uuid import UUID
+
+import redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+from .redis_client import get_async_redis, get_redis
+
+VERSION_KEY = "question_bank:version"
+
+
+class QuestionBankIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        """Descarta o índice; o próximo acesso recarrega do banco."""
+        with self._lock:
+            self._loaded = False
+            self._version: int | None = None
+            self._last_version_check = 0.0
+            self._loaded_at = 0.0
+            self._ids: list[UUID] = []
+            self._positions: dict[UUID, int] = {}
+            self._topics: list[str] = []
+            self._answer_keys: list[str] = []
+            self._topic_pools: dict[str, array] = {}
+            self._topic_subjects: dict[str, str] = {}
+
+    # --- Carregamento e sincronização entre processos ---
+
+    def ensure_fresh(self, db: Session) -> "QuestionBankIndex":
+        """
+        Carrega o índice na primeira chamada e recarrega se outro processo alterou o
+        banco. Sem como ler a versão (Redis fora), ou com o índice velho demais,
+        recarrega a cada verificação em vez de confiar no índice local.
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load(db)
+            elif self._check_due():
+                self._last_version_check = time.monotonic()
+                if self._is_stale(_read_remote_version()):
+                    self._load(db)
+        return self
+
+    async def aensure_fresh(self, db: AsyncSession) -> "QuestionBankIndex":
+        """
+        Versão assíncrona de `ensure_fresh`, para os endpoints `async`: a versão vem
+        do cliente Redis assíncrono, a leitura das questões usa a AsyncSession e a
+        montagem do índice roda numa thread, sem bloquear o event loop.
+        """
+        if self._loaded and not self._check_due():
+            return self
+        self._last_version_check = time.monotonic()
+        version = await _aread_remote_version()
+        if self._loaded and not self._is_stale(version):
+            return self
+        rows = (await db.execute(self._rows_query())).all()
+        await asyncio.to_thread(self._rebuild, rows, version)
+        return self
+
+    def _check_due(self) -> bool:
+        return time.monotonic() - self._last_version_check >= settings.QUESTION_BANK_VERSION_CHECK_SECONDS
+
+    def _is_stale(self, remote_version: int | None) -> bool:
+        return (
+            remote_version is None
+            or remote_version != self._version
+            or time.monotonic() - self._loaded_at >= settings.QUESTION_BANK_MAX_AGE_SECONDS
+        )
+
+    @staticmethod
+    def _rows_query():
+        return select(
+            models.Question.id,
+            models.Question.topic,
+            models.Question.subject,
+            models.Question.correct_option,
+        ).where(models.Question.correct_option.isnot(None))
+
+    def _load(self, db: Session):
+        version = _read_remote_version()
+        self._rebuild(db.execute(self._rows_query()).all(), version)
+
+    def _rebuild(self, rows: list, version: int | None):
+        with self._lock:
+            self._ids = []
+            self._positions = {}
+            self._topics = []
+            self._answer_keys = []
+            self._topic_pools = {}
+            self._topic_subjects = {}
+            for question_id, topic, subject, correct_option in rows:
+                self._append(question_id, topic, subject, correct_option)
+
+            self._version = version
+            self._loaded = True
+            self._last_version_check = self._loaded_at = time.monotonic()
+
+    def _append(self, question_id: UUID, topic: str, subject: str, correct_option: str | None):
+        if correct_option is None:
+            return
+        position = len(self._ids)
+        self._ids.append(question_id)
+        self._positions[question_id] = position
+        self._topics.append(topic)
+        self._answer_keys.append(correct_option)
+        self._topic_pools.setdefault(topic, array("I")).append(position)
+        self._topic_subjects.setdefault(topic, subject)
+
+    def _publish_change(self):
+        """Incrementa a versão global. Se outro processo também mudou o banco, força recarga."""
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            new_version = int(client.incr(VERSION_KEY))
+        except redis.exceptions.RedisError as e:
+            print(f"Erro ao publicar versão do banco de questões: {e}")
+            return
+        if self._version is not None and new_version == self._version + 1:
+            self._version = new_version
+        else:
+            self._loaded = False
+
+    # --- Atualizações incrementais ---
+
+    def add_questions(self, questions: list[models.Question]):
+        """Registra questões recém-criadas no índice local e avisa os demais processos."""
+        with self._lock:
+            if self._loaded:
+                for question in questions:
+                    if question.id in self._positions:
+                        self._update(question)
+                    else:
+                        self._append(question.id, question.topic, question.subject, question.correct_option)
+            self._publish_change()
+
+    def update_question(self, question: models.Question):
+        """Atualiza gabarito/tópico de uma questão existente."""
+        with self._lock:
+            if self._loaded:
+                if question.id in self._positions:
+                    self._update(question)
+                else:
+                    self._append(question.id, question.topic, question.subject, question.correct_option)
+            self._publish_change()
+
+    def _update(self, question: models.Question):
+        position = self._positions[question.id]
+        self._answer_keys[position] = question.correct_option
+        old_topic = self._topics[position]
+        if old_topic != question.topic:
+            self._topic_pools[old_topic].remove(position)
+            if not self._topic_pools[old_topic]:
+                del self._topic_pools[old_topic]
+                self._topic_subjects.pop(old_topic, None)
+            self._topics[position] = question.topic
+            self._topic_pools.setdefault(question.topic, array("I")).append(position)
+            self._topic_subjects.setdefault(question.topic, question.subject)
+
+    # --- Consultas ---
+
+    def topics(self) -> list[str]:
+        with self._lock:
+            return list(self._topic_pools)
+
+    def subject_of(self, topic: str) -> str | None:
+        return self._topic_subjects.get(topic)
+
+    def answer_key(self, question_id: UUID) -> str | None:
+        position = self._positions.get(question_id)
+        return self._answer_keys[position] if position is not None else None
+
+    def sample(self, topic: str, k: int) -> list[UUID]:
+        """Sorteia até `k` ids distintos do tópico sem tocar no banco."""
+        with self._lock:
+            pool = self._topic_pools.get(topic)
+            if not pool:
+                return []
+            positions = random.sample(range(len(pool)), min(k, len(pool)))
+            return [self._ids[pool[i]] for i in positions]
+
+
+async def _aread_remote_version() -> int | None:
+    client = get_async_redis()
+    if client is None:
+        return None
+    try:
+        value = await client.get(VERSION_KEY)
+    except redis.exceptions.RedisError:
+        return None
+    return int(value) if value is not None else 0
+
+
+def _read_remote_version() -> int | None:
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        value = client.get(VERSION_KEY)
+    except redis.exceptions.RedisError:
+        return None
+    return int(value) if value is not None else 0
+
+
+question_bank = QuestionBankIndex()
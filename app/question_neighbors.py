@@ -0,0 +1,105 @@
+"""
+Lista pré-calculada dos vizinhos mais próximos de cada questão (tabela
+`question_neighbors`), a partir dos embeddings já guardados no ChromaDB.
+
+É recalculada na ingestão: as novas questões ganham a sua lista e entram nas
+listas das questões antigas de que ficaram mais próximas do que o pior vizinho
+atual. O caminho online (modo de reforço da próxima questão) lê só esta
+tabela e nunca chama a API de embeddings nem o ChromaDB.
+"""
+from collections import defaultdict
+from uuid import UUID
+
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+
+from . import models, vector_db
+from .config import settings
+
+Neighbors = list[tuple[UUID, float]]
+
+_IN_CLAUSE_CHUNK = 1000
+
+
+def _chunks(items: list, size: int = _IN_CLAUSE_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _existing_question_ids(db: Session, ids: set[UUID]) -> set[UUID]:
+    found = set()
+    for chunk in _chunks(list(ids)):
+        found.update(qid for (qid,) in db.query(models.Question.id).filter(models.Question.id.in_(chunk)))
+    return found
+
+
+def _load_lists(db: Session, question_ids: list[UUID]) -> dict[UUID, Neighbors]:
+    lists: dict[UUID, Neighbors] = defaultdict(list)
+    for chunk in _chunks(question_ids):
+        rows = db.query(
+            models.QuestionNeighbor.question_id, models.QuestionNeighbor.neighbor_id, models.QuestionNeighbor.distance
+        ).filter(models.QuestionNeighbor.question_id.in_(chunk)).order_by(models.QuestionNeighbor.rank)
+        for question_id, neighbor_id, distance in rows:
+            lists[question_id].append((neighbor_id, distance))
+    return lists
+
+
+def _replace_lists(db: Session, lists: dict[UUID, Neighbors]):
+    for chunk in _chunks(list(lists)):
+        db.execute(delete(models.QuestionNeighbor).where(models.QuestionNeighbor.question_id.in_(chunk)))
+    rows = [
+        {"question_id": question_id, "neighbor_id": neighbor_id, "rank": rank, "distance": distance}
+        for question_id, neighbors in lists.items()
+        for rank, (neighbor_id, distance) in enumerate(neighbors)
+    ]
+    if rows:
+        db.execute(insert(models.QuestionNeighbor), rows)
+
+
+def _merge(current: Neighbors, extra: Neighbors, k: int) -> Neighbors:
+    best: dict[UUID, float] = {}
+    for neighbor_id, distance in current + extra:
+        best[neighbor_id] = min(distance, best.get(neighbor_id, distance))
+    return sorted(best.items(), key=lambda item: item[1])[:k]
+
+
+def refresh_neighbors(db: Session, question_ids: list[str], embeddings: list[list[float]], update_existing: bool = True):
+    """
+    Recalcula os vizinhos das questões informadas (uma consulta em lote ao ChromaDB)
+    e, com `update_existing`, propaga-as para as listas das questões antigas.
+    """
+    if not question_ids:
+        return
+    k = settings.QUESTION_NEIGHBORS_K
+    results = vector_db.query_neighbors(embeddings, n_results=k + 1)
+
+    # O ChromaDB pode ter vetores órfãos; só entram questões que existem no banco.
+    known = _existing_question_ids(db, {UUID(nid) for neighbors in results for nid, _ in neighbors})
+    lists: dict[UUID, Neighbors] = {}
+    for question_id, neighbors in zip(question_ids, results):
+        lists[UUID(question_id)] = [
+            (UUID(nid), distance) for nid, distance in neighbors
+            if nid != question_id and UUID(nid) in known
+        ][:k]
+
+    if update_existing:
+        incoming: dict[UUID, Neighbors] = defaultdict(list)
+        for question_id, neighbors in lists.items():
+            for neighbor_id, distance in neighbors:
+                if neighbor_id not in lists:
+                    incoming[neighbor_id].append((question_id, distance))
+        current = _load_lists(db, list(incoming))
+        for neighbor_id, extra in incoming.items():
+            lists[neighbor_id] = _merge(current.get(neighbor_id, []), extra, k)
+
+    _replace_lists(db, lists)
+    db.commit()
+
+
+def rebuild_all(db: Session) -> int:
+    """Recalcula as listas de todas as questões vetorizadas (migração ou reparo)."""
+    total = 0
+    for ids, embeddings in vector_db.iter_question_embeddings():
+        refresh_neighbors(db, ids, embeddings, update_existing=False)
+        total += len(ids)
+    return total
@@ -0,0 +1,50 @@
+import asyncio
+import weakref
+import redis
+import redis.asyncio
+from .config import settings
+
+_client: redis.Redis | None = None
+# Um cliente assíncrono por event loop: as conexões do pool ficam presas ao loop que as criou.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, redis.asyncio.Redis]" = weakref.WeakKeyDictionary()
+
+def get_redis() -> redis.Redis | None:
+    """
+    Retorna o cliente Redis compartilhado pelo processo.
+
+    A conexão só é aberta no primeiro comando, por isso quem usa o cliente deve
+    tratar `redis.exceptions.RedisError` e seguir sem o Redis quando ele estiver fora.
+    Os timeouts curtos evitam que uma instância indisponível trave as requisições.
+    """
+    global _client
+    if _client is None:
+        try:
+            _client = redis.Redis.from_url(
+                settings.REDIS_URL,
+                decode_responses=True,
+                socket_connect_timeout=0.5,
+                socket_timeout=0.5,
+            )
+        except ValueError as e:
+            print(f"URL do Redis inválida: {e}")
+            return None
+    return _client
+
+
+def get_async_redis() -> redis.asyncio.Redis | None:
+    """Equivalente assíncrono de `get_redis`, para o event loop corrente."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        try:
+            client = redis.asyncio.Redis.from_url(
+                settings.REDIS_URL,
+                decode_responses=True,
+                socket_connect_timeout=0.5,
+                socket_timeout=0.5,
+            )
+        except ValueError as e:
+            print(f"URL do Redis inválida: {e}")
+            return None
+        _async_clients[loop] = client
+    return client
@@ -1,10 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
 from sqlalchemy.orm import Session
 from uuid import UUID
+from typing import Dict
 import uuid # <-- CORREÇÃO: Importar o módulo uuid
 from .. import schemas, security, crud, models
-from ..database import get_db
-from ..tasks import process_exam_pdf
+from ..database import get_db, get_pool_metrics
+from ..cache import get_metrics as get_cache_metrics
+from ..tasks import process_exam_pdf, import_users, backfill_failed_analyses
+from ..analysis_backfill import get_progress as get_backfill_progress
+from ..user_import import SUPPORTED_EXTENSIONS
+from celery_worker import celery_app
 import shutil
 import os
 
@@ -37,6 +42,54 @@ def upload_exam(
         "task_id": task.id
     }
 
+@router.post("/users/import", response_model=schemas.UserImportResponse, status_code=status.HTTP_202_ACCEPTED)
+def upload_user_import(file: UploadFile = File(...)):
+    """
+    Recebe um CSV ou JSONL de utilizadores (email, password, full_name, tenant_name, role)
+    e agenda a importação em lote. Acompanhe em `/admin/tasks/{task_id}`.
+    """
+    if not (file.filename or "").lower().endswith(SUPPORTED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Formato não suportado. Envie um arquivo .csv ou .jsonl.")
+
+    upload_dir = "temp_uploads"
+    os.makedirs(upload_dir, exist_ok=True)
+    file_path = os.path.join(upload_dir, f"{uuid.uuid4()}_{os.path.basename(file.filename).lower()}")
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+
+    task = import_users.delay(file_path)
+    return {
+        "message": "Arquivo recebido e agendado para importação.",
+        "task_id": task.id
+    }
+
+@router.get("/tasks/{task_id}", response_model=schemas.TaskStatusResponse)
+def read_task_status(task_id: str):
+    """Estado de uma tarefa em segundo plano (importação de utilizadores, processamento de provas)."""
+    result = celery_app.AsyncResult(task_id)
+    response = {"task_id": task_id, "state": result.state}
+    if result.state == "PROGRESS":
+        response["progress"] = result.info
+    elif result.state == "SUCCESS":
+        response["result"] = result.result
+    elif result.state == "FAILURE":
+        response["error"] = str(result.info)
+    return response
+
+@router.get("/analyses/backfill", response_model=schemas.AnalysisBackfillProgress)
+def read_analysis_backfill_progress():
+    """Progresso do backfill das análises de erro que falharam (passagem atual ou última)."""
+    return get_backfill_progress()
+
+@router.post("/analyses/backfill", response_model=schemas.AnalysisBackfillResponse, status_code=status.HTTP_202_ACCEPTED)
+def start_analysis_backfill():
+    """Agenda uma rodada do backfill agora (ex: logo após o Gemini voltar de uma queda)."""
+    task = backfill_failed_analyses.delay()
+    return {
+        "message": "Backfill das análises agendado.",
+        "task_id": task.id
+    }
+
 @router.put("/questions/{question_id}/answer-key", response_model=schemas.AnswerKeyUpdateResponse)
 def update_answer_key(
     question_id: UUID,
@@ -44,7 +97,7 @@ def update_answer_key(
     db: Session = Depends(get_db)
 ):
     """Define ou atualiza a alternativa correta para uma questão."""
-    updated_question = crud.update_Youtube_key(db, question_id, data.correct_option)
+    updated_question = crud.update_question_answer_key(db, question_id, data.correct_option)
     if not updated_question:
         raise HTTPException(status_code=404, detail="Questão não encontrada.")
     
@@ -52,4 +105,14 @@ def update_answer_key(
         "id": updated_question.id,
         "correct_option": updated_question.correct_option,
         "message": "Gabarito atualizado com sucesso."
-    }
\ No newline at end of file
+    }
+
+@router.get("/cache/metrics", response_model=Dict[str, Dict[str, int]])
+def read_cache_metrics():
+    """Contadores de hit/miss/stale dos caches de leitura deste processo."""
+    return get_cache_metrics()
+
+@router.get("/db/pool-metrics", response_model=Dict[str, Dict[str, float]])
+def read_pool_metrics():
+    """Conexões em uso/overflow e tempos de espera dos pools (API e worker) deste processo."""
+    return get_pool_metrics()
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import timedelta
-from .. import crud, schemas, security
-from ..database import get_db
+from .. import crud, crud_async, hashing, schemas, security
+from ..database import get_async_db, get_db
 from ..config import settings
 
 router = APIRouter(prefix="/auth", tags=["Autenticação"])
@@ -16,14 +17,23 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return crud.create_user(db=db, user=user)
 
 @router.post("/login", response_model=schemas.LoginResponse)
-def login_for_access_token(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
-    user = crud.get_user_by_email(db, email=form_data.username)
-    if not user or not security.verify_password(form_data.password, user.password_hash):
+async def login_for_access_token(db: AsyncSession = Depends(get_async_db), form_data: OAuth2PasswordRequestForm = Depends()):
+    user = await crud_async.get_user_by_email(db, email=form_data.username)
+    verified, new_hash = (False, None)
+    if user:
+        # O bcrypt roda no pool de processos de `app.hashing`, fora do event loop.
+        verified, new_hash = await hashing.verify_and_update_async(form_data.password, user.password_hash)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
         )
+    if new_hash:
+        # Custo do bcrypt mudou desde o último login: regrava o hash.
+        user.password_hash = new_hash
+        await db.commit()
     access_token = security.create_access_token(data={"sub": user.email})
+    security.principal_cache.put(security.principal_from_user(user))
     
     # Retorna a nova estrutura de resposta
     return {
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 import uuid
 from .. import crud, schemas, security, models, ai_services
 from ..database import get_db
+from ..embedding_store import question_text
 
 router = APIRouter(
     prefix="/content",
@@ -12,11 +13,17 @@ router = APIRouter(
 
 @router.post("/questions/upload", response_model=schemas.Question)
 def upload_question(question: schemas.QuestionCreate, db: Session = Depends(get_db)):
-    # 1. Gerar o embedding (vetor) do conteúdo da questão usando Gemini.
-    embedding = ai_services.generate_embedding(text=question.content)
+    # 1. Gerar o embedding (vetor) do enunciado e das alternativas usando Gemini.
+    text = question_text(question.content, question.options)
+    embedding = ai_services.generate_embedding(text=text)
     if not embedding:
         raise HTTPException(status_code=500, detail="Falha ao gerar o embedding da questão com o serviço de IA.")
 
+    # Questão já cadastrada (mesmo enunciado e alternativas, ou quase idênticos)?
+    duplicate = crud.find_duplicate_questions(db, [text], [embedding])[0]
+    if duplicate is not None:
+        raise HTTPException(status_code=409, detail=f"Questão duplicada de uma já cadastrada ({duplicate}).")
+
     # 2. Inserir o vetor e metadados no Banco Vetorial (ChromaDB/Pinecone).
     #    A API do banco vetorial retornaria um ID único.
     #    Simulação:
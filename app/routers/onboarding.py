@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Depends, status
 from sqlalchemy.orm import Session
 from .. import schemas, security, crud, models
+from ..cache import dashboard_cache, progress_cache
 from ..database import get_db
 
 router = APIRouter(
     prefix="/onboarding",
     tags=["Onboarding"],
-    dependencies=[Depends(security.get_current_user)] # Protege o endpoint
+    dependencies=[Depends(security.get_current_principal)] # Protege o endpoint
 )
 
 @router.post("/complete", response_model=schemas.OnboardingResponse, status_code=status.HTTP_200_OK)
@@ -20,5 +21,7 @@ def complete_user_onboarding(
     Recebe o objetivo e as proficiências iniciais do utilizador e guarda no sistema.
     """
     crud.complete_onboarding(db=db, user=current_user, onboarding_data=onboarding_data)
+    progress_cache.invalidate([str(current_user.profile.id)])
+    dashboard_cache.invalidate([str(current_user.tenant_id)])
     
     return {"message": "Onboarding concluído com sucesso! O seu plano de estudos foi iniciado."}
\ No newline at end of file
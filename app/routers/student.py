@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
-from .. import crud, models, schemas, security
-from ..database import get_db
-from ..tasks import analyze_student_answer
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import crud_async, models, schemas, security
+from ..cache import progress_cache
+from ..database import get_async_db
+from ..config import settings
+from ..tasks import analyze_student_answer, analyze_student_answers
 from uuid import UUID
 
 router = APIRouter(
@@ -16,32 +19,43 @@ def read_student_me(current_user: models.User = Depends(security.get_current_use
     return current_user
 
 @router.get("/progress", response_model=schemas.StudentProgress)
-def read_student_progress(db: Session = Depends(get_db), current_user: models.User = Depends(security.get_current_user)):
-    profile = current_user.profile
-    proficiency_maps = crud.get_student_proficiency_maps(db, profile_id=profile.id)
-    return {"profile": profile, "proficiency_maps": proficiency_maps}
+async def read_student_progress(db: AsyncSession = Depends(get_async_db), principal: security.Principal = Depends(security.get_current_principal)):
+    profile_id = principal.profile_id
+    return await progress_cache.aget_or_compute(
+        scope=str(profile_id),
+        db=db,
+        loader=lambda session: crud_async.get_student_progress(session, profile_id=profile_id)
+    )
 
 @router.get("/assessment/next-question", response_model=schemas.Question)
-def get_next_question(db: Session = Depends(get_db), current_user: models.User = Depends(security.get_current_user)):
-    next_question = crud.get_next_question_for_student(db, profile_id=current_user.profile.id)
+async def get_next_question(
+    mode: schemas.NextQuestionMode = schemas.NextQuestionMode.adaptive,
+    db: AsyncSession = Depends(get_async_db),
+    principal: security.Principal = Depends(security.get_current_principal)
+):
+    """`mode=remediation` recomenda questões parecidas com as que o aluno errou por último."""
+    next_question = await crud_async.get_next_question_for_student(db, profile_id=principal.profile_id, mode=mode)
     if not next_question:
         raise HTTPException(status_code=404, detail="Parabéns! Nenhuma questão nova encontrada para você no momento.")
     return next_question
 
 @router.post("/assessment/answer", response_model=schemas.AnswerSubmissionResponse)
-def submit_answer(
+async def submit_answer(
     answer_data: schemas.StudentAnswerCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(security.get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    principal: security.Principal = Depends(security.get_current_principal)
 ):
-    question = crud.get_question(db, question_id=answer_data.question_id)
-    # ... (validação)
-    
+    question = await crud_async.get_question(db, question_id=answer_data.question_id)
+    if not question:
+        raise HTTPException(status_code=404, detail="Questão não encontrada.")
+    if question.correct_option is None:
+        raise HTTPException(status_code=409, detail="Questão ainda sem gabarito definido.")
+
     is_correct = (question.correct_option == answer_data.selected_option)
-    db_answer = crud.create_student_answer(db, profile_id=current_user.profile.id, answer=answer_data, is_correct=is_correct)
+    db_answer = await crud_async.create_student_answer(db, profile_id=principal.profile_id, answer=answer_data, is_correct=is_correct)
 
-    # Dispara a tarefa Celery em vez de BackgroundTasks
-    analyze_student_answer.delay(str(db_answer.id))
+    # Dispara a tarefa Celery; a publicação no broker é síncrona, então roda fora do event loop
+    await run_in_threadpool(analyze_student_answer.delay, str(db_answer.id))
 
     return {
         "answer_id": db_answer.id,
@@ -49,19 +63,58 @@ def submit_answer(
         "correct_option": question.correct_option
     }
 
+@router.post("/assessment/answers", response_model=schemas.AnswerBatchSubmissionResponse)
+async def submit_answers(
+    batch: schemas.StudentAnswerBatchCreate,
+    db: AsyncSession = Depends(get_async_db),
+    principal: security.Principal = Depends(security.get_current_principal)
+):
+    """
+    Recebe o simulado inteiro: corrige tudo em memória com o gabarito em cache,
+    grava as respostas num único INSERT e agenda uma só tarefa de análise, apenas
+    com as respostas erradas.
+    """
+    if len(batch.answers) > settings.ANSWER_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"Envie no máximo {settings.ANSWER_BATCH_MAX_SIZE} respostas por vez.")
+
+    keys_by_question = await crud_async.get_answer_keys(db, [answer.question_id for answer in batch.answers])
+    unknown = [str(a.question_id) for a in batch.answers if a.question_id not in keys_by_question]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Questões não encontradas: {', '.join(unknown)}")
+    keyless = [str(a.question_id) for a in batch.answers if keys_by_question[a.question_id] is None]
+    if keyless:
+        raise HTTPException(status_code=409, detail=f"Questões ainda sem gabarito definido: {', '.join(keyless)}")
+
+    answer_keys = [keys_by_question[answer.question_id] for answer in batch.answers]
+
+    results = [answer.selected_option == key for answer, key in zip(batch.answers, answer_keys)]
+    answer_ids = await crud_async.bulk_create_student_answers(db, principal.profile_id, batch.answers, results)
+
+    wrong_ids = [str(answer_id) for answer_id, is_correct in zip(answer_ids, results) if not is_correct]
+    if wrong_ids:
+        await run_in_threadpool(analyze_student_answers.delay, wrong_ids)
+
+    return {
+        "results": [
+            {"answer_id": answer_id, "is_correct": is_correct, "correct_option": key}
+            for answer_id, is_correct, key in zip(answer_ids, results, answer_keys)
+        ],
+        "correct_count": sum(results)
+    }
+
 @router.get("/answers/{answer_id}/analysis", response_model=schemas.AnswerAnalysisResponse)
-def get_answer_analysis(
+async def get_answer_analysis(
     answer_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(security.get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    principal: security.Principal = Depends(security.get_current_principal)
 ):
     """Busca a análise de IA para uma resposta, garantindo que o aluno só pode ver as suas próprias."""
-    answer = db.query(models.StudentAnswer).filter_by(id=answer_id).first()
+    answer = await crud_async.get_student_answer(db, answer_id)
     
     if not answer:
         raise HTTPException(status_code=404, detail="Resposta não encontrada.")
     
-    if answer.profile_id != current_user.profile.id:
+    if answer.profile_id != principal.profile_id:
         raise HTTPException(status_code=403, detail="Acesso não autorizado a esta análise.")
     
     return {"id": answer.id, "ai_analysis": answer.ai_analysis}
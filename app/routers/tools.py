@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from .. import schemas, security, ai_services
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from .. import schemas, security, ai_client, essay_jobs
+from ..tasks import grade_essay as grade_essay_task
+from celery_worker import celery_app
 
 router = APIRouter(
     prefix="/tools",
     tags=["Ferramentas de IA"],
-    dependencies=[Depends(security.get_current_user)] # Protege todas as rotas neste router
+    dependencies=[Depends(security.get_current_principal)] # Protege todas as rotas neste router
 )
 
 @router.post("/grade-essay", response_model=schemas.EssayGradeResponse)
-def grade_essay(request: schemas.EssayGradeRequest):
+async def grade_essay(request: schemas.EssayGradeRequest, principal: security.Principal = Depends(security.get_current_principal)):
     """
     Recebe o texto de uma redação e um tema, e retorna uma correção detalhada
     baseada nos critérios do ENEM, gerada pela IA do Gemini.
@@ -19,9 +22,10 @@ def grade_essay(request: schemas.EssayGradeRequest):
             detail="O tema e o texto da redação são obrigatórios."
         )
 
-    correction = ai_services.grade_essay_with_gemini(
+    correction = await ai_client.grade_essay(
         essay_text=request.essayText,
-        theme=request.theme
+        theme=request.theme,
+        tenant_id=str(principal.tenant_id)
     )
 
     if not correction:
@@ -32,15 +36,58 @@ def grade_essay(request: schemas.EssayGradeRequest):
 
     return correction
 
+@router.post("/grade-essay/jobs", response_model=schemas.EssayGradeJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def submit_essay_grading(request: schemas.EssayGradeRequest, response: Response):
+    """
+    Modo assíncrono da correção: enfileira a tarefa e devolve o `job_id` para
+    consulta em `/tools/grade-essay/jobs/{job_id}`. Uma redação já corrigida
+    (mesmo texto e tema) volta na hora, com status 200.
+    """
+    if not request.essayText or not request.theme:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="O tema e o texto da redação são obrigatórios."
+        )
+
+    job_id = essay_jobs.job_id(request.essayText, request.theme)
+    cached = essay_jobs.get_result(job_id)
+    if cached is not None:
+        response.status_code = status.HTTP_200_OK
+        return {"job_id": job_id, "status": "SUCCESS", "result": cached}
+
+    if essay_jobs.claim(job_id):
+        # Descarta o resultado de uma tentativa anterior que falhou com o mesmo ID.
+        celery_app.AsyncResult(job_id).forget()
+        grade_essay_task.apply_async(args=[request.essayText, request.theme], task_id=job_id)
+    return {"job_id": job_id, "status": "PENDING"}
+
+@router.get("/grade-essay/jobs/{job_id}", response_model=schemas.EssayGradeJobResponse)
+def read_essay_grading(job_id: str):
+    """Estado da correção assíncrona; quando concluída, traz a correção validada."""
+    cached = essay_jobs.get_result(job_id)
+    if cached is not None:
+        return {"job_id": job_id, "status": "SUCCESS", "result": cached}
+
+    result = celery_app.AsyncResult(job_id)
+    if result.state == "SUCCESS":
+        return {"job_id": job_id, "status": "SUCCESS", "result": result.result}
+    if result.state == "FAILURE":
+        return {"job_id": job_id, "status": "FAILURE", "error": "Não foi possível corrigir a redação. Envie-a novamente."}
+    # O Celery reporta PENDING também para IDs desconhecidos.
+    if result.state == "PENDING" and not essay_jobs.is_pending(job_id):
+        raise HTTPException(status_code=404, detail="Correção não encontrada.")
+    return {"job_id": job_id, "status": result.state}
+
 @router.post("/ask-tutor", response_model=schemas.TutorResponse)
-def ask_tutor(request: schemas.TutorRequest):
+async def ask_tutor(request: schemas.TutorRequest, principal: security.Principal = Depends(security.get_current_principal)):
     """
     Recebe uma dúvida de um aluno e um contexto opcional, e retorna uma
     explicação gerada pelo tutor de IA.
     """
-    answer = ai_services.ask_tutor_with_gemini(
+    answer = await ai_client.ask_tutor(
         question=request.question,
-        context=request.context
+        context=request.context,
+        tenant_id=str(principal.tenant_id)
     )
     if not answer:
         raise HTTPException(
@@ -50,12 +97,13 @@ def ask_tutor(request: schemas.TutorRequest):
     return {"answer": answer}
 
 @router.post("/summarize-content", response_model=schemas.SummarizeResponse)
-def summarize_content(request: schemas.SummarizeRequest):
+async def summarize_content(request: schemas.SummarizeRequest, principal: security.Principal = Depends(security.get_current_principal)):
     """
     Recebe um texto e retorna um resumo em bullet points gerado pela IA.
     """
-    summary = ai_services.summarize_content_with_gemini(
-        text_to_summarize=request.textToSummarize
+    summary = await ai_client.summarize_content(
+        text_to_summarize=request.textToSummarize,
+        tenant_id=str(principal.tenant_id)
     )
     if not summary:
         raise HTTPException(
@@ -63,3 +111,58 @@ def summarize_content(request: schemas.SummarizeRequest):
             detail="Não foi possível gerar o resumo."
         )
     return {"summary": summary}
+
+async def _sse_events(chunks, http_request: Request):
+    """
+    Converte os pedaços de texto do modelo em eventos SSE. Se o cliente
+    desconectar, interrompe a iteração e fecha o gerador, o que cancela a geração.
+    """
+    try:
+        async for chunk in chunks:
+            if await http_request.is_disconnected():
+                break
+            yield "".join(f"data: {line}\n" for line in chunk.split("\n")) + "\n"
+        else:
+            yield "event: done\ndata: \n\n"
+    except Exception as e:
+        print(f"Erro durante o streaming da resposta: {e}")
+        yield "event: error\ndata: Não foi possível concluir a resposta.\n\n"
+    finally:
+        await chunks.aclose()
+
+def _sse_response(chunks, http_request: Request) -> StreamingResponse:
+    return StreamingResponse(
+        _sse_events(chunks, http_request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/ask-tutor/stream")
+async def ask_tutor_stream(
+    request: schemas.TutorRequest,
+    http_request: Request,
+    principal: security.Principal = Depends(security.get_current_principal)
+):
+    """
+    Versão em streaming (Server-Sent Events) do assistente tutor: os trechos
+    da resposta são enviados à medida que o Gemini os gera.
+    """
+    chunks = ai_client.stream_tutor_answer(
+        question=request.question,
+        context=request.context,
+        tenant_id=str(principal.tenant_id)
+    )
+    return _sse_response(chunks, http_request)
+
+@router.post("/summarize-content/stream")
+async def summarize_content_stream(
+    request: schemas.SummarizeRequest,
+    http_request: Request,
+    principal: security.Principal = Depends(security.get_current_principal)
+):
+    """Versão em streaming (Server-Sent Events) do resumidor."""
+    chunks = ai_client.stream_summary(
+        text_to_summarize=request.textToSummarize,
+        tenant_id=str(principal.tenant_id)
+    )
+    return _sse_response(chunks, http_request)
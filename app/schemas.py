@@ -47,7 +47,8 @@ class TokenData(BaseModel):
 class QuestionBase(BaseModel):
     content: str
     options: Dict[str, str]
-    correct_option: str
+    # None: gabarito ainda não definido (ex: questões ingeridas de PDFs)
+    correct_option: Optional[str] = None
     subject: str
     topic: str
     source: Optional[str] = None
@@ -59,6 +60,11 @@ class Question(QuestionBase):
     class Config:
         from_attributes = True
 
+class NextQuestionMode(str, enum.Enum):
+    """Estratégia de escolha da próxima questão do aluno."""
+    adaptive = "adaptive"          # tópico de menor proficiência
+    remediation = "remediation"    # vizinhas das questões erradas recentemente
+
 class StudentAnswerCreate(BaseModel):
     question_id: UUID4
     selected_option: str
@@ -121,6 +127,12 @@ class EssayGradeResponse(BaseModel):
     nota_total: int
     criterios: List[EssayCriterionFeedback]
 
+class EssayGradeJobResponse(BaseModel):
+    job_id: str
+    status: str
+    result: Optional[EssayGradeResponse] = None
+    error: Optional[str] = None
+
 # --- NOVOS SCHEMAS PARA ASSISTENTE TUTOR E RESUMIDOR ---
 
 class TutorRequest(BaseModel):
@@ -176,6 +188,30 @@ class ExamUploadResponse(BaseModel):
     message: str
     task_id: str
 
+class UserImportResponse(BaseModel):
+    message: str
+    task_id: str
+
+class TaskStatusResponse(BaseModel):
+    task_id: str
+    state: str
+    progress: Optional[Dict[str, Any]] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+
+class AnalysisBackfillProgress(BaseModel):
+    status: Optional[str] = None
+    started_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    scanned: int = 0
+    analyzed: int = 0
+    failed: int = 0
+    pages: int = 0
+
+class AnalysisBackfillResponse(BaseModel):
+    message: str
+    task_id: str
+
 class AnswerKeyUpdateResponse(BaseModel):
     id: UUID4
     correct_option: str
@@ -186,6 +222,14 @@ class AnswerSubmissionResponse(BaseModel):
     is_correct: bool
     correct_option: str
 
+class StudentAnswerBatchCreate(BaseModel):
+    """Todas as respostas de um simulado, enviadas de uma vez."""
+    answers: List[StudentAnswerCreate] = Field(..., min_length=1)
+
+class AnswerBatchSubmissionResponse(BaseModel):
+    results: List[AnswerSubmissionResponse]
+    correct_count: int
+
 class AnswerAnalysisResponse(BaseModel):
     id: UUID4
     ai_analysis: Optional[Dict[str, Any]] = None
@@ -1,22 +1,28 @@
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Optional
+from uuid import UUID
+import threading
+import time
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from . import crud, models, schemas
+from . import crud, crud_async, hashing, models, schemas
 from .config import settings
-from .database import get_db
+from .database import get_async_db, get_db
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# Versões inline (bloqueiam a thread atual); nos endpoints use `app.hashing`.
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return hashing.context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return hashing.context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -28,31 +34,134 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
-    credentials_exception = HTTPException(
+@dataclass(frozen=True)
+class Principal:
+    """Identidade compacta e imutável do utilizador autenticado."""
+    user_id: UUID
+    email: str
+    role: models.UserRole
+    tenant_id: UUID
+    profile_id: UUID | None
+
+def principal_from_user(user: models.User) -> Principal:
+    return Principal(
+        user_id=user.id,
+        email=user.email,
+        role=models.UserRole(user.role),
+        tenant_id=user.tenant_id,
+        profile_id=user.profile.id if user.profile else None,
+    )
+
+class PrincipalCache:
+    """
+    Cache LRU com TTL do subject do token (e-mail) para o `Principal`, por processo.
+    É preenchido no login e invalidado quando um utilizador muda; o TTL limita
+    o tempo em que outros processos podem ver um papel/tenant desatualizado.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, Principal]] = OrderedDict()
+
+    def get(self, subject: str) -> Principal | None:
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if expires_at <= time.monotonic():
+                del self._entries[subject]
+                return None
+            self._entries.move_to_end(subject)
+            return principal
+
+    def put(self, principal: Principal):
+        with self._lock:
+            self._entries[principal.email] = (time.monotonic() + self.ttl_seconds, principal)
+            self._entries.move_to_end(principal.email)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, subject: str | None):
+        if subject is None:
+            return
+        with self._lock:
+            self._entries.pop(subject, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+principal_cache = PrincipalCache(
+    max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+# Qualquer alteração de papel, tenant ou e-mail invalida o principal em cache.
+@event.listens_for(models.User.role, "set")
+@event.listens_for(models.User.tenant_id, "set")
+def _invalidate_principal_on_change(target, value, oldvalue, initiator):
+    principal_cache.invalidate(target.email)
+
+@event.listens_for(models.User.email, "set")
+def _invalidate_principal_on_email_change(target, value, oldvalue, initiator):
+    if isinstance(oldvalue, str):
+        principal_cache.invalidate(oldvalue)
+    principal_cache.invalidate(value)
+
+@event.listens_for(models.User, "after_delete")
+def _invalidate_principal_on_delete(mapper, connection, target):
+    principal_cache.invalidate(target.email)
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Não foi possível validar as credenciais",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode_subject(token: str) -> str:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
-            raise credentials_exception
+            raise _credentials_exception()
     except JWTError:
-        raise credentials_exception
-    
+        raise _credentials_exception()
+    return email
+
+async def get_current_principal(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> Principal:
+    """
+    Resolve o utilizador do token sem ir ao banco quando o principal está em cache.
+    Use esta dependência sempre que bastarem id, papel, tenant e perfil.
+    É assíncrona: num hit não ocupa thread do threadpool nem conexão do banco.
+    """
+    email = _decode_subject(token)
+    principal = principal_cache.get(email)
+    if principal is None:
+        user = await crud_async.get_user_by_email(db, email=email)
+        if user is None:
+            raise _credentials_exception()
+        principal = principal_from_user(user)
+        principal_cache.put(principal)
+    return principal
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
+    """Carrega o utilizador completo (ORM); só para endpoints que precisam dele."""
+    email = _decode_subject(token)
     user = crud.get_user_by_email(db, email=email)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     return user
 
 def get_current_active_user_with_role(role: models.UserRole):
-    def get_user_with_role(current_user: models.User = Depends(get_current_user)) -> models.User:
-        if current_user.role != role:
+    async def get_user_with_role(principal: Principal = Depends(get_current_principal)) -> Principal:
+        if principal.role != role:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Acesso negado. Requer o papel de '{role.value}'.",
             )
-        return current_user
-    return get_user_with_role
\ No newline at end of file
+        return principal
+    return get_user_with_role
@@ -0,0 +1,56 @@
+"""
+Execução de trabalho de CPU em processos separados, inclusive dentro do worker
+do Celery.
+
+Os processos filhos do worker (prefork) são daemônicos, e o `multiprocessing`
+não deixa processos daemônicos criarem filhos. O `billiard` (o mesmo do Celery)
+deixa; aqui cada chamada roda num processo próprio e devolve o resultado por um
+pipe. Usado na extração de PDFs (`exam_pipeline`) e no hash de senhas da
+importação em lote (`hashing.hash_passwords`).
+"""
+import time
+from typing import Callable, TypeVar
+
+import billiard
+
+T = TypeVar("T")
+
+
+def _run_into(conn, fn: Callable[..., T], args: tuple):
+    try:
+        conn.send(fn(*args))
+    finally:
+        conn.close()
+
+
+def map_in_processes(fn: Callable[..., T], calls: list[tuple], timeout: float | None = None) -> list[T]:
+    """
+    Executa `fn(*args)` para cada `args` de `calls`, um processo por chamada, e
+    devolve os resultados na mesma ordem. `fn` precisa ser uma função de módulo.
+    Levanta TimeoutError se os resultados não chegarem em `timeout` segundos.
+    """
+    jobs = []
+    try:
+        for args in calls:
+            receiver, sender = billiard.Pipe(duplex=False)
+            process = billiard.Process(target=_run_into, args=(sender, fn, args), daemon=True)
+            process.start()
+            sender.close()
+            jobs.append((process, receiver))
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        results = []
+        for process, receiver in jobs:
+            if deadline is not None and not receiver.poll(max(0.0, deadline - time.monotonic())):
+                raise TimeoutError(f"{fn.__name__} excedeu {timeout}s.")
+            try:
+                results.append(receiver.recv())
+            except EOFError:
+                raise RuntimeError(f"{fn.__name__} terminou sem resultado (código {process.exitcode}).")
+        return results
+    finally:
+        for process, receiver in jobs:
+            receiver.close()
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
@@ -1,64 +1,192 @@
 from celery_worker import celery_app
-from app.database import SessionLocal
-from app import crud, ai_services, schemas, vector_db
-import fitz
+from app.database import WorkerSessionLocal
+from app.embedding_store import content_hash, question_text
+from app import crud, ai_services, schemas, vector_db, proficiency, exam_pipeline, tenant_stats, user_import, question_neighbors, analysis_backfill, essay_jobs
 import uuid
 import os
 
 
-@celery_app.task
+# Tarefas de análise e manutenção são idempotentes: acks_late as reentrega se o
+# worker morrer no meio. O resultado delas nunca é lido, então não é guardado.
+@celery_app.task(acks_late=True, ignore_result=True)
 def analyze_student_answer(answer_id: str):
     """
     Tarefa Celery para analisar a resposta de um aluno.
-    Busca a resposta no DB, chama a IA (se errada) e atualiza a proficiência.
+    Busca a resposta no DB e chama a IA (se errada). A proficiência é atualizada
+    em lote pela tarefa periódica `apply_pending_proficiency_updates`.
     """
-    db = SessionLocal()
+    db = WorkerSessionLocal()
     try:
-        answer = db.query(crud.models.StudentAnswer).filter_by(id=uuid.UUID(answer_id)).first()
+        answer = crud.get_student_answer(db, uuid.UUID(answer_id), with_question=True)
         if answer:
-            crud.run_ai_analysis_and_update_proficiency(db, answer)
+            crud.run_ai_analysis(db, answer)
     finally:
         db.close()
 
-@celery_app.task
-def process_exam_pdf(file_path: str, contest: str, year: int):
+@celery_app.task(acks_late=True, ignore_result=True)
+def analyze_student_answers(answer_ids: list[str]):
     """
-    Tarefa Celery para processar um PDF de prova com lógica real.
+    Tarefa agrupada de uma submissão de simulado: recebe só as respostas erradas
+    e as analisa juntas. As certas não geram tarefa; a proficiência de todas é
+    atualizada pela drenagem periódica `apply_pending_proficiency_updates`.
+    """
+    db = WorkerSessionLocal()
+    try:
+        answers = crud.get_student_answers_with_questions(db, [uuid.UUID(answer_id) for answer_id in answer_ids])
+        crud.run_ai_analyses(db, answers)
+    finally:
+        db.close()
+
+@celery_app.task(acks_late=True)
+def grade_essay(essay_text: str, theme: str):
+    """
+    Corrige uma redação fora do ciclo HTTP. O task_id é o `job_id` (hash de tema
+    e texto); o resultado validado fica no cache de `essay_jobs`.
     """
-    db = SessionLocal()
     try:
-        full_text = ""
-        with fitz.open(file_path) as doc:
-            for page in doc:
-                full_text += page.get_text()
-        
-        if not full_text: return
+        return essay_jobs.grade(essay_text, theme)
+    finally:
+        essay_jobs.release(essay_jobs.job_id(essay_text, theme))
 
-        structured_questions = ai_services.structure_exam_from_text(full_text)
-        if not structured_questions or "questions" not in structured_questions: return
+@celery_app.task(ignore_result=True)
+def apply_pending_proficiency_updates():
+    """
+    Tarefa periódica (Celery beat) que drena as respostas pendentes e
+    atualiza o mapa de proficiência em lotes.
+    """
+    db = WorkerSessionLocal()
+    try:
+        return proficiency.apply_pending_proficiency_updates(db)
+    finally:
+        db.close()
 
-        for q_data in structured_questions["questions"]:
+@celery_app.task(acks_late=True)
+def backfill_failed_analyses():
+    """
+    Tarefa periódica (Celery beat) que refaz as análises que falharam, a partir
+    do cursor salvo no Redis. O progresso fica em `/admin/analyses/backfill`.
+    """
+    db = WorkerSessionLocal()
+    try:
+        return analysis_backfill.backfill_failed_analyses(db)
+    finally:
+        db.close()
+
+@celery_app.task(acks_late=True)
+def rebuild_tenant_stats(tenant_id: str):
+    """
+    Recalcula os agregados do painel de um tenant a partir das tabelas de origem
+    (migração de bases existentes ou reparo de divergências).
+    """
+    db = WorkerSessionLocal()
+    try:
+        tenant_stats.rebuild_tenant_stats(db, uuid.UUID(tenant_id))
+    finally:
+        db.close()
+
+@celery_app.task(acks_late=True)
+def rebuild_question_neighbors():
+    """Recalcula os vizinhos de todas as questões vetorizadas (bases existentes)."""
+    db = WorkerSessionLocal()
+    try:
+        return question_neighbors.rebuild_all(db)
+    finally:
+        db.close()
+
+@celery_app.task(acks_late=True)
+def backfill_question_hashes():
+    """Preenche o content_hash das questões antigas, usado na deduplicação (bases existentes)."""
+    db = WorkerSessionLocal()
+    try:
+        return crud.backfill_question_hashes(db)
+    finally:
+        db.close()
+
+# Ingestões longas: reentregues se o worker cair. A repetição é segura: questões
+# já gravadas são reconhecidas como duplicadas (e as que ficaram sem vetor são
+# vetorizadas de novo) e e-mails já existentes são ignorados.
+@celery_app.task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def process_exam_pdf(self, file_path: str, contest: str, year: int):
+    """
+    Tarefa Celery para processar um PDF de prova com lógica real.
+    O progresso fica disponível no estado da tarefa (PROGRESS, com etapa e contagem).
+    """
+    def report_progress(stage: str, done: int, total: int):
+        self.update_state(state="PROGRESS", meta={"stage": stage, "done": done, "total": total})
+
+    db = WorkerSessionLocal()
+    try:
+        questions = exam_pipeline.structure_exam_pdf(file_path, on_progress=report_progress)
+        if not questions: return
+
+        question_schemas = []
+        for q_data in questions:
             q_data['source'] = f"{contest} {year}"
-            question_schema = schemas.QuestionCreate(**q_data)
-            
-            # 1. Guarda no PostgreSQL primeiro para obter um ID estável
-            db_question = crud.create_question(db, question=question_schema)
-            if not db_question: continue
-            
-            question_id_str = str(db_question.id)
-
-            # 2. Gera o embedding
-            embedding = ai_services.generate_embedding(text=question_schema.content)
-            if not embedding: continue
-
-            # 3. Insere no ChromaDB usando o ID do PostgreSQL
-            metadata = {"subject": db_question.subject, "topic": db_question.topic, "source": db_question.source}
-            vector_db.upsert_question(question_id=question_id_str, embedding=embedding, metadata=metadata)
-            
-            # 4. Atualiza a questão no PostgreSQL com o seu próprio ID como vector_id
-            crud.update_question_vector_id(db, question_id=db_question.id, vector_id=question_id_str)
-            print(f"Questão '{q_data['content'][:30]}...' processada e vetorizada.")
+            # O gabarito não vem no caderno: a questão fica pendente (correct_option
+            # NULL, fora dos seletores) até o administrador defini-lo.
+            question_schemas.append(schemas.QuestionCreate(**q_data))
+
+        # 1. Gera os embeddings (enunciado + alternativas) de todas as questões em
+        #    poucas chamadas em lote (o store local evita recalcular textos já vistos)
+        texts = [question_text(q.content, q.options) for q in question_schemas]
+        embeddings = ai_services.generate_embeddings(texts)
+
+        # 2. Descarta questões que já estão no banco (ou repetidas no próprio PDF).
+        #    As idênticas que ainda não têm vetor (execução anterior interrompida
+        #    depois do commit) voltam para a vetorização.
+        duplicates = crud.find_duplicate_questions(db, texts, embeddings)
+        kept = [(q, e) for q, e, dup in zip(question_schemas, embeddings, duplicates) if dup is None]
+        if len(kept) < len(question_schemas):
+            print(f"{len(question_schemas) - len(kept)} questões duplicadas ignoradas.")
+        unvectorized = crud.get_unvectorized_question_hashes(db, [dup for dup in duplicates if isinstance(dup, uuid.UUID)])
+        resumed = [
+            (str(dup), q, e) for q, text, e, dup in zip(question_schemas, texts, embeddings, duplicates)
+            if e and isinstance(dup, uuid.UUID) and unvectorized.get(dup) == content_hash(text)
+        ]
+
+        # 3. Guarda as questões novas no PostgreSQL numa única transação
+        question_ids = crud.bulk_create_questions(db, questions=[q for q, _ in kept])
+        vectorized = resumed + [(str(qid), q, e) for qid, (q, e) in zip(question_ids, kept) if e]
+        if not vectorized: return
+
+        # 4. Insere no ChromaDB usando os IDs do PostgreSQL, num único upsert em lote;
+        #    o vector_id só é gravado se o upsert deu certo
+        if not vector_db.upsert_questions(
+            question_ids=[qid for qid, _, _ in vectorized],
+            embeddings=[e for _, _, e in vectorized],
+            metadatas=[{"subject": q.subject, "topic": q.topic, "source": q.source} for _, q, _ in vectorized]
+        ):
+            return
+        crud.mark_questions_vectorized(db, [qid for qid, _, _ in vectorized])
+        report_progress("vectorized", len(vectorized), len(question_ids) + len(resumed))
+
+        # 5. Atualiza a lista de vizinhos das novas questões (e das antigas afetadas)
+        try:
+            question_neighbors.refresh_neighbors(
+                db, [qid for qid, _, _ in vectorized], [e for _, _, e in vectorized]
+            )
+        except Exception as e:
+            db.rollback()
+            print(f"Erro ao atualizar os vizinhos das questões: {e}")
+        print(f"{len(vectorized)} questões processadas e vetorizadas.")
 
     finally:
         if os.path.exists(file_path): os.remove(file_path)
         db.close()
+
+@celery_app.task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def import_users(self, file_path: str):
+    """
+    Importa utilizadores de um CSV/JSONL em blocos. O progresso fica no estado
+    da tarefa (PROGRESS) e o resultado traz os erros de cada linha rejeitada.
+    """
+    def report_progress(stage: str, done: int, total: int):
+        self.update_state(state="PROGRESS", meta={"stage": stage, "done": done, "total": total})
+
+    db = WorkerSessionLocal()
+    try:
+        return user_import.import_users(db, file_path, on_progress=report_progress)
+    finally:
+        if os.path.exists(file_path): os.remove(file_path)
+        db.close()
+
@@ -0,0 +1,213 @@
+"""
+Agregados do painel do professor, mantidos de forma incremental por tenant.
+
+Em vez de varrer todos os perfis, respostas e mapas de proficiência do tenant a
+cada leitura do painel, os contadores são atualizados quando respostas e scores
+são gravados:
+
+- `tenant_stats`: total de alunos, total de respostas e de acertos;
+- `tenant_topic_stats`: soma e quantidade de scores de proficiência por tópico;
+- `tenant_activity_buckets`: quantos alunos tiveram o *último* dia de atividade
+  em cada dia. Quando um aluno volta a responder, ele sai do balde do dia antigo
+  e entra no de hoje, então os alunos ativos numa janela são exatamente a soma
+  dos baldes dos últimos N dias.
+
+O motor de proficiência em lote aplica as respostas de cada lote com um único
+incremento por tenant, o que evita disputa de lock numa linha "quente" por tenant.
+A leitura do painel passa a custar O(tópicos).
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import func, Float, Integer, update, insert, select, and_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+
+
+def _increment(db: Session, model, key_columns: list[str], rows: list[dict]):
+    """
+    Soma os valores de `rows` às linhas de `model` identificadas por `key_columns`,
+    criando as que não existem (INSERT ... ON CONFLICT DO UPDATE SET c = c + excluded.c).
+    """
+    if not rows:
+        return
+    value_columns = [c for c in rows[0] if c not in key_columns]
+    table = model.__table__
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert_fn = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert_fn(model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={c: table.c[c] + stmt.excluded[c] for c in value_columns},
+        )
+        db.execute(stmt, rows)
+        return
+
+    for row in rows:
+        result = db.execute(
+            update(model)
+            .where(and_(*(table.c[k] == row[k] for k in key_columns)))
+            .values({c: table.c[c] + row[c] for c in value_columns})
+        )
+        if result.rowcount == 0:
+            db.execute(insert(model), [row])
+
+
+def record_new_students(db: Session, tenant_id: UUID, count: int = 1):
+    _increment(db, models.TenantStats, ["tenant_id"], [
+        {"tenant_id": tenant_id, "total_students": count, "answer_count": 0, "correct_count": 0}
+    ])
+
+
+def record_topic_scores(db: Session, changes: list[tuple[UUID, str, float | None, float]]):
+    """
+    Aplica mudanças de score `(tenant_id, topic, score_anterior, score_novo)`.
+    `score_anterior = None` indica um novo par (aluno, tópico).
+    """
+    deltas: dict[tuple, list] = defaultdict(lambda: [0.0, 0])
+    for tenant_id, topic, old_score, new_score in changes:
+        delta = deltas[(tenant_id, topic)]
+        delta[0] += new_score - (old_score or 0.0)
+        delta[1] += 1 if old_score is None else 0
+    _increment(db, models.TenantTopicStats, ["tenant_id", "topic"], [
+        {"tenant_id": tenant_id, "topic": topic, "score_sum": score_sum, "score_count": score_count}
+        for (tenant_id, topic), (score_sum, score_count) in deltas.items()
+    ])
+
+
+def record_answers(db: Session, answers: list[tuple[UUID, UUID, bool, datetime | None]]):
+    """
+    Aplica um lote de respostas `(profile_id, tenant_id, is_correct, answered_at)`
+    aos contadores de respostas/acertos e aos baldes de atividade.
+    """
+    if not answers:
+        return
+
+    counters: dict[UUID, list[int]] = defaultdict(lambda: [0, 0])
+    latest_day: dict[UUID, date] = {}
+    tenant_of: dict[UUID, UUID] = {}
+    today = datetime.now(timezone.utc).date()
+    for profile_id, tenant_id, is_correct, answered_at in answers:
+        counters[tenant_id][0] += 1
+        counters[tenant_id][1] += 1 if is_correct else 0
+        day = answered_at.date() if answered_at else today
+        latest_day[profile_id] = max(day, latest_day.get(profile_id, day))
+        tenant_of[profile_id] = tenant_id
+
+    _increment(db, models.TenantStats, ["tenant_id"], [
+        {"tenant_id": tenant_id, "total_students": 0, "answer_count": answer_count, "correct_count": correct_count}
+        for tenant_id, (answer_count, correct_count) in counters.items()
+    ])
+
+    previous_days = dict(db.query(models.Profile.id, models.Profile.last_active_on).filter(
+        models.Profile.id.in_(list(latest_day))
+    ).all())
+    bucket_deltas: dict[tuple, int] = defaultdict(int)
+    moved = []
+    for profile_id, day in latest_day.items():
+        previous = previous_days.get(profile_id)
+        if previous is not None and previous >= day:
+            continue
+        if previous is not None:
+            bucket_deltas[(tenant_of[profile_id], previous)] -= 1
+        bucket_deltas[(tenant_of[profile_id], day)] += 1
+        moved.append({"id": profile_id, "last_active_on": day})
+
+    if moved:
+        db.execute(update(models.Profile), moved)
+    _increment(db, models.TenantActivityBucket, ["tenant_id", "day"], [
+        {"tenant_id": tenant_id, "day": day, "active_students": delta}
+        for (tenant_id, day), delta in bucket_deltas.items() if delta
+    ])
+
+
+def get_dashboard(db: Session, tenant_id: UUID) -> dict:
+    """Monta os dados do painel a partir dos agregados materializados."""
+    stats = db.query(models.TenantStats).filter(models.TenantStats.tenant_id == tenant_id).first()
+    if not stats or not stats.total_students:
+        return {"class_average_score": 0, "most_difficult_topics": [], "engagement": {"active_students": 0, "total_students": 0}}
+
+    average = (models.TenantTopicStats.score_sum / func.cast(models.TenantTopicStats.score_count, Float)).label("average_score")
+    most_difficult_topics = db.query(models.TenantTopicStats.topic, average).filter(
+        models.TenantTopicStats.tenant_id == tenant_id,
+        models.TenantTopicStats.score_count > 0
+    ).order_by(average).limit(3).all()
+
+    window_start = datetime.now(timezone.utc).date() - timedelta(days=settings.DASHBOARD_ACTIVE_WINDOW_DAYS - 1)
+    active_students = db.query(func.coalesce(func.sum(models.TenantActivityBucket.active_students), 0)).filter(
+        models.TenantActivityBucket.tenant_id == tenant_id,
+        models.TenantActivityBucket.day >= window_start
+    ).scalar()
+
+    class_average = stats.correct_count / stats.answer_count if stats.answer_count else 0
+    return {
+        "class_average_score": round(class_average, 2),
+        "most_difficult_topics": [{"topic": topic, "average": round(avg, 2)} for topic, avg in most_difficult_topics],
+        "engagement": {
+            "active_students": int(active_students),
+            "total_students": stats.total_students
+        }
+    }
+
+
+def rebuild_tenant_stats(db: Session, tenant_id: UUID):
+    """
+    Recalcula do zero os agregados de um tenant a partir das tabelas de origem.
+    Usado na migração de bases existentes e para reparar divergências.
+    """
+    student_ids = select(models.Profile.id).join(models.User).where(
+        models.User.tenant_id == tenant_id,
+        models.User.role == models.UserRole.student
+    )
+
+    total_students = db.query(func.count()).select_from(student_ids.subquery()).scalar()
+    answer_count, correct_count = db.query(
+        func.count(models.StudentAnswer.id),
+        func.coalesce(func.sum(func.cast(models.StudentAnswer.is_correct, Integer)), 0)
+    ).filter(models.StudentAnswer.profile_id.in_(student_ids)).one()
+
+    topic_rows = db.query(
+        models.StudentProficiencyMap.topic,
+        func.sum(models.StudentProficiencyMap.proficiency_score),
+        func.count(models.StudentProficiencyMap.id)
+    ).filter(models.StudentProficiencyMap.profile_id.in_(student_ids))\
+    .group_by(models.StudentProficiencyMap.topic).all()
+
+    last_days = db.query(
+        models.StudentAnswer.profile_id, func.max(models.StudentAnswer.answered_at)
+    ).filter(models.StudentAnswer.profile_id.in_(student_ids))\
+    .group_by(models.StudentAnswer.profile_id).all()
+
+    db.query(models.TenantStats).filter_by(tenant_id=tenant_id).delete(synchronize_session=False)
+    db.query(models.TenantTopicStats).filter_by(tenant_id=tenant_id).delete(synchronize_session=False)
+    db.query(models.TenantActivityBucket).filter_by(tenant_id=tenant_id).delete(synchronize_session=False)
+
+    db.add(models.TenantStats(
+        tenant_id=tenant_id, total_students=total_students,
+        answer_count=answer_count, correct_count=correct_count
+    ))
+    db.add_all([
+        models.TenantTopicStats(tenant_id=tenant_id, topic=topic, score_sum=score_sum, score_count=score_count)
+        for topic, score_sum, score_count in topic_rows
+    ])
+
+    buckets: dict[date, int] = defaultdict(int)
+    moved = []
+    for profile_id, answered_at in last_days:
+        if answered_at is None:
+            continue
+        buckets[answered_at.date()] += 1
+        moved.append({"id": profile_id, "last_active_on": answered_at.date()})
+    if moved:
+        db.execute(update(models.Profile), moved)
+    db.add_all([
+        models.TenantActivityBucket(tenant_id=tenant_id, day=day, active_students=count)
+        for day, count in buckets.items()
+    ])
+    db.commit()
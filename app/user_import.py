@@ -0,0 +1,130 @@
+"""
+Importação de utilizadores em lote (CSV ou JSONL), executada pela tarefa
+Celery `import_users`.
+
+- Os tenants do arquivo são resolvidos (e criados) uma única vez.
+- As senhas de cada bloco são transformadas em hash em paralelo (`hashing.hash_passwords`).
+- Utilizadores e perfis de um bloco entram com INSERTs em lote, numa transação por bloco.
+- Cada linha inválida ou duplicada vira um erro no relatório, sem interromper as demais.
+
+Colunas esperadas: email, password, full_name, tenant_name e (opcional) role.
+"""
+import csv
+import json
+from typing import Callable, Iterator
+
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import crud, hashing, schemas
+from .config import settings
+
+ProgressCallback = Callable[[str, int, int], None]
+
+SUPPORTED_EXTENSIONS = (".csv", ".jsonl")
+
+
+def read_rows(file_path: str) -> Iterator[tuple[int, dict]]:
+    """Produz `(número da linha, campos)`; a numeração começa em 1 (após o cabeçalho no CSV)."""
+    with open(file_path, encoding="utf-8-sig", newline="") as f:
+        if file_path.endswith(".csv"):
+            for number, row in enumerate(csv.DictReader(f), start=1):
+                yield number, {key.strip(): (value or "").strip() for key, value in row.items() if key}
+        else:
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield number, {"__error__": f"JSON inválido: {e.msg}"}
+                    continue
+                if not isinstance(row, dict):
+                    yield number, {"__error__": "A linha deve ser um objeto JSON."}
+                    continue
+                yield number, row
+
+
+def _row_error(number: int, row: dict, error: str) -> dict:
+    return {"row": number, "email": row.get("email"), "error": error}
+
+
+def _validate(rows: list[tuple[int, dict]], errors: list[dict]) -> list[tuple[int, schemas.UserCreate]]:
+    valid, seen = [], set()
+    for number, row in rows:
+        if "__error__" in row:
+            errors.append(_row_error(number, row, row["__error__"]))
+            continue
+        if not row.get("role"):
+            row.pop("role", None)
+        try:
+            user = schemas.UserCreate(**row)
+        except ValidationError as e:
+            detail = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            errors.append(_row_error(number, row, detail))
+            continue
+        if user.email in seen:
+            errors.append(_row_error(number, row, "E-mail repetido no arquivo."))
+            continue
+        seen.add(user.email)
+        valid.append((number, user))
+    return valid
+
+
+def _insert_chunk(db: Session, chunk: list[tuple[int, schemas.UserCreate]], tenant_ids: dict, errors: list[dict]) -> int:
+    existing = crud.get_existing_emails(db, [user.email for _, user in chunk])
+    for number, user in chunk:
+        if user.email in existing:
+            errors.append({"row": number, "email": user.email, "error": "E-mail já registrado."})
+    chunk = [(number, user) for number, user in chunk if user.email not in existing]
+    if not chunk:
+        return 0
+
+    users = [user for _, user in chunk]
+    password_hashes = hashing.hash_passwords([user.password for user in users])
+    try:
+        crud.bulk_create_users(db, users, tenant_ids, password_hashes)
+        db.commit()
+        return len(users)
+    except IntegrityError:
+        # Alguém registou um destes e-mails entre a checagem e o INSERT:
+        # refaz o bloco linha a linha (savepoints) para isolar as falhas.
+        db.rollback()
+
+    created = 0
+    for (number, user), password_hash in zip(chunk, password_hashes):
+        try:
+            with db.begin_nested():
+                crud.bulk_create_users(db, [user], tenant_ids, [password_hash])
+            created += 1
+        except IntegrityError:
+            errors.append({"row": number, "email": user.email, "error": "E-mail já registrado."})
+    db.commit()
+    return created
+
+
+def import_users(db: Session, file_path: str, on_progress: ProgressCallback | None = None) -> dict:
+    """
+    Importa o arquivo e devolve `{total, created, errors}` (erros por linha). Um
+    arquivo que não está em UTF-8 não é importado e vira um único erro (linha 0).
+    """
+    try:
+        rows = list(read_rows(file_path))
+    except UnicodeDecodeError:
+        return {"total": 0, "created": 0, "errors": [
+            {"row": 0, "email": None, "error": "O arquivo precisa estar codificado em UTF-8."}
+        ]}
+    errors: list[dict] = []
+    valid = _validate(rows, errors)
+    tenant_ids = crud.resolve_tenants(db, {user.tenant_name for _, user in valid}) if valid else {}
+
+    created = 0
+    chunk_size = settings.USER_IMPORT_CHUNK_SIZE
+    for start in range(0, len(valid), chunk_size):
+        created += _insert_chunk(db, valid[start:start + chunk_size], tenant_ids, errors)
+        if on_progress:
+            on_progress("importing", min(start + chunk_size, len(valid)), len(valid))
+
+    errors.sort(key=lambda error: error["row"])
+    return {"total": len(rows), "created": created, "errors": errors}
@@ -21,6 +21,26 @@ def upsert_question(question_id: str, embedding: list[float], metadata: dict):
     except Exception as e:
         print(f"Erro ao inserir vetor no ChromaDB: {e}")
 
+def upsert_questions(question_ids: list[str], embeddings: list[list[float]], metadatas: list[dict]) -> bool:
+    """
+    Insere ou atualiza vários vetores de questões no ChromaDB, em lotes do
+    tamanho máximo aceito pelo cliente. Retorna False se algum lote falhou.
+    """
+    try:
+        batch_size = client.get_max_batch_size()
+        for start in range(0, len(question_ids), batch_size):
+            end = start + batch_size
+            question_collection.upsert(
+                ids=question_ids[start:end],
+                embeddings=embeddings[start:end],
+                metadatas=metadatas[start:end]
+            )
+        print(f"{len(question_ids)} vetores de questões inseridos com sucesso no ChromaDB.")
+        return True
+    except Exception as e:
+        print(f"Erro ao inserir vetores no ChromaDB: {e}")
+        return False
+
 def search_similar_questions(embedding: list[float], n_results: int = 5, subject: str = None):
     """
     Busca por questões vetorialmente similares.
@@ -36,3 +56,29 @@ def search_similar_questions(embedding: list[float], n_results: int = 5, subject
     )
     return results
 
+def query_neighbors(embeddings: list[list[float]], n_results: int) -> list[list[tuple[str, float]]]:
+    """
+    Para cada embedding, as `n_results` questões mais próximas como `(id, distância)`.
+    As consultas vão em lotes (uma chamada ao ChromaDB por lote).
+    """
+    neighbors: list[list[tuple[str, float]]] = []
+    batch_size = client.get_max_batch_size()
+    for start in range(0, len(embeddings), batch_size):
+        results = question_collection.query(
+            query_embeddings=embeddings[start:start + batch_size],
+            n_results=n_results,
+            include=["distances"]
+        )
+        neighbors.extend(list(zip(ids, distances)) for ids, distances in zip(results["ids"], results["distances"]))
+    return neighbors
+
+def iter_question_embeddings(batch_size: int = 500):
+    """Percorre a coleção devolvendo lotes `(ids, embeddings)`."""
+    offset = 0
+    while True:
+        batch = question_collection.get(include=["embeddings"], limit=batch_size, offset=offset)
+        if not batch["ids"]:
+            return
+        yield batch["ids"], [[float(x) for x in e] for e in batch["embeddings"]]
+        offset += len(batch["ids"])
+
@@ -1,4 +1,6 @@
 from celery import Celery
+from celery.signals import celeryd_init, worker_process_init
+from kombu import Queue
 from app.config import settings
 
 # Cria a instância da aplicação Celery
@@ -9,6 +11,95 @@ celery_app = Celery(
     include=["app.tasks"] # Aponta para o nosso ficheiro de tarefas
 )
 
+# Filas separadas para que uma prova grande não atrase as análises curtas:
+# - analysis: análises de respostas (curtas e sensíveis à latência)
+# - essays: correções de redação (10-30 s cada; fora da fila das análises)
+# - ingestion: PDFs de provas e importações (longas, CPU/IO)
+# - default: manutenção e tarefas periódicas
+TASK_ROUTES = {
+    "app.tasks.analyze_student_answer": {"queue": "analysis"},
+    "app.tasks.analyze_student_answers": {"queue": "analysis"},
+    "app.tasks.grade_essay": {"queue": "essays"},
+    "app.tasks.process_exam_pdf": {"queue": "ingestion"},
+    "app.tasks.import_users": {"queue": "ingestion"},
+    "app.tasks.rebuild_question_neighbors": {"queue": "ingestion"},
+    "app.tasks.backfill_question_hashes": {"queue": "ingestion"},
+}
+
+# Prefetch por fila: tarefas curtas ganham com um lote reservado por processo;
+# nas longas cada processo reserva só a tarefa que está executando, para que
+# uma prova ou redação não fique presa atrás de outra enquanto há processo livre.
+QUEUE_PREFETCH_MULTIPLIERS = {
+    "default": settings.CELERY_WORKER_PREFETCH_MULTIPLIER,
+    "analysis": settings.CELERY_WORKER_PREFETCH_MULTIPLIER,
+    "essays": 1,
+    "ingestion": 1,
+}
+
 celery_app.conf.update(
     task_track_started=True,
+    task_queues=[Queue("default"), Queue("analysis"), Queue("essays"), Queue("ingestion")],
+    task_default_queue="default",
+    task_routes=TASK_ROUTES,
+    worker_prefetch_multiplier=settings.CELERY_WORKER_PREFETCH_MULTIPLIER,
+    # Tarefas com acks_late só saem do Redis depois de concluídas; o visibility
+    # timeout precisa ser maior que a tarefa mais longa para evitar reentregas.
+    broker_transport_options={"visibility_timeout": settings.CELERY_VISIBILITY_TIMEOUT_SECONDS},
+    result_expires=settings.CELERY_RESULT_EXPIRES_SECONDS,
+    beat_schedule={
+        # Aplica as respostas pendentes ao mapa de proficiência em lote
+        "apply-pending-proficiency-updates": {
+            "task": "app.tasks.apply_pending_proficiency_updates",
+            "schedule": settings.PROFICIENCY_BATCH_INTERVAL_SECONDS,
+        },
+        # Refaz, dentro do orçamento do Gemini, as análises que falharam
+        "backfill-failed-analyses": {
+            "task": "app.tasks.backfill_failed_analyses",
+            "schedule": settings.ANALYSIS_BACKFILL_INTERVAL_SECONDS,
+        },
+    },
 )
+
+
+@celeryd_init.connect
+def set_prefetch_for_queues(conf=None, options=None, **kwargs):
+    """
+    Ajusta o prefetch do worker conforme as filas que ele consome (-Q), antes de
+    o worker ler a configuração. Um worker com várias filas usa o menor valor;
+    sem -Q ele consome todas. O --prefetch-multiplier da linha de comando, se
+    passado, continua tendo precedência.
+    """
+    queues = (options or {}).get("queues") or list(QUEUE_PREFETCH_MULTIPLIERS)
+    if isinstance(queues, str):
+        queues = queues.split(",")
+    conf.worker_prefetch_multiplier = min(
+        QUEUE_PREFETCH_MULTIPLIERS.get(queue.strip(), settings.CELERY_WORKER_PREFETCH_MULTIPLIER)
+        for queue in queues
+    )
+
+
+@worker_process_init.connect
+def warm_up_worker_process(**kwargs):
+    """
+    Roda uma vez em cada processo filho do worker: descarta as conexões herdadas
+    do processo pai (fork) e já abre o que as tarefas vão usar — uma conexão do
+    pool do banco, os handles dos modelos do Gemini e o cliente do ChromaDB —
+    em vez de pagar esse custo na primeira tarefa.
+    """
+    from app import ai_services, vector_db
+    from app.database import worker_engine
+
+    worker_engine.dispose(close=False)
+    try:
+        with worker_engine.connect():
+            pass
+    except Exception as e:
+        print(f"Aquecimento do pool do banco falhou: {e}")
+
+    for model_name in {ai_services.ERROR_ANALYSIS_MODEL, ai_services.EXAM_MODEL}:
+        ai_services.get_model(model_name)
+
+    try:
+        vector_db.question_collection.count()
+    except Exception as e:
+        print(f"Aquecimento do ChromaDB falhou: {e}")
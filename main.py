@@ -1,6 +1,8 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app import models
+from app import hashing, models
 from app.database import engine
 from app.routers import auth, student, teacher, content, tools, onboarding, admin
 
@@ -8,10 +10,17 @@ from app.routers import auth, student, teacher, content, tools, onboarding, admi
 models.Base.metadata.create_all(bind=engine)
 
 # 2. Instanciação ÚNICA do FastAPI com os metadados
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Encerra o pool de processos do bcrypt junto com a API
+    hashing.shutdown_executor()
+
 app = FastAPI(
     title="Plataforma de Estudo Adaptativo com Gemini",
     description="API para gerenciar alunos, questões e aprendizado com a IA do Google Gemini.",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # 3. Definição das origens permitidas para o CORS
@@ -31,6 +31,7 @@ CREATE TABLE profiles (
     user_id UUID NOT NULL UNIQUE,
     full_name VARCHAR(255) NOT NULL,
     current_goal VARCHAR(255), -- Ex: 'ENEM', 'OAB', 'PRF'
+    last_active_on DATE, -- Último dia com resposta (métricas de engajamento)
     CONSTRAINT fk_user
         FOREIGN KEY(user_id)
         REFERENCES users(id)
@@ -58,11 +59,17 @@ CREATE TABLE questions (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     content TEXT NOT NULL,
     options JSONB NOT NULL, -- Ex: { "A": "Texto A", "B": "Texto B", ... }
-    correct_option VARCHAR(10) NOT NULL,
+    correct_option VARCHAR(10), -- NULL enquanto o gabarito não foi definido
+    -- Em bases existentes:
+    --   ALTER TABLE questions ALTER COLUMN correct_option DROP NOT NULL;
+    --   UPDATE questions SET correct_option = NULL WHERE correct_option = '';
     subject VARCHAR(255) NOT NULL,
     topic VARCHAR(255) NOT NULL,
     source VARCHAR(255), -- Ex: 'ENEM 2023', 'PRF 2021'
-    vector_id VARCHAR(255) UNIQUE -- ID correspondente no banco vetorial
+    vector_id VARCHAR(255) UNIQUE, -- ID correspondente no banco vetorial
+    content_hash VARCHAR(64) -- SHA-256 do enunciado + alternativas, normalizado (deduplicação)
+    -- Em bases existentes, depois de criar a coluna, rode a tarefa Celery
+    -- app.tasks.backfill_question_hashes para preencher as questões antigas.
 );
 
 -- Tabela para as Respostas dos Alunos
@@ -75,6 +82,11 @@ CREATE TABLE student_answers (
     time_taken_ms INTEGER, -- Tempo em milissegundos
     ai_analysis JSONB, -- { "error_type": "...", "explanation": "..." }
     answered_at TIMESTAMPTZ DEFAULT NOW(),
+    proficiency_applied BOOLEAN NOT NULL DEFAULT FALSE, -- Já aplicada ao mapa de proficiência?
+    -- Em bases existentes as respostas antigas já foram aplicadas (uma a uma, no
+    -- caminho antigo); elas entram como aplicadas e só as novas ficam pendentes:
+    --   ALTER TABLE student_answers ADD COLUMN proficiency_applied BOOLEAN NOT NULL DEFAULT TRUE;
+    --   ALTER TABLE student_answers ALTER COLUMN proficiency_applied SET DEFAULT FALSE;
     CONSTRAINT fk_profile
         FOREIGN KEY(profile_id)
         REFERENCES profiles(id)
@@ -95,8 +107,45 @@ CREATE TABLE student_proficiency_map (
     CONSTRAINT fk_profile
         FOREIGN KEY(profile_id)
         REFERENCES profiles(id)
-        ON DELETE CASCADE,
-    UNIQUE (profile_id, topic) -- Garante que cada aluno tenha apenas um score por tópico
+        ON DELETE CASCADE
+);
+
+-- Agregados materializados do painel do professor, mantidos de forma incremental.
+-- Para popular bases existentes, rode a tarefa Celery app.tasks.rebuild_tenant_stats
+-- para cada tenant.
+CREATE TABLE tenant_stats (
+    tenant_id UUID PRIMARY KEY REFERENCES tenants(id) ON DELETE CASCADE,
+    total_students INTEGER NOT NULL DEFAULT 0,
+    answer_count INTEGER NOT NULL DEFAULT 0,
+    correct_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE tenant_topic_stats (
+    tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    topic VARCHAR(255) NOT NULL,
+    score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    score_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tenant_id, topic)
+);
+
+-- Quantos alunos tiveram o último dia de atividade em cada dia.
+CREATE TABLE tenant_activity_buckets (
+    tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    active_students INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tenant_id, day)
+);
+
+-- Vizinhos mais próximos de cada questão (embeddings do ChromaDB), recalculados
+-- na ingestão; a recomendação de reforço lê só esta tabela. Para popular bases
+-- existentes, rode a tarefa Celery app.tasks.rebuild_question_neighbors.
+CREATE TABLE question_neighbors (
+    question_id UUID NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+    neighbor_id UUID NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+    rank INTEGER NOT NULL,
+    distance DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (question_id, neighbor_id)
 );
 
 
@@ -109,10 +158,26 @@ CREATE INDEX idx_enrollments_student_id ON enrollments(student_id);
 
 CREATE INDEX idx_questions_subject ON questions(subject);
 CREATE INDEX idx_questions_topic ON questions(topic);
+CREATE INDEX ix_questions_topic_id ON questions(topic, id);
+CREATE INDEX ix_questions_content_hash ON questions(content_hash);
 
 CREATE INDEX idx_student_answers_profile_id ON student_answers(profile_id);
 CREATE INDEX idx_student_answers_question_id ON student_answers(question_id);
-
-CREATE INDEX idx_student_proficiency_map_profile_id ON student_proficiency_map(profile_id);
+CREATE INDEX ix_student_answers_profile_question ON student_answers(profile_id, question_id);
+CREATE INDEX ix_student_answers_pending_proficiency ON student_answers(answered_at) WHERE NOT proficiency_applied;
+-- Análises a refazer (sem análise ou com o fallback do Gemini), lidas por keyset.
+-- O predicado é o mesmo de models.analysis_pending_clause.
+CREATE INDEX ix_student_answers_analysis_pending ON student_answers(answered_at, id)
+    WHERE is_correct IS false
+      AND coalesce(CAST((ai_analysis ->> 'error_type') AS VARCHAR), 'analysis_failed') = 'analysis_failed';
+
+-- Garante que cada aluno tenha apenas um score por tópico. É o alvo do
+-- INSERT ... ON CONFLICT e, com o INCLUDE, atende as leituras por profile_id
+-- com index-only scans (dispensa um índice separado em profile_id).
+-- Em bases existentes, remova duplicatas antes de criar o índice:
+--   DELETE FROM student_proficiency_map a USING student_proficiency_map b
+--   WHERE a.profile_id = b.profile_id AND a.topic = b.topic AND a.ctid < b.ctid;
+CREATE UNIQUE INDEX uq_student_proficiency_map_profile_topic
+    ON student_proficiency_map(profile_id, topic) INCLUDE (proficiency_score);
 CREATE INDEX idx_student_proficiency_map_topic ON student_proficiency_map(topic);
 
@@ -1,44 +1,107 @@
 import pytest
+from contextlib import contextmanager
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
-from typing import Generator
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from typing import AsyncGenerator, Generator
 from uuid import uuid4
+import os
+import tempfile
 
 from main import app
-from app.database import Base, get_db
+from app.database import Base, get_async_db, get_db
 from app.models import Tenant, User, Profile, Question, UserRole
-from app.security import get_password_hash
+from app.security import get_password_hash, principal_cache
+from app.question_bank import question_bank
+from app.analysis_cache import analysis_cache
+from app.ai_services import embedding_store
+from app.ai_scheduler import local_bucket, scheduler
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# Arquivo SQLite compartilhado: o caminho síncrono e o assíncrono (aiosqlite)
+# precisam ver os mesmos dados, por isso cada teste grava de verdade e as
+# tabelas são esvaziadas ao final.
+TEST_DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix="aprovaia-tests-"), "test.db")
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
+    f"sqlite:///{TEST_DATABASE_PATH}",
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
 )
+# NullPool: o TestClient abre um event loop por requisição e conexões aiosqlite não podem trocar de loop.
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{TEST_DATABASE_PATH}", poolclass=NullPool)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
 
 Base.metadata.create_all(bind=engine)
 
+@pytest.fixture(autouse=True)
+def reset_in_process_caches():
+    # As tabelas são esvaziadas ao fim de cada teste; os índices em memória também são descartados.
+    question_bank.reset()
+    analysis_cache.clear()
+    principal_cache.clear()
+    yield
+    question_bank.reset()
+    analysis_cache.clear()
+    principal_cache.clear()
+
+@pytest.fixture(autouse=True)
+def isolated_embedding_store(tmp_path):
+    # Cada teste começa com um store de embeddings vazio, fora do diretório do projeto.
+    embedding_store.open(str(tmp_path / "embedding_store"))
+    yield embedding_store
+
+@pytest.fixture(autouse=True)
+def in_memory_ai_budget():
+    # O orçamento de chamadas ao Gemini usa o balde em memória, zerado a cada teste.
+    bucket = scheduler.bucket
+    local_bucket.clear()
+    scheduler.bucket = local_bucket
+    yield local_bucket
+    scheduler.bucket = bucket
+
+@pytest.fixture
+def query_counter():
+    """
+    Conta os statements SQL emitidos dentro do bloco `with`, nos engines síncrono
+    e assíncrono, para travar regressões de N+1: `with query_counter() as statements: ...`.
+    """
+    @contextmanager
+    def _count():
+        statements = []
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        for target in (engine, async_engine.sync_engine):
+            event.listen(target, "before_cursor_execute", _record)
+        try:
+            yield statements
+        finally:
+            for target in (engine, async_engine.sync_engine):
+                event.remove(target, "before_cursor_execute", _record)
+    return _count
+
 @pytest.fixture(scope="function")
 def db_session() -> Generator[Session, None, None]:
-    connection = engine.connect()
-    transaction = connection.begin()
-    db = TestingSessionLocal(bind=connection)
+    db = TestingSessionLocal()
     yield db
     db.close()
-    transaction.rollback()
-    connection.close()
+    with engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(table.delete())
 
 @pytest.fixture(scope="function")
 def test_client(db_session: Session) -> Generator[TestClient, None, None]:
     def override_get_db():
         yield db_session
+    async def override_get_async_db() -> AsyncGenerator:
+        async with TestingAsyncSessionLocal() as db:
+            yield db
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     client = TestClient(app)
     yield client
     del app.dependency_overrides[get_db]
+    del app.dependency_overrides[get_async_db]
 
 @pytest.fixture(scope="function")
 def test_tenant(db_session: Session) -> Tenant:
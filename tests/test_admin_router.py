@@ -41,3 +41,22 @@ def test_update_answer_key_success(test_client: TestClient, db_session: Session,
     db_session.refresh(question)
     assert question.correct_option == "B"
 
+
+
+def test_update_answer_key_refreshes_question_bank(test_client: TestClient, db_session: Session, admin_auth_token: str):
+    from app.question_bank import question_bank
+
+    question = Question(id=uuid4(), content="Gabarito?", options={"A": "1", "B": "2"}, correct_option="A", subject="Teste", topic="Teste")
+    db_session.add(question)
+    db_session.commit()
+    question_bank.ensure_fresh(db_session)
+    assert question_bank.answer_key(question.id) == "A"
+
+    response = test_client.put(
+        f"/admin/questions/{question.id}/answer-key",
+        headers={"Authorization": f"Bearer {admin_auth_token}"},
+        json={"correct_option": "C"}
+    )
+    assert response.status_code == 200
+    assert question_bank.answer_key(question.id) == "C"
+    assert question_bank.sample("Teste", k=5) == [question.id]
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from app.ai_scheduler import AIRateLimited, MemoryTokenBucket, Priority, RedisTokenBucket, scheduler
+
+
+def test_background_calls_leave_the_reserve_for_interactive_ones():
+    bucket = MemoryTokenBucket()
+    limits = (10, 1_000)
+
+    granted = [bucket.acquire("m", limits, (1, 10), reserve=0.2) for _ in range(8)]
+    assert granted == [0] * 8
+    # O 9º pedido em background cairia na reserva: volta o tempo de espera (1 ficha a cada 6 s).
+    assert bucket.acquire("m", limits, (1, 10), reserve=0.2) == pytest.approx(6, abs=0.1)
+    # As chamadas interativas ainda usam a reserva.
+    assert bucket.acquire("m", limits, (1, 10), reserve=0.0) == 0
+    assert bucket.acquire("m", limits, (1, 10), reserve=0.0) == 0
+    assert bucket.acquire("m", limits, (1, 10), reserve=0.0) > 0
+    # Outro modelo tem o seu próprio balde.
+    assert bucket.acquire("outro", limits, (1, 10), reserve=0.2) == 0
+
+
+def test_token_budget_limits_calls_independently_of_request_count():
+    bucket = MemoryTokenBucket()
+    assert bucket.acquire("m", (100, 1_000), (1, 900), reserve=0.0) == 0
+    assert bucket.acquire("m", (100, 1_000), (1, 200), reserve=0.0) == pytest.approx(6, abs=0.1)
+
+
+def test_call_retries_transient_errors_with_backoff(mocker):
+    sleep = mocker.patch("app.ai_scheduler.time.sleep")
+    fn = mocker.Mock(side_effect=[google_exceptions.ResourceExhausted("cota"), google_exceptions.ServiceUnavailable("fora"), "ok"])
+
+    assert scheduler.call("gemini-2.0-flash", fn, tokens=100) == "ok"
+    assert fn.call_count == 3
+    assert sleep.call_count == 2
+
+
+def test_call_does_not_retry_permanent_errors_and_interactive_retries_once(mocker):
+    mocker.patch("app.ai_scheduler.time.sleep")
+    permanent = mocker.Mock(side_effect=ValueError("prompt inválido"))
+    with pytest.raises(ValueError):
+        scheduler.call("gemini-2.0-flash", permanent, tokens=100)
+    assert permanent.call_count == 1
+
+    overloaded = mocker.Mock(side_effect=google_exceptions.ResourceExhausted("cota"))
+    with pytest.raises(google_exceptions.ResourceExhausted):
+        scheduler.call("gemini-1.5-flash", overloaded, tokens=100, priority=Priority.interactive)
+    assert overloaded.call_count == 2
+
+
+def test_acquire_gives_up_when_budget_wait_exceeds_the_priority_limit(mocker):
+    mocker.patch.object(scheduler.bucket, "acquire", return_value=30.0)
+    with pytest.raises(AIRateLimited):
+        scheduler.acquire("gemini-1.5-flash", 100, Priority.interactive)
+
+    async def acall():
+        return await scheduler.acall("gemini-1.5-flash", mocker.AsyncMock(return_value="ok"), tokens=100)
+
+    with pytest.raises(AIRateLimited):
+        asyncio.run(acall())
+
+
+def test_redis_bucket_script_enforces_the_shared_budget(mocker):
+    fakeredis = pytest.importorskip("fakeredis")
+    mocker.patch("app.ai_scheduler.get_redis", return_value=fakeredis.FakeRedis(decode_responses=True))
+    fallback = MemoryTokenBucket()
+    bucket = RedisTokenBucket(fallback)
+    limits = (10, 1_000)
+
+    assert [bucket.acquire("m", limits, (1, 10), reserve=0.2) for _ in range(8)] == [0] * 8
+    assert bucket.acquire("m", limits, (1, 10), reserve=0.2) == pytest.approx(6, abs=0.1)
+    assert bucket.acquire("m", limits, (1, 10), reserve=0.0) == 0
+    # O balde de tokens também é checado, e nada é debitado quando a chamada não cabe.
+    assert bucket.acquire("m", limits, (1, 990), reserve=0.0) > 0
+    assert bucket.acquire("m", limits, (1, 10), reserve=0.0) == 0
+    assert fallback._buckets == {}
+
+
+def test_redis_bucket_script_runs_on_the_async_client(mocker):
+    fakeredis = pytest.importorskip("fakeredis")
+    mocker.patch("app.ai_scheduler.get_async_redis", return_value=fakeredis.FakeAsyncRedis(decode_responses=True))
+    bucket = RedisTokenBucket(MemoryTokenBucket())
+
+    async def acquire_all():
+        return [await bucket.aacquire("m", (2, 1_000), (1, 10), reserve=0.0) for _ in range(3)]
+
+    waits = asyncio.run(acquire_all())
+    assert waits[:2] == [0, 0]
+    assert waits[2] == pytest.approx(30, abs=0.1)
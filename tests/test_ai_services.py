@@ -0,0 +1,36 @@
+from google.api_core import exceptions as google_exceptions
+from app import ai_services
+
+
+def test_generate_embeddings_batches_and_retries_failed_sub_batches(mocker):
+    mocker.patch.object(ai_services.settings, "EMBEDDING_BATCH_SIZE", 4)
+    mocker.patch.object(ai_services.settings, "EMBEDDING_RETRY_BACKOFF_SECONDS", 0)
+    calls = []
+
+    def fake_embed_content(model, content, task_type):
+        calls.append(list(content))
+        if "ruim" in content and len(content) > 1:
+            raise RuntimeError("lote rejeitado")
+        if content == ["ruim"]:
+            raise RuntimeError("texto rejeitado")
+        return {"embedding": [[float(len(text))] for text in content]}
+
+    mocker.patch("app.ai_services.genai.embed_content", side_effect=fake_embed_content)
+    texts = ["a", "bb", "ccc", "dddd", "ruim", "ff"]
+
+    embeddings = ai_services.generate_embeddings(texts)
+
+    assert embeddings == [[1.0], [2.0], [3.0], [4.0], None, [2.0]]
+    assert calls[0] == ["a", "bb", "ccc", "dddd"]
+    assert calls[1] == ["ruim", "ff"]
+    assert ["ff"] in calls
+
+
+def test_generate_embeddings_stops_on_sustained_rate_limit_without_splitting(mocker):
+    mocker.patch.object(ai_services.settings, "EMBEDDING_BATCH_SIZE", 2)
+    mocker.patch("app.ai_scheduler.time.sleep")
+    embed = mocker.patch("app.ai_services.genai.embed_content", side_effect=google_exceptions.ResourceExhausted("cota"))
+
+    assert ai_services.generate_embeddings(["a", "b", "c", "d"]) == [None] * 4
+    # Só as retentativas do scheduler no primeiro lote; nada de dividir nem seguir para o próximo.
+    assert embed.call_count == ai_services.settings.AI_BACKGROUND_MAX_RETRIES + 1
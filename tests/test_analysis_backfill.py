@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from google.api_core import exceptions as google_exceptions
+from sqlalchemy.orm import Session
+
+from app.analysis_backfill import backfill_failed_analyses
+from app.models import Question, StudentAnswer, User
+
+FAILED = {"error_type": "analysis_failed", "brief_explanation": "x", "detailed_feedback": "y"}
+ANALYSIS = '{"error_type": "inattention", "brief_explanation": "x", "detailed_feedback": "y"}'
+
+
+def _seed(db_session: Session, student_user: User) -> Question:
+    question = Question(id=uuid4(), content="Quanto é 2 + 2?", options={"A": "4", "B": "5", "C": "6"},
+                        correct_option="A", subject="Matemática", topic="Aritmética")
+    db_session.add(question)
+    db_session.commit()
+    old = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rows = [
+        ("B", False, FAILED, old),
+        ("B", False, FAILED, old + timedelta(minutes=1)),
+        ("C", False, None, old + timedelta(minutes=2)),
+        ("B", False, FAILED, old + timedelta(minutes=3)),
+        ("C", False, {"error_type": "misinterpretation"}, old + timedelta(minutes=4)),
+        ("A", True, None, old + timedelta(minutes=5)),
+        # Recente demais: a tarefa normal de análise ainda pode estar na fila.
+        ("B", False, None, datetime.now(timezone.utc)),
+    ]
+    for option, is_correct, analysis, answered_at in rows:
+        db_session.add(StudentAnswer(profile_id=student_user.profile.id, question_id=question.id, selected_option=option,
+                                     is_correct=is_correct, ai_analysis=analysis, answered_at=answered_at))
+    db_session.commit()
+    return question
+
+
+def _analyses(db_session: Session) -> list:
+    db_session.expire_all()
+    return [a.ai_analysis for a in db_session.query(StudentAnswer).order_by(StudentAnswer.answered_at)]
+
+
+def test_backfill_walks_pages_and_analyzes_each_question_option_once(db_session: Session, student_user: User, mocker):
+    _seed(db_session, student_user)
+    model = mocker.patch("app.ai_services.get_model").return_value
+    model.generate_content.return_value.text = ANALYSIS
+
+    result = backfill_failed_analyses(db_session, page_size=2)
+
+    assert result == {"status": "completed", "scanned": 4, "analyzed": 4, "failed": 0}
+    # Uma chamada por (questão, alternativa): "B" e "C".
+    assert model.generate_content.call_count == 2
+    analyses = _analyses(db_session)
+    assert [a["error_type"] for a in analyses[:4]] == ["inattention"] * 4
+    assert analyses[4] == {"error_type": "misinterpretation"}
+    assert analyses[5] is None and analyses[6] is None
+
+
+def test_backfill_pauses_without_touching_rows_while_gemini_is_down(db_session: Session, student_user: User, mocker):
+    _seed(db_session, student_user)
+    mocker.patch("app.ai_scheduler.time.sleep")
+    generate = mocker.patch("app.ai_services.get_model").return_value.generate_content
+    generate.side_effect = google_exceptions.ServiceUnavailable("indisponível")
+
+    assert backfill_failed_analyses(db_session, page_size=10)["status"] == "paused"
+    assert [a and a["error_type"] for a in _analyses(db_session)[:4]] == ["analysis_failed", "analysis_failed", None, "analysis_failed"]
+
+
+def test_backfill_moves_past_a_page_that_fails_permanently(db_session: Session, student_user: User, mocker):
+    _seed(db_session, student_user)
+    model = mocker.patch("app.ai_services.get_model").return_value
+    # "B" sempre devolve uma resposta inválida; "C" dá certo.
+    model.generate_content.side_effect = lambda prompt: mocker.Mock(
+        text="não é JSON" if "alternativa: **B**" in prompt else ANALYSIS
+    )
+
+    result = backfill_failed_analyses(db_session, page_size=2)
+
+    # A primeira página só tem "B": falha definitiva, mas o cursor avança.
+    assert result == {"status": "completed", "scanned": 4, "analyzed": 1, "failed": 3}
+    analyses = _analyses(db_session)
+    assert [a and a["error_type"] for a in analyses[:4]] == ["analysis_failed", "analysis_failed", "inattention", "analysis_failed"]
@@ -0,0 +1,57 @@
+from uuid import uuid4
+from app import ai_services, schemas
+from app.analysis_cache import AnalysisCache, analysis_cache
+
+
+def _question(correct_option: str = "A") -> schemas.Question:
+    return schemas.Question(
+        id=uuid4(), content="Quanto é 2 + 2?", options={"A": "4", "B": "5"},
+        correct_option=correct_option, subject="Matemática", topic="Aritmética"
+    )
+
+
+def test_analyze_student_error_reuses_cached_analysis(mocker):
+    model = mocker.patch("app.ai_services.get_model").return_value
+    model.generate_content.return_value.text = '{"error_type": "inattention", "brief_explanation": "x", "detailed_feedback": "y"}'
+    question = _question()
+
+    first = ai_services.analyze_student_error(question=question, student_answer="B")
+    second = ai_services.analyze_student_error(question=question, student_answer="B")
+
+    assert first == second
+    assert first["error_type"] == "inattention"
+    assert model.generate_content.call_count == 1
+
+
+def test_failed_analysis_is_not_cached_and_invalidation_drops_entries(mocker):
+    model = mocker.patch("app.ai_services.get_model").return_value
+    model.generate_content.side_effect = RuntimeError("indisponível")
+    question = _question()
+
+    assert ai_services.analyze_student_error(question=question, student_answer="B")["error_type"] == "analysis_failed"
+    assert analysis_cache.get(question, "B") is None
+
+    analysis_cache.set(question, "B", {"error_type": "inattention"})
+    assert analysis_cache.get(question, "B") == {"error_type": "inattention"}
+    analysis_cache.invalidate_question(question.id)
+    assert analysis_cache.get(question, "B") is None
+
+
+def test_lru_eviction_prunes_question_index():
+    cache = AnalysisCache(max_entries=2, ttl_seconds=60, use_redis=False)
+    questions = [_question() for _ in range(5)]
+    for i, question in enumerate(questions):
+        question.content = f"Questão {i}"
+        cache.set(question, "B", {"error_type": "inattention"})
+
+    assert len(cache._entries) == 2
+    assert set(cache._keys_by_question) == {str(questions[3].id), str(questions[4].id)}
+
+
+def test_corrupt_redis_value_is_a_miss(mocker):
+    client = mocker.Mock()
+    client.get.return_value = "{corrompido"
+    mocker.patch("app.analysis_cache.get_redis", return_value=client)
+    cache = AnalysisCache(max_entries=10, ttl_seconds=60, use_redis=True)
+
+    assert cache.get(_question(), "B") is None
@@ -23,3 +23,19 @@ def test_login_wrong_password(test_client: TestClient, student_user: User):
         data={"username": student_user.email, "password": "senhaErrada"}
     )
     assert response.status_code == 401
+
+
+def test_login_populates_principal_cache_and_role_change_invalidates(test_client: TestClient, student_user: User):
+    from app.security import principal_cache
+
+    response = test_client.post(
+        "/auth/login",
+        data={"username": student_user.email, "password": "senha123"}
+    )
+    assert response.status_code == 200
+    principal = principal_cache.get(student_user.email)
+    assert principal.profile_id == student_user.profile.id
+    assert principal.tenant_id == student_user.tenant_id
+
+    student_user.role = "teacher"
+    assert principal_cache.get(student_user.email) is None
@@ -0,0 +1,156 @@
+import time
+from app.cache import ReadCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def mget(self, *keys):
+        return [self.data.get(key) for key in keys]
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+        return int(self.data[key])
+
+    def expire(self, key, seconds):
+        return key in self.data
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+def test_read_cache_hit_miss_invalidate(mocker):
+    mocker.patch("app.cache.get_redis", return_value=FakeRedis())
+    cache = ReadCache("teste", ttl_seconds=60, stale_ttl_seconds=60)
+    loader = mocker.Mock(side_effect=[{"v": 1}, {"v": 2}])
+
+    assert cache.get_or_compute("tenant-a", db=None, loader=loader) == {"v": 1}
+    assert cache.get_or_compute("tenant-a", db=None, loader=loader) == {"v": 1}
+    cache.invalidate(["tenant-a"])
+    assert cache.get_or_compute("tenant-a", db=None, loader=loader) == {"v": 2}
+
+    assert loader.call_count == 2
+    assert cache.metrics["miss"] == 2 and cache.metrics["hit"] == 1
+
+
+def test_read_cache_serves_stale_value_while_revalidating(mocker):
+    mocker.patch("app.cache.get_redis", return_value=FakeRedis())
+    mocker.patch("app.cache.SessionLocal")
+    cache = ReadCache("teste", ttl_seconds=0, stale_ttl_seconds=60)
+    cache.get_or_compute("tenant-a", db=None, loader=lambda db: {"v": 1})
+
+    refreshed = mocker.Mock(return_value={"v": 2})
+    assert cache.get_or_compute("tenant-a", db=None, loader=refreshed) == {"v": 1}
+    deadline = time.monotonic() + 2
+    while refreshed.call_count == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+
+    assert cache.metrics["stale"] == 1
+    assert cache.get_or_compute("tenant-a", db=None, loader=refreshed) == {"v": 2}
+
+
+def test_read_cache_waits_for_concurrent_recompute(mocker):
+    fake = FakeRedis()
+    mocker.patch("app.cache.get_redis", return_value=fake)
+    cache = ReadCache("teste", ttl_seconds=60, stale_ttl_seconds=60)
+    fake.set("cache:teste:tenant-a:lock", "outro-processo")
+    loader = mocker.Mock(return_value={"v": 1})
+
+    def other_process_finishes(seconds):
+        cache._store(fake, "cache:teste:tenant-a", {"v": "do outro"}, 0)
+
+    mocker.patch("app.cache.time.sleep", side_effect=other_process_finishes)
+
+    assert cache.get_or_compute("tenant-a", db=None, loader=loader) == {"v": "do outro"}
+    loader.assert_not_called()
+
+
+def test_recompute_that_finishes_after_invalidation_is_not_served(mocker):
+    fake = FakeRedis()
+    mocker.patch("app.cache.get_redis", return_value=fake)
+    cache = ReadCache("teste", ttl_seconds=60, stale_ttl_seconds=60)
+
+    def loader_racing_a_write(db):
+        # Leu o banco antes da escrita; a invalidação chega antes do SET.
+        cache.invalidate(["tenant-a"])
+        return {"v": "antigo"}
+
+    assert cache.get_or_compute("tenant-a", db=None, loader=loader_racing_a_write) == {"v": "antigo"}
+    assert cache.get_or_compute("tenant-a", db=None, loader=lambda db: {"v": "novo"}) == {"v": "novo"}
+    assert cache.get_or_compute("tenant-a", db=None, loader=lambda db: {"v": "outro"}) == {"v": "novo"}
+
+
+def test_corrupt_cache_entry_is_a_miss(mocker):
+    fake = FakeRedis()
+    mocker.patch("app.cache.get_redis", return_value=fake)
+    cache = ReadCache("teste", ttl_seconds=60, stale_ttl_seconds=60)
+    fake.set("cache:teste:tenant-a", "{corrompido")
+
+    assert cache.get_or_compute("tenant-a", db=None, loader=lambda db: {"v": 1}) == {"v": 1}
+
+
+class FakeAsyncRedis:
+    """Expõe o mesmo armazenamento do FakeRedis com a API do redis.asyncio."""
+    def __init__(self, sync: FakeRedis):
+        self.sync = sync
+
+    async def get(self, key):
+        return self.sync.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        return self.sync.set(key, value, ex=ex, nx=nx)
+
+    async def delete(self, *keys):
+        self.sync.delete(*keys)
+
+    async def mget(self, *keys):
+        return self.sync.mget(*keys)
+
+
+def test_async_read_cache_shares_entries_with_sync_invalidation(mocker):
+    import asyncio
+    fake = FakeRedis()
+    mocker.patch("app.cache.get_redis", return_value=fake)
+    mocker.patch("app.cache.get_async_redis", return_value=FakeAsyncRedis(fake))
+    cache = ReadCache("teste", ttl_seconds=60, stale_ttl_seconds=60)
+    values = iter([{"v": 1}, {"v": 2}])
+
+    async def loader(db):
+        return next(values)
+
+    async def read():
+        return await cache.aget_or_compute("perfil-a", db=None, loader=loader)
+
+    assert asyncio.run(read()) == {"v": 1}
+    assert asyncio.run(read()) == {"v": 1}
+    cache.invalidate(["perfil-a"])
+    assert asyncio.run(read()) == {"v": 2}
+    assert cache.metrics["miss"] == 2 and cache.metrics["hit"] == 1
+    assert "cache:teste:perfil-a:lock" not in fake.data
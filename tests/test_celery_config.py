@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+from celery_worker import celery_app, set_prefetch_for_queues, warm_up_worker_process
+from app.config import settings
+from app import tasks
+
+
+def test_tasks_are_routed_to_dedicated_queues():
+    router = celery_app.amqp.router
+    assert router.route({}, tasks.analyze_student_answers.name)["queue"].name == "analysis"
+    assert router.route({}, tasks.process_exam_pdf.name)["queue"].name == "ingestion"
+    assert router.route({}, tasks.grade_essay.name)["queue"].name == "essays"
+    assert router.route({}, tasks.apply_pending_proficiency_updates.name)["queue"].name == "default"
+    assert tasks.process_exam_pdf.acks_late and tasks.process_exam_pdf.reject_on_worker_lost
+    assert tasks.analyze_student_answer.ignore_result
+
+
+def test_worker_process_init_warms_pool_models_and_chroma(mocker):
+    engine = mocker.patch("app.database.worker_engine")
+    get_model = mocker.patch("app.ai_services.get_model")
+    collection = mocker.patch("app.vector_db.question_collection")
+
+    warm_up_worker_process()
+
+    engine.dispose.assert_called_once_with(close=False)
+    engine.connect.assert_called_once()
+    assert get_model.call_count >= 1
+    collection.count.assert_called_once()
+
+
+def test_prefetch_multiplier_follows_consumed_queues():
+    def prefetch_for(queues):
+        conf = SimpleNamespace(worker_prefetch_multiplier=None)
+        set_prefetch_for_queues(conf=conf, options={"queues": queues})
+        return conf.worker_prefetch_multiplier
+
+    assert prefetch_for(["analysis"]) == settings.CELERY_WORKER_PREFETCH_MULTIPLIER
+    assert prefetch_for(["ingestion"]) == 1
+    assert prefetch_for("essays") == 1
+    assert prefetch_for(["analysis", "ingestion"]) == 1
+    assert prefetch_for(None) == 1
@@ -0,0 +1,110 @@
+from uuid import uuid4
+from sqlalchemy.orm import Session
+from app import crud, schemas, tasks
+from app.config import settings
+from app.models import Question, StudentAnswer
+from app.question_bank import question_bank
+
+
+def test_bulk_create_questions_returns_ids_in_order_and_marks_vectors_later(db_session: Session):
+    question_bank.ensure_fresh(db_session)
+    questions = [
+        schemas.QuestionCreate(content=f"Questão {i}", options={"A": "1", "B": "2"}, correct_option="A", subject="Matemática", topic="Álgebra", source="ENEM 2025")
+        for i in range(3)
+    ]
+
+    question_ids = crud.bulk_create_questions(db_session, questions)
+
+    stored = {q.id: q for q in db_session.query(Question).all()}
+    assert [stored[qid].content for qid in question_ids] == ["Questão 0", "Questão 1", "Questão 2"]
+    assert all(stored[qid].vector_id is None for qid in question_ids)
+    assert sorted(question_bank.sample("Álgebra", k=10)) == sorted(question_ids)
+
+    crud.mark_questions_vectorized(db_session, [str(qid) for qid in question_ids[:2]])
+    db_session.expire_all()
+    assert [db_session.get(Question, qid).vector_id for qid in question_ids] == [str(question_ids[0]), str(question_ids[1]), None]
+
+
+def test_questions_without_answer_key_stay_out_of_pools_until_key_is_set(db_session: Session):
+    question_bank.ensure_fresh(db_session)
+    pending = schemas.QuestionCreate(content="Sem gabarito", options={"A": "1", "B": "2"}, subject="Matemática", topic="Álgebra")
+    [question_id] = crud.bulk_create_questions(db_session, [pending])
+
+    assert question_bank.sample("Álgebra", k=10) == []
+    question_bank.reset()
+    assert question_bank.ensure_fresh(db_session).sample("Álgebra", k=10) == []
+
+    crud.update_question_answer_key(db_session, question_id, "B")
+    assert question_bank.sample("Álgebra", k=10) == [question_id]
+
+
+def test_run_ai_analysis_does_not_lazy_load_question(db_session: Session, query_counter, student_user, mocker):
+    mocker.patch("app.ai_services.analyze_student_error", return_value={"explanation": "Teste"})
+    question = Question(id=uuid4(), content="Q", options={"A": "1", "B": "2"}, correct_option="A", subject="Teste", topic="Teste")
+    answer = StudentAnswer(id=uuid4(), profile_id=student_user.profile.id, question_id=question.id, selected_option="B", is_correct=False)
+    answer_id = answer.id
+    db_session.add_all([question, answer])
+    db_session.commit()
+    db_session.expunge_all()
+
+    with query_counter() as statements:
+        loaded = crud.get_student_answer(db_session, answer_id, with_question=True)
+        crud.run_ai_analysis(db_session, loaded)
+    # um SELECT (resposta + questão) e o UPDATE da análise
+    assert len(statements) == 2
+
+
+def test_run_ai_analyses_only_analyzes_wrong_answers_with_one_commit(db_session: Session, student_user, mocker):
+    analyze = mocker.patch("app.ai_services.analyze_student_error", return_value={"explanation": "Teste"})
+    question = Question(id=uuid4(), content="Q", options={"A": "1", "B": "2"}, correct_option="A", subject="Teste", topic="Teste")
+    right = StudentAnswer(id=uuid4(), profile_id=student_user.profile.id, question_id=question.id, selected_option="A", is_correct=True)
+    wrong = StudentAnswer(id=uuid4(), profile_id=student_user.profile.id, question_id=question.id, selected_option="B", is_correct=False)
+    db_session.add_all([question, right, wrong])
+    db_session.commit()
+    ids = [right.id, wrong.id]
+
+    answers = crud.get_student_answers_with_questions(db_session, ids)
+    crud.run_ai_analyses(db_session, answers)
+
+    analyze.assert_called_once()
+    stored = {a.id: a.ai_analysis for a in db_session.query(StudentAnswer).all()}
+    assert stored == {ids[0]: None, ids[1]: {"explanation": "Teste"}}
+
+
+def test_question_bank_reloads_when_version_cannot_be_read(db_session: Session, mocker):
+    mocker.patch("app.question_bank._read_remote_version", return_value=None)
+    mocker.patch.object(settings, "QUESTION_BANK_VERSION_CHECK_SECONDS", 0)
+    question = Question(id=uuid4(), content="Q", options={"A": "1", "B": "2"}, correct_option="A", subject="Teste", topic="Teste")
+    db_session.add(question)
+    db_session.commit()
+    assert question_bank.ensure_fresh(db_session).answer_key(question.id) == "A"
+
+    # Gabarito corrigido "em outro processo", sem passar pelo índice local.
+    question.correct_option = "B"
+    db_session.commit()
+    assert question_bank.ensure_fresh(db_session).answer_key(question.id) == "B"
+
+
+def test_redelivered_exam_ingestion_vectorizes_questions_left_without_vector(db_session: Session, tmp_path, mocker):
+    extracted = [
+        {"content": f"Questão {i}", "options": {"A": "1", "B": "2"}, "subject": "Matemática", "topic": "Álgebra"}
+        for i in range(2)
+    ]
+    mocker.patch("app.tasks.WorkerSessionLocal", return_value=db_session)
+    mocker.patch("app.tasks.exam_pipeline.structure_exam_pdf", side_effect=lambda *a, **k: [dict(q) for q in extracted])
+    mocker.patch("app.tasks.ai_services.generate_embeddings", side_effect=lambda texts: [[float(i), 1.0] for i, _ in enumerate(texts)])
+    mocker.patch.object(tasks.process_exam_pdf, "update_state")
+    neighbors = mocker.patch("app.tasks.question_neighbors.refresh_neighbors")
+    # Primeira entrega: as questões são gravadas, mas o worker cai antes de vetorizar.
+    upsert = mocker.patch("app.tasks.vector_db.upsert_questions", return_value=False)
+    tasks.process_exam_pdf.run(str(tmp_path / "prova.pdf"), "ENEM", 2025)
+    assert db_session.query(Question).filter(Question.vector_id.is_(None)).count() == 2
+
+    upsert.return_value = True
+    tasks.process_exam_pdf.run(str(tmp_path / "prova.pdf"), "ENEM", 2025)
+
+    stored = db_session.query(Question).all()
+    assert len(stored) == 2
+    assert sorted(upsert.call_args.kwargs["question_ids"]) == sorted(str(q.id) for q in stored)
+    assert all(q.vector_id == str(q.id) for q in stored)
+    neighbors.assert_called_once()
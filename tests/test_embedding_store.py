@@ -0,0 +1,110 @@
+import numpy as np
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from app import ai_services, crud
+from app.embedding_store import EmbeddingStore, content_hash, question_text
+from app.models import Question
+
+
+def test_store_roundtrip_is_shared_across_instances_and_normalizes_text(tmp_path):
+    writer = EmbeddingStore(str(tmp_path), model="models/teste")
+    writer.put_many(["Qual é a capital?", "Outro texto"], [[1.0, 0.0], [0.0, 1.0]])
+
+    # Outro processo (outra instância) lê o mesmo diretório.
+    reader = EmbeddingStore(str(tmp_path), model="models/teste")
+    assert reader.get_many(["  Qual é   a capital? ", "Inédito"]) == [[1.0, 0.0], None]
+
+    writer.put_many(["Terceiro"], [[0.6, 0.8]])
+    assert reader.get_many(["Terceiro"]) == [[np.float32(0.6).item(), np.float32(0.8).item()]]
+    assert [h for h, _ in reader.nearest([[0.0, 2.0]], k=2)[0]] == [content_hash("Outro texto"), content_hash("Terceiro")]
+
+
+def test_store_discards_vectors_written_without_index(tmp_path):
+    store = EmbeddingStore(str(tmp_path), model="models/teste")
+    store.put_many(["a"], [[1.0, 2.0]])
+    # Escrita interrompida: vetor gravado, índice não.
+    with open(store._path("vectors.f32"), "ab") as f:
+        f.write(np.asarray([[9.0, 9.0]], dtype=np.float32).tobytes())
+
+    store.put_many(["b"], [[3.0, 4.0]])
+    assert store.get_many(["a", "b"]) == [[1.0, 2.0], [3.0, 4.0]]
+
+
+def test_generate_embeddings_consults_store_and_sends_repeated_texts_once(mocker):
+    embed = mocker.patch(
+        "app.ai_services.genai.embed_content",
+        side_effect=lambda model, content, task_type: {"embedding": [[float(len(text)), 1.0] for text in content]}
+    )
+
+    first = ai_services.generate_embeddings(["abc", "abc ", "de"])
+    assert first == [[3.0, 1.0], [3.0, 1.0], [2.0, 1.0]]
+    assert embed.call_args.kwargs["content"] == ["abc", "de"]
+
+    embed.reset_mock()
+    assert ai_services.generate_embeddings(["de", "abc"]) == [[2.0, 1.0], [3.0, 1.0]]
+    embed.assert_not_called()
+
+
+def test_find_duplicate_questions_exact_near_and_in_batch(db_session: Session):
+    text = question_text("Quanto é 2 + 2?", {"A": "4", "B": "5"})
+    existing = Question(
+        content="Quanto é 2 + 2?", options={"A": "4", "B": "5"}, correct_option="A",
+        subject="Matemática", topic="Aritmética", content_hash=content_hash(text)
+    )
+    db_session.add(existing)
+    db_session.commit()
+    ai_services.embedding_store.put_many([text], [[1.0, 0.0, 0.0]])
+
+    duplicates = crud.find_duplicate_questions(
+        db_session,
+        [
+            question_text("Quanto é  2 + 2?", {"b": "5", "a": "4"}),
+            question_text("Quanto é 2+2?", {"A": "4", "B": "5"}),
+            question_text("Questão nova", {"A": "x"}),
+            question_text("Questão nova, reescrita", {"A": "x"}),
+        ],
+        [[1.0, 0.0, 0.0], [0.99, 0.01, 0.0], [0.0, 1.0, 0.0], [0.0, 0.99, 0.02]],
+    )
+
+    assert duplicates == [existing.id, existing.id, None, 2]
+
+
+def test_same_stem_with_different_options_is_not_a_duplicate(db_session: Session):
+    stem = "Qual alternativa está correta?"
+    db_session.add(Question(
+        content=stem, options={"A": "Brasília", "B": "Lima"}, correct_option="A",
+        subject="Geografia", topic="Capitais", content_hash=content_hash(question_text(stem, {"A": "Brasília", "B": "Lima"}))
+    ))
+    db_session.commit()
+
+    duplicates = crud.find_duplicate_questions(
+        db_session,
+        [question_text(stem, {"A": "Quito", "B": "Bogotá"}), question_text(stem, {"A": "Santiago", "B": "Caracas"})],
+        [None, None],
+    )
+
+    assert duplicates == [None, None]
+
+
+def test_upload_question_rejects_duplicate(test_client: TestClient, db_session: Session, admin_auth_token: str, mocker):
+    mocker.patch("app.ai_services.generate_embedding", return_value=[1.0, 0.0])
+    payload = {"content": "Enunciado único", "options": {"A": "1"}, "correct_option": "A", "subject": "S", "topic": "T"}
+    headers = {"Authorization": f"Bearer {admin_auth_token}"}
+
+    assert test_client.post("/content/questions/upload", json=payload, headers=headers).status_code == 200
+    assert test_client.post("/content/questions/upload", json=payload, headers=headers).status_code == 409
+
+
+def test_backfill_question_hashes_fills_rows_created_before_the_column(db_session: Session):
+    old = [
+        Question(content=f"Questão antiga {i}", options={"A": "1", "B": "2"}, correct_option="A", subject="S", topic="T")
+        for i in range(5)
+    ]
+    db_session.add_all(old)
+    db_session.commit()
+
+    assert crud.backfill_question_hashes(db_session, page_size=2) == 5
+    assert crud.backfill_question_hashes(db_session, page_size=2) == 0
+
+    reuploaded = question_text("Questão antiga 3", {"A": "1", "B": "2"})
+    assert crud.find_duplicate_questions(db_session, [reuploaded], [None]) == [old[3].id]
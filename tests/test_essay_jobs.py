@@ -0,0 +1,88 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import essay_jobs, tasks
+
+RAW_GRADE = {
+    "feedback_geral": "Bom texto.",
+    "nota_total": 1000,  # o modelo somou errado
+    "criterios": [
+        {"nome": f"Competência {i}", "nota": 160, "feedback": "ok"} for i in range(1, 6)
+    ],
+}
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = str(value)
+        return True
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+@pytest.fixture
+def fake_redis(mocker):
+    client = FakeRedis()
+    mocker.patch("app.essay_jobs.get_redis", return_value=client)
+    return client
+
+
+def test_validate_grade_recomputes_total_and_rejects_malformed_output(mocker):
+    assert essay_jobs.validate_grade(RAW_GRADE)["nota_total"] == 800
+
+    mocker.patch("app.ai_services.grade_essay_with_gemini", return_value={"feedback_geral": "sem critérios"})
+    with pytest.raises(essay_jobs.EssayGradingError):
+        essay_jobs.grade("Texto", "Tema")
+
+
+def test_grading_job_is_deduplicated_and_result_is_served_from_cache(
+    test_client: TestClient, student_auth_token: str, fake_redis: FakeRedis, mocker
+):
+    headers = {"Authorization": f"Bearer {student_auth_token}"}
+    payload = {"essayText": "Texto da redação", "theme": "Tema"}
+    apply_async = mocker.patch("app.routers.tools.grade_essay_task.apply_async")
+    async_result = mocker.patch("app.routers.tools.celery_app.AsyncResult").return_value
+    async_result.state = "PENDING"
+
+    first = test_client.post("/tools/grade-essay/jobs", headers=headers, json=payload)
+    second = test_client.post("/tools/grade-essay/jobs", headers=headers, json=payload)
+
+    assert first.status_code == 202 and second.status_code == 202
+    job_id = first.json()["job_id"]
+    assert second.json()["job_id"] == job_id
+    assert apply_async.call_count == 1
+    assert apply_async.call_args.kwargs["task_id"] == job_id
+    assert test_client.get(f"/tools/grade-essay/jobs/{job_id}", headers=headers).json()["status"] == "PENDING"
+
+    # O worker executa a tarefa.
+    gemini = mocker.patch("app.ai_services.grade_essay_with_gemini", return_value=RAW_GRADE)
+    tasks.grade_essay(payload["essayText"], payload["theme"])
+
+    status = test_client.get(f"/tools/grade-essay/jobs/{job_id}", headers=headers).json()
+    assert status["status"] == "SUCCESS"
+    assert status["result"]["nota_total"] == 800
+
+    resubmitted = test_client.post("/tools/grade-essay/jobs", headers=headers, json=payload)
+    assert resubmitted.status_code == 200
+    assert resubmitted.json()["result"]["nota_total"] == 800
+    assert apply_async.call_count == 1
+    assert gemini.call_count == 1
+
+
+def test_unknown_grading_job_returns_404(test_client: TestClient, student_auth_token: str, fake_redis: FakeRedis, mocker):
+    mocker.patch("app.routers.tools.celery_app.AsyncResult").return_value.state = "PENDING"
+    response = test_client.get("/tools/grade-essay/jobs/desconhecido", headers={"Authorization": f"Bearer {student_auth_token}"})
+    assert response.status_code == 404
@@ -0,0 +1,82 @@
+import multiprocessing
+import os
+
+import billiard
+import fitz
+import pytest
+from app import exam_pipeline
+
+
+def _write_pdf(file_path, pages: int):
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"Pagina {i}")
+    doc.save(file_path)
+    doc.close()
+
+
+def test_extract_pages_in_parallel_keeps_page_order(tmp_path):
+    file_path = tmp_path / "prova.pdf"
+    _write_pdf(file_path, 6)
+
+    pages = exam_pipeline.extract_pages(str(file_path), workers=3)
+
+    assert [page.strip() for page in pages] == [f"Pagina {i}" for i in range(6)]
+
+
+def test_extract_pages_uses_processes_inside_a_daemonic_worker(tmp_path, mocker):
+    # Simula o processo filho do Celery (prefork), que é daemônico: o
+    # `multiprocessing` se recusaria a criar processos aqui.
+    mocker.patch.dict(multiprocessing.current_process()._config, {"daemon": True})
+    with pytest.raises(AssertionError):
+        multiprocessing.Process(target=os.getpid).start()
+    mocker.patch.object(exam_pipeline.settings, "EXAM_PDF_EXTRACT_TIMEOUT_SECONDS", 30)
+    started = mocker.spy(billiard.Process, "start")
+    file_path = tmp_path / "prova.pdf"
+    _write_pdf(file_path, 6)
+
+    pages = exam_pipeline.extract_pages(str(file_path), workers=3)
+
+    assert [page.strip() for page in pages] == [f"Pagina {i}" for i in range(6)]
+    assert started.call_count == 3
+    assert any(call.args[0].pid != os.getpid() for call in started.call_args_list)
+
+
+def test_split_into_chunks_cuts_only_at_question_boundaries():
+    pages = [
+        "CADERNO DE PROVA\nQUESTÃO 1\nEnunciado um\nA) x\n",
+        "QUESTÃO 2\nEnunciado dois\nA) y\nQUESTÃO 3\nEnunciado três\n",
+    ]
+
+    chunks = exam_pipeline.split_into_chunks(pages, max_chars=60)
+
+    assert "".join(chunks).replace("\n", "") == "\n".join(pages).replace("\n", "")
+    for chunk in chunks[1:]:
+        assert chunk.lstrip().upper().startswith("QUESTÃO")
+    assert all(len(chunk) <= 60 for chunk in chunks)
+
+
+def test_structure_chunks_merges_in_order_and_deduplicates(mocker):
+    responses = {
+        "bloco 1": {"questions": [{"content": "Quanto é 2+2?"}, {"content": "Capital do Brasil?"}]},
+        "bloco 2": {"questions": [
+            {"content": "capital do  brasil?"},
+            {"content": "Quem escreveu Dom Casmurro?"},
+            {"content": "Assinale a correta.", "options": {"A": "Brasília", "B": "Lima"}},
+        ]},
+        "bloco 3": {"questions": [
+            {"content": "Assinale a correta.", "options": {"a": "brasília", "b": "Lima"}},
+            {"content": "Assinale a correta.", "options": {"A": "Quito", "B": "Lima"}},
+        ]},
+        "bloco 4": None,
+    }
+    mocker.patch("app.ai_services.structure_exam_from_text", side_effect=lambda chunk: responses[chunk])
+    progress = []
+
+    questions = exam_pipeline.structure_chunks(["bloco 1", "bloco 2", "bloco 3", "bloco 4"], on_progress=lambda *args: progress.append(args))
+
+    assert [q["content"] for q in questions] == [
+        "Quanto é 2+2?", "Capital do Brasil?", "Quem escreveu Dom Casmurro?", "Assinale a correta.", "Assinale a correta."
+    ]
+    assert [q["options"]["A"] for q in questions[3:]] == ["Brasília", "Quito"]
+    assert progress[-1] == ("structuring", 4, 4)
@@ -0,0 +1,72 @@
+import threading
+
+import billiard
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from app import hashing
+from app.config import settings
+from app.models import User
+from main import app
+
+
+def test_hash_password_runs_in_pool_with_configured_cost(mocker):
+    mocker.patch.object(settings, "PASSWORD_BCRYPT_ROUNDS", 4)
+    password_hash = hashing.hash_password("senha-forte")
+    assert password_hash.startswith("$2b$04$")
+    assert hashing.context().verify("senha-forte", password_hash)
+
+
+def test_login_rehashes_when_cost_changes(test_client: TestClient, db_session: Session, student_user: User, mocker):
+    student_user.password_hash = hashing._context(4).hash("senha123")
+    db_session.commit()
+    mocker.patch.object(settings, "PASSWORD_BCRYPT_ROUNDS", 5)
+
+    response = test_client.post("/auth/login", data={"username": student_user.email, "password": "senha123"})
+    assert response.status_code == 200
+    db_session.refresh(student_user)
+    assert student_user.password_hash.startswith("$2b$05$")
+
+    # Um segundo login com o custo atual não regrava o hash.
+    current_hash = student_user.password_hash
+    assert test_client.post("/auth/login", data={"username": student_user.email, "password": "senha123"}).status_code == 200
+    db_session.refresh(student_user)
+    assert student_user.password_hash == current_hash
+
+
+def test_login_wrong_password_is_rejected(test_client: TestClient, student_user: User):
+    response = test_client.post("/auth/login", data={"username": student_user.email, "password": "errada123"})
+    assert response.status_code == 401
+
+
+def test_hash_passwords_splits_bulk_work_across_own_processes(mocker):
+    mocker.patch.object(settings, "PASSWORD_BCRYPT_ROUNDS", 4)
+    mocker.patch.object(settings, "USER_IMPORT_HASH_WORKERS", 2)
+    started = mocker.spy(billiard.Process, "start")
+    passwords = ["senha-um", "senha-dois", "senha-tres"]
+
+    hashes = hashing.hash_passwords(passwords)
+
+    assert started.call_count == 2
+    assert all(hashing.context().verify(password, password_hash) for password, password_hash in zip(passwords, hashes))
+
+
+def test_sync_hash_password_waits_for_the_pending_limit(mocker):
+    mocker.patch.object(settings, "PASSWORD_BCRYPT_ROUNDS", 4)
+    mocker.patch.object(hashing, "_pending", hashing._PendingLimiter(1))
+    hashing._pending.blocking.acquire()
+    hashed = []
+    worker = threading.Thread(target=lambda: hashed.append(hashing.hash_password("senha-forte")))
+    worker.start()
+    worker.join(timeout=0.5)
+    assert worker.is_alive() and not hashed
+
+    hashing._pending.blocking.release()
+    worker.join(timeout=10)
+    assert hashed and hashing.context().verify("senha-forte", hashed[0])
+
+
+def test_api_shutdown_closes_the_hash_executor():
+    hashing._get_executor()
+    with TestClient(app):
+        pass
+    assert hashing._executor is None
@@ -0,0 +1,35 @@
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from app.models import StudentProficiencyMap, User
+from app import crud
+
+
+def test_complete_onboarding_keeps_existing_scores(test_client: TestClient, db_session: Session, student_user: User, student_auth_token: str):
+    profile_id = student_user.profile.id
+    db_session.add(StudentProficiencyMap(profile_id=profile_id, topic="Álgebra", proficiency_score=0.9))
+    db_session.commit()
+
+    response = test_client.post(
+        "/onboarding/complete",
+        headers={"Authorization": f"Bearer {student_auth_token}"},
+        json={"goal": "ENEM", "proficiencies": [
+            {"topic": "Álgebra", "level": "iniciante"},
+            {"topic": "Geometria", "level": "avancado"},
+        ]}
+    )
+    assert response.status_code == 200
+
+    scores = {m.topic: m.proficiency_score for m in db_session.query(StudentProficiencyMap).filter_by(profile_id=profile_id)}
+    assert scores == {"Álgebra": 0.9, "Geometria": 0.8}
+    assert crud.has_proficiency_maps(db_session, profile_id)
+
+
+def test_upsert_proficiency_scores_overwrites_without_duplicates(db_session: Session, student_user: User):
+    profile_id = student_user.profile.id
+    crud.upsert_proficiency_scores(db_session, [{"profile_id": profile_id, "topic": "Álgebra", "proficiency_score": 0.3}])
+    crud.upsert_proficiency_scores(db_session, [{"profile_id": profile_id, "topic": "Álgebra", "proficiency_score": 0.6}])
+    db_session.commit()
+
+    maps = db_session.query(StudentProficiencyMap).filter_by(profile_id=profile_id).all()
+    assert len(maps) == 1
+    assert maps[0].proficiency_score == 0.6
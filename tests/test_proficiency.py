@@ -0,0 +1,53 @@
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.orm import Session
+from app.models import Question, StudentAnswer, StudentProficiencyMap, User
+from app.proficiency import compute_ema_batch, apply_pending_proficiency_updates
+from uuid import uuid4
+
+
+def _sequential_ema(score: float, results: list[float]) -> float:
+    for result in results:
+        score = (score * 4 + result) / 5
+    return score
+
+
+def test_compute_ema_batch_matches_sequential_updates():
+    group_index = np.array([0, 0, 0, 1, 1, 2])
+    results = np.array([1.0, 0.2, 1.0, 0.2, 0.2, 1.0])
+    initial_scores = np.array([0.5, 0.0, 0.9])
+
+    final_scores = compute_ema_batch(group_index, results, initial_scores)
+
+    expected = [
+        _sequential_ema(0.5, [1.0, 0.2, 1.0]),
+        _sequential_ema(0.0, [0.2, 0.2]),
+        _sequential_ema(0.9, [1.0]),
+    ]
+    assert np.allclose(final_scores, expected)
+
+
+def test_apply_pending_proficiency_updates(db_session: Session, student_user: User):
+    profile_id = student_user.profile.id
+    algebra = Question(id=uuid4(), content="Q1", options={"A": "1"}, correct_option="A", subject="Matemática", topic="Álgebra")
+    geometria = Question(id=uuid4(), content="Q2", options={"A": "1"}, correct_option="A", subject="Matemática", topic="Geometria")
+    db_session.add_all([algebra, geometria])
+    db_session.add(StudentProficiencyMap(profile_id=profile_id, topic="Álgebra", proficiency_score=0.5))
+    db_session.commit()
+
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    outcomes = [(algebra, True), (algebra, False), (geometria, True), (algebra, True)]
+    for i, (question, is_correct) in enumerate(outcomes):
+        db_session.add(StudentAnswer(
+            profile_id=profile_id, question_id=question.id, selected_option="A",
+            is_correct=is_correct, answered_at=start + timedelta(minutes=i)
+        ))
+    db_session.commit()
+
+    assert apply_pending_proficiency_updates(db_session, chunk_size=3) == 4
+
+    scores = {m.topic: m.proficiency_score for m in db_session.query(StudentProficiencyMap).filter_by(profile_id=profile_id)}
+    assert np.isclose(scores["Álgebra"], _sequential_ema(0.5, [1.0, 0.2, 1.0]))
+    assert np.isclose(scores["Geometria"], _sequential_ema(0.0, [1.0]))
+    assert db_session.query(StudentAnswer).filter_by(proficiency_applied=False).count() == 0
+    assert apply_pending_proficiency_updates(db_session) == 0
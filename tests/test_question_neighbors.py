@@ -0,0 +1,82 @@
+from uuid import uuid4
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from app import question_neighbors
+from app.config import settings
+from app.models import Question, QuestionNeighbor, StudentAnswer, User
+
+
+def _add_questions(db: Session, count: int) -> list[Question]:
+    questions = [
+        Question(id=uuid4(), content=f"Q{i}", options={"A": "1", "B": "2"}, correct_option="A", subject="Teste", topic="Teste")
+        for i in range(count)
+    ]
+    db.add_all(questions)
+    db.commit()
+    return questions
+
+
+def _neighbor_lists(db: Session) -> dict:
+    lists = {}
+    for row in db.query(QuestionNeighbor).order_by(QuestionNeighbor.question_id, QuestionNeighbor.rank):
+        lists.setdefault(row.question_id, []).append(row.neighbor_id)
+    return lists
+
+
+def test_refresh_neighbors_writes_new_lists_and_updates_existing(db_session: Session, mocker):
+    mocker.patch.object(settings, "QUESTION_NEIGHBORS_K", 2)
+    a, b, c, new = _add_questions(db_session, 4)
+    db_session.add_all([
+        QuestionNeighbor(question_id=a.id, neighbor_id=b.id, rank=0, distance=0.3),
+        QuestionNeighbor(question_id=a.id, neighbor_id=c.id, rank=1, distance=0.5),
+    ])
+    db_session.commit()
+    orphan = str(uuid4())  # vetor sem questão no banco
+    mocker.patch("app.vector_db.query_neighbors", return_value=[
+        [(str(new.id), 0.0), (orphan, 0.05), (str(a.id), 0.1), (str(c.id), 0.6)]
+    ])
+
+    question_neighbors.refresh_neighbors(db_session, [str(new.id)], [[0.1, 0.2]])
+
+    lists = _neighbor_lists(db_session)
+    assert lists[new.id] == [a.id, c.id]
+    # A nova questão entra na lista de `a` (mais próxima que o pior vizinho) e a de `c` é criada.
+    assert lists[a.id] == [new.id, b.id]
+    assert lists[c.id] == [new.id]
+
+
+def test_next_question_remediation_picks_nearest_unanswered_neighbor(test_client: TestClient, db_session: Session, student_user: User, student_auth_token: str):
+    wrong, answered, keyless, near, far = _add_questions(db_session, 5)
+    keyless.correct_option = None  # gabarito pendente: fica fora da recomendação
+    profile_id = student_user.profile.id
+    db_session.add_all([
+        StudentAnswer(profile_id=profile_id, question_id=wrong.id, selected_option="B", is_correct=False),
+        StudentAnswer(profile_id=profile_id, question_id=answered.id, selected_option="A", is_correct=True),
+        QuestionNeighbor(question_id=wrong.id, neighbor_id=answered.id, rank=0, distance=0.1),
+        QuestionNeighbor(question_id=wrong.id, neighbor_id=keyless.id, rank=1, distance=0.15),
+        QuestionNeighbor(question_id=wrong.id, neighbor_id=near.id, rank=2, distance=0.2),
+        QuestionNeighbor(question_id=wrong.id, neighbor_id=far.id, rank=3, distance=0.4),
+    ])
+    db_session.commit()
+    near_id = str(near.id)
+
+    response = test_client.get(
+        "/student/assessment/next-question",
+        params={"mode": "remediation"},
+        headers={"Authorization": f"Bearer {student_auth_token}"}
+    )
+    assert response.status_code == 200
+    assert response.json()["id"] == near_id
+
+
+def test_next_question_remediation_falls_back_without_errors(test_client: TestClient, db_session: Session, student_user: User, student_auth_token: str):
+    (question,) = _add_questions(db_session, 1)
+    question_id = str(question.id)
+
+    response = test_client.get(
+        "/student/assessment/next-question",
+        params={"mode": "remediation"},
+        headers={"Authorization": f"Bearer {student_auth_token}"}
+    )
+    assert response.status_code == 200
+    assert response.json()["id"] == question_id
@@ -1,6 +1,8 @@
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 from app.models import Question, StudentAnswer, User
+from app.cache import progress_cache
+from app.question_bank import question_bank
 from uuid import uuid4
 
 def test_submit_answer_success(test_client: TestClient, db_session: Session, student_auth_token: str, mocker):
@@ -55,3 +57,162 @@ def test_get_answer_analysis_unauthorized(test_client: TestClient, db_session: S
         headers={"Authorization": f"Bearer {admin_auth_token}"}
     )
     assert response.status_code == 403
+
+
+def test_next_question_skips_answered_questions(test_client: TestClient, db_session: Session, student_user: User, student_auth_token: str):
+    answered = Question(id=uuid4(), content="Respondida?", options={"A": "1", "B": "2"}, correct_option="A", subject="Teste", topic="Teste")
+    pending = Question(id=uuid4(), content="Nova?", options={"A": "1", "B": "2"}, correct_option="B", subject="Teste", topic="Teste")
+    db_session.add_all([answered, pending])
+    db_session.commit()
+    db_session.add(StudentAnswer(id=uuid4(), profile_id=student_user.profile.id, question_id=answered.id, selected_option="A", is_correct=True))
+    db_session.commit()
+
+    for _ in range(5):
+        response = test_client.get(
+            "/student/assessment/next-question",
+            headers={"Authorization": f"Bearer {student_auth_token}"}
+        )
+        assert response.status_code == 200
+        assert response.json()["id"] == str(pending.id)
+
+
+def test_next_question_not_found_when_all_answered(test_client: TestClient, db_session: Session, student_user: User, student_auth_token: str):
+    question = Question(id=uuid4(), content="Única?", options={"A": "1", "B": "2"}, correct_option="A", subject="Teste", topic="Teste")
+    db_session.add(question)
+    db_session.commit()
+    db_session.add(StudentAnswer(id=uuid4(), profile_id=student_user.profile.id, question_id=question.id, selected_option="B", is_correct=False))
+    db_session.commit()
+
+    response = test_client.get(
+        "/student/assessment/next-question",
+        headers={"Authorization": f"Bearer {student_auth_token}"}
+    )
+    assert response.status_code == 404
+
+
+def test_read_me_loads_user_and_profile_in_one_query(test_client: TestClient, query_counter, student_user: User, student_auth_token: str):
+    with query_counter() as statements:
+        response = test_client.get("/student/me", headers={"Authorization": f"Bearer {student_auth_token}"})
+    assert response.status_code == 200
+    assert response.json()["profile"]["full_name"] == "Aluno de Teste"
+    assert len(statements) == 1
+
+
+def test_read_progress_through_async_session(test_client: TestClient, db_session: Session, student_user: User, student_auth_token: str):
+    from app.models import StudentProficiencyMap
+    db_session.add(StudentProficiencyMap(profile_id=student_user.profile.id, topic="Álgebra", proficiency_score=0.4))
+    db_session.commit()
+
+    response = test_client.get("/student/progress", headers={"Authorization": f"Bearer {student_auth_token}"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["profile"]["full_name"] == "Aluno de Teste"
+    assert [(m["topic"], m["proficiency_score"]) for m in data["proficiency_maps"]] == [("Álgebra", 0.4)]
+
+
+def test_submit_answer_unknown_question_not_found(test_client: TestClient, student_auth_token: str):
+    response = test_client.post(
+        "/student/assessment/answer",
+        headers={"Authorization": f"Bearer {student_auth_token}"},
+        json={"question_id": str(uuid4()), "selected_option": "A"}
+    )
+    assert response.status_code == 404
+
+
+def test_submit_answers_batch_grades_in_memory_and_dispatches_one_task(test_client: TestClient, db_session: Session, student_user: User, student_auth_token: str, mocker):
+    mock_task = mocker.patch("app.tasks.analyze_student_answers.delay")
+    questions = [
+        Question(id=uuid4(), content=f"Q{i}", options={"A": "1", "B": "2"}, correct_option="A", subject="Teste", topic="Teste")
+        for i in range(3)
+    ]
+    db_session.add_all(questions)
+    db_session.commit()
+    payload = {"answers": [
+        {"question_id": str(questions[0].id), "selected_option": "A"},
+        {"question_id": str(questions[1].id), "selected_option": "B"},
+        {"question_id": str(questions[2].id), "selected_option": "A", "time_taken_ms": 900},
+    ]}
+
+    response = test_client.post("/student/assessment/answers", headers={"Authorization": f"Bearer {student_auth_token}"}, json=payload)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["is_correct"] for r in data["results"]] == [True, False, True]
+    assert data["correct_count"] == 2
+    mock_task.assert_called_once_with([data["results"][1]["answer_id"]])
+    stored = db_session.query(StudentAnswer).filter_by(profile_id=student_user.profile.id).all()
+    assert sorted(a.is_correct for a in stored) == [False, True, True]
+
+
+def test_submit_answers_batch_rejects_unknown_question(test_client: TestClient, student_auth_token: str, mocker):
+    mock_task = mocker.patch("app.tasks.analyze_student_answers.delay")
+    response = test_client.post(
+        "/student/assessment/answers",
+        headers={"Authorization": f"Bearer {student_auth_token}"},
+        json={"answers": [{"question_id": str(uuid4()), "selected_option": "A"}]}
+    )
+    assert response.status_code == 404
+    mock_task.assert_not_called()
+
+
+def test_questions_without_answer_key_are_not_served_or_graded(test_client: TestClient, db_session: Session, student_user: User, student_auth_token: str):
+    pending = Question(id=uuid4(), content="Sem gabarito?", options={"A": "1", "B": "2"}, correct_option=None, subject="Teste", topic="Teste")
+    db_session.add(pending)
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {student_auth_token}"}
+
+    assert test_client.get("/student/assessment/next-question", headers=headers).status_code == 404
+    response = test_client.post("/student/assessment/answer", headers=headers, json={"question_id": str(pending.id), "selected_option": "A"})
+    assert response.status_code == 409
+
+
+def test_submit_answers_batch_falls_back_to_db_for_questions_missing_from_index(test_client: TestClient, db_session: Session, student_user: User, student_auth_token: str, mocker):
+    mocker.patch("app.tasks.analyze_student_answers.delay")
+    question_bank.ensure_fresh(db_session)
+    # Criada "em outro processo": o índice deste processo ainda não a conhece.
+    question = Question(id=uuid4(), content="Nova?", options={"A": "1", "B": "2"}, correct_option="B", subject="Teste", topic="Teste")
+    db_session.add(question)
+    db_session.commit()
+
+    response = test_client.post(
+        "/student/assessment/answers",
+        headers={"Authorization": f"Bearer {student_auth_token}"},
+        json={"answers": [{"question_id": str(question.id), "selected_option": "B"}]}
+    )
+    assert response.status_code == 200
+    assert response.json()["results"][0]["is_correct"] is True
+
+
+def test_student_hot_paths_query_budget(test_client: TestClient, db_session: Session, query_counter, student_user: User, student_auth_token: str, mocker):
+    from app.models import StudentProficiencyMap
+    mocker.patch("app.tasks.analyze_student_answer.delay")
+    mocker.patch("app.tasks.analyze_student_answers.delay")
+    question_ids = []
+    for i in range(4):
+        question = Question(id=uuid4(), content=f"Q{i}", options={"A": "1", "B": "2"}, correct_option="A", subject="Teste", topic="Teste")
+        question_ids.append(str(question.id))
+        db_session.add(question)
+    db_session.add(StudentProficiencyMap(profile_id=student_user.profile.id, topic="Teste", proficiency_score=0.4))
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {student_auth_token}"}
+    # Aquece o principal em cache e o índice de questões.
+    assert test_client.get("/student/assessment/next-question", headers=headers).status_code == 200
+    progress_cache.invalidate({str(student_user.profile.id)})
+
+    budgets = [
+        # mapa de proficiência + questão escolhida
+        (2, lambda: test_client.get("/student/assessment/next-question", headers=headers)),
+        # questão + INSERT + refresh da resposta
+        (3, lambda: test_client.post("/student/assessment/answer", headers=headers, json={"question_id": question_ids[0], "selected_option": "A"})),
+        # gabaritos vêm do índice: só o INSERT em lote
+        (1, lambda: test_client.post("/student/assessment/answers", headers=headers, json={
+            "answers": [{"question_id": question_id, "selected_option": "B"} for question_id in question_ids[1:3]]
+        })),
+        # perfil + mapa (cache frio)
+        (2, lambda: test_client.get("/student/progress", headers=headers)),
+    ]
+    for budget, request in budgets:
+        with query_counter() as statements:
+            response = request()
+        assert response.status_code == 200
+        assert len(statements) <= budget, statements
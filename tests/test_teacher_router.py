@@ -4,8 +4,9 @@ from app.models import User
 from uuid import uuid4
 
 # CORREÇÃO: Adicionado `admin_auth_token` como argumento e usado no header.
-def test_get_dashboard_success(test_client: TestClient, mocker, admin_user: User, admin_auth_token: str):
+def test_get_dashboard_success(test_client: TestClient, db_session: Session, mocker, admin_user: User, admin_auth_token: str):
     admin_user.role = 'teacher'
+    db_session.commit()
     mocker.patch("app.security.get_current_active_user_with_role", return_value=admin_user)
     mock_data = {
         "class_average_score": 0.8,
@@ -23,8 +24,9 @@ def test_get_dashboard_success(test_client: TestClient, mocker, admin_user: User
 
 
 # CORREÇÃO: Adicionado `admin_auth_token` como argumento e usado no header.
-def test_get_student_details_success(test_client: TestClient, mocker, student_user: User, admin_user: User, admin_auth_token: str):
+def test_get_student_details_success(test_client: TestClient, db_session: Session, mocker, student_user: User, admin_user: User, admin_auth_token: str):
     admin_user.role = 'teacher'
+    db_session.commit()
     mocker.patch("app.security.get_current_active_user_with_role", return_value=admin_user)
     mock_data = {
         "profile": {"id": str(student_user.profile.id), "user_id": str(student_user.id), "full_name": student_user.profile.full_name, "current_goal": None},
@@ -39,3 +41,45 @@ def test_get_student_details_success(test_client: TestClient, mocker, student_us
     )
     assert response.status_code == 200
     assert response.json()["profile"]["full_name"] == "Aluno de Teste"
+
+
+def test_get_student_details_query_budget(test_client: TestClient, db_session: Session, query_counter, student_user: User, admin_user: User, admin_auth_token: str):
+    from app.models import Question, StudentAnswer
+    admin_user.role = 'teacher'
+    db_session.commit()
+    for i in range(3):
+        question = Question(id=uuid4(), content=f"Q{i}", options={"A": "1", "B": "2"}, correct_option="A", subject="Teste", topic="Teste")
+        db_session.add(question)
+        db_session.add(StudentAnswer(id=uuid4(), profile_id=student_user.profile.id, question_id=question.id, selected_option="B", is_correct=False))
+    db_session.commit()
+    url = f"/teacher/students/{student_user.profile.id}"
+
+    with query_counter() as statements:
+        response = test_client.get(
+            url,
+            headers={"Authorization": f"Bearer {admin_auth_token}"}
+        )
+    assert response.status_code == 200
+    assert len(response.json()["recent_errors"]) == 3
+    # principal (cache invalidado pela troca de papel) + perfil/tenant + mapa + erros
+    assert len(statements) <= 4
+
+
+def test_get_student_details_other_tenant_not_found(test_client: TestClient, db_session: Session, admin_user: User, admin_auth_token: str):
+    from app.models import Tenant, Profile
+    admin_user.role = 'teacher'
+    other_tenant = Tenant(name="Outro Tenant")
+    db_session.add(other_tenant)
+    db_session.commit()
+    outsider = User(id=uuid4(), email="fora@exemplo.com", password_hash="x", role="student", tenant_id=other_tenant.id)
+    db_session.add(outsider)
+    db_session.commit()
+    profile = Profile(id=uuid4(), full_name="Aluno de Fora", user_id=outsider.id)
+    db_session.add(profile)
+    db_session.commit()
+
+    response = test_client.get(
+        f"/teacher/students/{profile.id}",
+        headers={"Authorization": f"Bearer {admin_auth_token}"}
+    )
+    assert response.status_code == 404
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.orm import Session
+from app import crud, tenant_stats
+from app.models import Question, StudentAnswer, StudentProficiencyMap, Tenant, User, Profile, UserRole
+from app.proficiency import apply_pending_proficiency_updates
+from uuid import uuid4
+
+
+def _add_student(db_session: Session, tenant: Tenant, email: str) -> Profile:
+    user = User(id=uuid4(), email=email, password_hash="x", role=UserRole.student, tenant_id=tenant.id)
+    profile = Profile(id=uuid4(), full_name=email, user_id=user.id)
+    db_session.add_all([user, profile])
+    tenant_stats.record_new_students(db_session, tenant.id)
+    db_session.commit()
+    return profile
+
+
+def test_dashboard_aggregates_are_updated_incrementally(db_session: Session, test_tenant: Tenant):
+    ana = _add_student(db_session, test_tenant, "ana@exemplo.com")
+    bia = _add_student(db_session, test_tenant, "bia@exemplo.com")
+    _add_student(db_session, test_tenant, "caio@exemplo.com")
+    algebra = Question(id=uuid4(), content="Q1", options={"A": "1"}, correct_option="A", subject="Matemática", topic="Álgebra")
+    historia = Question(id=uuid4(), content="Q2", options={"A": "1"}, correct_option="A", subject="História", topic="Brasil Colônia")
+    db_session.add_all([algebra, historia])
+    db_session.commit()
+
+    now = datetime.now(timezone.utc)
+    db_session.add_all([
+        StudentAnswer(profile_id=ana.id, question_id=algebra.id, selected_option="A", is_correct=True, answered_at=now - timedelta(days=30)),
+        StudentAnswer(profile_id=ana.id, question_id=historia.id, selected_option="B", is_correct=False, answered_at=now),
+        StudentAnswer(profile_id=bia.id, question_id=algebra.id, selected_option="A", is_correct=True, answered_at=now - timedelta(days=20)),
+    ])
+    db_session.commit()
+    apply_pending_proficiency_updates(db_session, chunk_size=2)
+
+    dashboard = tenant_stats.get_dashboard(db_session, test_tenant.id)
+
+    assert dashboard["class_average_score"] == round(2 / 3, 2)
+    assert dashboard["engagement"] == {"active_students": 1, "total_students": 3}
+    assert dashboard["most_difficult_topics"][0] == {"topic": "Brasil Colônia", "average": 0.04}
+    assert dashboard["most_difficult_topics"][1] == {"topic": "Álgebra", "average": 0.2}
+
+    tenant_stats.rebuild_tenant_stats(db_session, test_tenant.id)
+    assert tenant_stats.get_dashboard(db_session, test_tenant.id) == dashboard
+
+
+def test_teacher_dashboard_data_uses_tenant_aggregates(db_session: Session, test_tenant: Tenant, student_user: User):
+    tenant_stats.record_new_students(db_session, test_tenant.id)
+    db_session.add(StudentProficiencyMap(profile_id=student_user.profile.id, topic="Álgebra", proficiency_score=0.5))
+    tenant_stats.record_topic_scores(db_session, [(test_tenant.id, "Álgebra", None, 0.5)])
+    db_session.commit()
+
+    data = crud.get_teacher_dashboard_data(db_session, teacher_profile_id=student_user.profile.id)
+
+    assert data["most_difficult_topics"] == [{"topic": "Álgebra", "average": 0.5}]
+    assert data["engagement"]["total_students"] == 1
@@ -0,0 +1,139 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from app.ai_client import ConcurrencyLimiter
+
+
+def test_ask_tutor_success(test_client: TestClient, student_auth_token: str, mocker):
+    mock_tutor = mocker.patch("app.ai_client.ask_tutor", new=mocker.AsyncMock(return_value="Explicação"))
+    response = test_client.post(
+        "/tools/ask-tutor",
+        headers={"Authorization": f"Bearer {student_auth_token}"},
+        json={"question": "O que é uma derivada?"}
+    )
+    assert response.status_code == 200
+    assert response.json() == {"answer": "Explicação"}
+    assert mock_tutor.await_args.kwargs["tenant_id"] is not None
+
+
+def test_grade_essay_failure_returns_500(test_client: TestClient, student_auth_token: str, mocker):
+    mocker.patch("app.ai_client.grade_essay", new=mocker.AsyncMock(return_value=None))
+    response = test_client.post(
+        "/tools/grade-essay",
+        headers={"Authorization": f"Bearer {student_auth_token}"},
+        json={"essayText": "Texto", "theme": "Tema"}
+    )
+    assert response.status_code == 500
+
+
+def test_concurrency_limiter_caps_calls_per_tenant():
+    limiter = ConcurrencyLimiter(global_limit=10, per_tenant_limit=2)
+    in_flight = {"current": 0, "peak": 0}
+
+    async def call():
+        async with limiter.slot("tenant-a"):
+            in_flight["current"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["current"])
+            await asyncio.sleep(0.01)
+            in_flight["current"] -= 1
+
+    async def main():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(main())
+    assert in_flight["peak"] == 2
+
+
+def test_concurrency_limiter_drops_idle_tenant_semaphores():
+    limiter = ConcurrencyLimiter(global_limit=10, per_tenant_limit=1)
+
+    async def call(tenant_id):
+        async with limiter.slot(tenant_id):
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(call(f"tenant-{i % 50}") for i in range(200)))
+        return dict(limiter._tenants)
+
+    assert asyncio.run(main()) == {}
+
+
+def test_ask_tutor_stream_sends_sse_events(test_client: TestClient, student_auth_token: str, mocker):
+    async def fake_chunks():
+        yield "Derivada é"
+        yield " a taxa\nde variação."
+
+    mocker.patch("app.ai_client.stream_tutor_answer", return_value=fake_chunks())
+    response = test_client.post(
+        "/tools/ask-tutor/stream",
+        headers={"Authorization": f"Bearer {student_auth_token}"},
+        json={"question": "O que é uma derivada?"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == "data: Derivada é\n\ndata:  a taxa\ndata: de variação.\n\nevent: done\ndata: \n\n"
+
+
+def test_stream_closes_upstream_when_consumer_stops(mocker):
+    from app import ai_client
+
+    class FakeUpstream:
+        closed = False
+
+        async def aclose(self):
+            FakeUpstream.closed = True
+
+    class FakeChunk:
+        def __init__(self, text):
+            self.text = text
+
+    class FakeResponse:
+        _iterator = FakeUpstream()
+
+        async def __aiter__(self):
+            for text in ["um", "dois", "três"]:
+                yield FakeChunk(text)
+
+    model = mocker.Mock()
+    model.generate_content_async = mocker.AsyncMock(return_value=FakeResponse())
+    mocker.patch("app.ai_services.get_model", return_value=model)
+
+    async def consume_first():
+        chunks = ai_client.stream_summary("texto", tenant_id="tenant-a")
+        first = await chunks.__anext__()
+        await chunks.aclose()
+        return first
+
+    assert asyncio.run(consume_first()) == "um"
+    assert FakeUpstream.closed
+
+
+def test_stalled_stream_times_out_and_releases_slots(mocker):
+    from app import ai_client
+
+    class FakeChunk:
+        text = "um"
+
+    class StalledResponse:
+        async def __aiter__(self):
+            yield FakeChunk()
+            await asyncio.sleep(60)
+
+    model = mocker.Mock()
+    model.generate_content_async = mocker.AsyncMock(return_value=StalledResponse())
+    mocker.patch("app.ai_services.get_model", return_value=model)
+    mocker.patch.object(ai_client.settings, "AI_STREAM_IDLE_TIMEOUT_SECONDS", 0.05)
+    limiter = ConcurrencyLimiter(global_limit=1, per_tenant_limit=1)
+    mocker.patch("app.ai_client.limiter", limiter)
+
+    async def consume():
+        received = []
+        with pytest.raises(asyncio.TimeoutError):
+            async for text in ai_client.stream_summary("texto", tenant_id="tenant-a"):
+                received.append(text)
+        # As duas vagas (global e do tenant) voltaram: outra chamada entra na hora.
+        async with limiter.slot("tenant-a"):
+            pass
+        return received
+
+    assert asyncio.run(asyncio.wait_for(consume(), timeout=5)) == ["um"]
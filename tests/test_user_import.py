@@ -0,0 +1,103 @@
+import io
+import json
+import os
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from app import user_import
+from app.config import settings
+from app.models import Profile, Tenant, TenantStats, User
+
+
+def _write_csv(path, rows):
+    lines = ["email,password,full_name,tenant_name,role"] + [",".join(row) for row in rows]
+    path.write_text("\n".join(lines), encoding="utf-8")
+    return str(path)
+
+
+def test_import_users_creates_in_chunks_and_reports_row_errors(db_session: Session, student_user: User, tmp_path, mocker):
+    mocker.patch.object(settings, "PASSWORD_BCRYPT_ROUNDS", 4)
+    mocker.patch.object(settings, "USER_IMPORT_CHUNK_SIZE", 2)
+    file_path = _write_csv(tmp_path / "alunos.csv", [
+        ("ana@escola.com", "senha-da-ana", "Ana", "Escola Nova", ""),
+        ("bia@escola.com", "curta", "Bia", "Escola Nova", ""),
+        ("ana@escola.com", "senha-da-ana", "Ana de novo", "Escola Nova", ""),
+        (student_user.email, "senha-qualquer", "Já existe", "Tenant de Teste", ""),
+        ("caio@escola.com", "senha-do-caio", "Caio", "Tenant de Teste", "teacher"),
+        ("duda@escola.com", "senha-da-duda", "Duda", "Escola Nova", "student"),
+    ])
+    progress = mocker.Mock()
+
+    report = user_import.import_users(db_session, file_path, on_progress=progress)
+
+    assert report["total"] == 6 and report["created"] == 3
+    assert [(e["row"], e["email"]) for e in report["errors"]] == [
+        (2, "bia@escola.com"), (3, "ana@escola.com"), (4, student_user.email)
+    ]
+    new_tenant = db_session.query(Tenant).filter_by(name="Escola Nova").one()
+    ana = db_session.query(User).filter_by(email="ana@escola.com").one()
+    assert ana.tenant_id == new_tenant.id and ana.password_hash.startswith("$2b$04$")
+    assert db_session.query(Profile).filter_by(user_id=ana.id).one().full_name == "Ana"
+    assert db_session.query(TenantStats).filter_by(tenant_id=new_tenant.id).one().total_students == 2
+    progress.assert_called_with("importing", 4, 4)
+
+
+def test_import_users_jsonl_reports_invalid_lines(db_session: Session, tmp_path, mocker):
+    mocker.patch.object(settings, "PASSWORD_BCRYPT_ROUNDS", 4)
+    path = tmp_path / "alunos.jsonl"
+    path.write_text("\n".join([
+        json.dumps({"email": "eva@escola.com", "password": "senha-da-eva", "full_name": "Eva", "tenant_name": "Escola"}),
+        "{nao é json",
+        json.dumps(["lista", "em vez de objeto"]),
+        json.dumps("texto"),
+        "42",
+    ]), encoding="utf-8")
+
+    report = user_import.import_users(db_session, str(path))
+
+    assert report["created"] == 1
+    assert report["errors"][0]["row"] == 2 and "JSON inválido" in report["errors"][0]["error"]
+    assert [error["row"] for error in report["errors"][1:]] == [3, 4, 5]
+    assert all(error["error"] == "A linha deve ser um objeto JSON." for error in report["errors"][1:])
+
+
+def test_import_users_rejects_file_that_is_not_utf8(db_session: Session, tmp_path):
+    path = tmp_path / "alunos.csv"
+    path.write_bytes("email,password,full_name,tenant_name\njoão@escola.com,senha-do-joão,João,Escola\n".encode("latin-1"))
+
+    report = user_import.import_users(db_session, str(path))
+
+    assert report["created"] == 0
+    assert report["errors"] == [{"row": 0, "email": None, "error": "O arquivo precisa estar codificado em UTF-8."}]
+
+
+def test_upload_user_import_schedules_task(test_client: TestClient, admin_auth_token: str, mocker):
+    mock_task = mocker.patch("app.tasks.import_users.delay")
+    mock_task.return_value.id = "import-task-id"
+    csv_file = ("alunos.csv", io.BytesIO(b"email,password,full_name,tenant_name\n"), "text/csv")
+
+    response = test_client.post("/admin/users/import", headers={"Authorization": f"Bearer {admin_auth_token}"}, files={"file": csv_file})
+
+    assert response.status_code == 202
+    assert response.json()["task_id"] == "import-task-id"
+    saved_path = mock_task.call_args.args[0]
+    assert saved_path.endswith("_alunos.csv")
+    os.remove(saved_path)
+
+
+def test_upload_user_import_rejects_other_formats(test_client: TestClient, admin_auth_token: str):
+    response = test_client.post(
+        "/admin/users/import",
+        headers={"Authorization": f"Bearer {admin_auth_token}"},
+        files={"file": ("alunos.xlsx", io.BytesIO(b"x"), "application/octet-stream")}
+    )
+    assert response.status_code == 400
+
+
+def test_task_status_reports_progress(test_client: TestClient, admin_auth_token: str, mocker):
+    result = mocker.Mock(state="PROGRESS", info={"stage": "importing", "done": 500, "total": 2000})
+    mocker.patch("app.routers.admin.celery_app.AsyncResult", return_value=result)
+
+    response = test_client.get("/admin/tasks/abc", headers={"Authorization": f"Bearer {admin_auth_token}"})
+
+    assert response.status_code == 200
+    assert response.json()["progress"]["done"] == 500